@@ -35,6 +35,7 @@ from isaacgym import gymapi
 from isaacgym.torch_utils import *
 
 from utils import torch_utils
+from utils.step_graph import StepGraph
 
 from env.tasks.base_task import BaseTask
 
@@ -56,6 +57,11 @@ class Humanoid(BaseTask):
         self._local_root_obs = self.cfg["env"]["localRootObs"]
         self._root_height_obs = self.cfg["env"].get("rootHeightObs", True)
         self._enable_early_termination = self.cfg["env"]["enableEarlyTermination"]
+        # replay the post-physics computation from a CUDA graph after captureWarmup steps,
+        # print its mean time every benchmarkStep steps, see utils/step_graph.py
+        self._capture_step = self.cfg["env"].get("captureStep", False)
+        self._capture_warmup = self.cfg["env"].get("captureWarmup", 3)
+        self._step_benchmark_interval = self.cfg["env"].get("benchmarkStep", 0)
         
         key_bodies = self.cfg["env"]["keyBodies"]
         self._setup_character_props(key_bodies)
@@ -120,6 +126,17 @@ class Humanoid(BaseTask):
         self._contact_forces = contact_force_tensor.view(self.num_envs, bodies_per_env, 3)[..., :self.num_bodies, :]
         
         self._terminate_buf = torch.ones(self.num_envs, device=self.device, dtype=torch.long)
+
+        # heading rotations and local body positions shared by the observation,
+        # AMP and reward code, cleared whenever the sim tensors are refreshed
+        self._kinematic_cache = dict()
+
+        self._step_graph = None
+        if (self._capture_step or self._step_benchmark_interval > 0):
+            # actions are the only tensors rebound between steps the step reads, the sim
+            # tensors are refreshed and the task buffers updated in place
+            self._step_graph = StepGraph(self, self._compute_post_physics, ['actions'], self._capture_warmup,
+                                         self._capture_step, self._step_benchmark_interval > 0)
         
         self._build_termination_heights()
         
@@ -409,8 +426,60 @@ class Humanoid(BaseTask):
         self.gym.refresh_force_sensor_tensor(self.sim)
         self.gym.refresh_dof_force_tensor(self.sim)
         self.gym.refresh_net_contact_force_tensor(self.sim)
+
+        self._kinematic_cache.clear()
         return
 
+    def _get_kinematics(self, key, compute):
+        value = self._kinematic_cache.get(key)
+        if (value is None):
+            value = compute()
+            self._kinematic_cache[key] = value
+        return value
+
+    def _get_root_rot(self, source):
+        # 'body' is the root rigid body read by the humanoid and AMP observations,
+        # 'actor' the actor root state read by the task, they only differ after
+        # a reset until the next simulation step
+        if (source == 'body'):
+            return self._rigid_body_rot[:, 0, :]
+        assert(source == 'actor'), source
+        return self._humanoid_root_states[:, 3:7]
+
+    def _get_heading(self, source='body'):
+        return self._get_kinematics(('heading', source), lambda: torch_utils.calc_heading(self._get_root_rot(source)))
+
+    def _get_heading_quat(self, env_ids=None, source='body'):
+        heading_rot = self._get_kinematics(('heading_quat', source),
+                                           lambda: torch_utils.heading_to_quat(self._get_heading(source)))
+        return heading_rot if env_ids is None else heading_rot[env_ids]
+
+    def _get_heading_quat_inv(self, env_ids=None, source='body'):
+        heading_rot = self._get_kinematics(('heading_quat_inv', source),
+                                           lambda: torch_utils.heading_to_quat(-self._get_heading(source)))
+        return heading_rot if env_ids is None else heading_rot[env_ids]
+
+    def _get_heading_quat_inv_expand(self, num, env_ids=None, source='body'):
+        # broadcast view over num bodies or points
+        return self._get_heading_quat_inv(env_ids, source).unsqueeze(-2).expand(-1, num, -1)
+
+    def _get_flat_heading_quat_inv(self, num, env_ids=None, source='body'):
+        # [num_envs * num, 4] rows as quat_rotate / quat_mul take them, materialized once per step
+        flat_heading_rot = self._get_kinematics(('flat_heading_quat_inv', source, num),
+                                                lambda: self._get_heading_quat_inv_expand(num, source=source).reshape(-1, 4))
+        if (env_ids is None):
+            return flat_heading_rot
+        return flat_heading_rot.view(self.num_envs, num, 4)[env_ids].view(-1, 4)
+
+    def _get_local_body_pos(self, env_ids=None):
+        # body positions relative to the root body, in its heading frame
+        def compute():
+            local_body_pos = self._rigid_body_pos - self._rigid_body_pos[:, 0:1, :]
+            flat_heading_rot = self._get_flat_heading_quat_inv(self.num_bodies)
+            return quat_rotate(flat_heading_rot, local_body_pos.reshape(-1, 3)).view(local_body_pos.shape)
+        local_body_pos = self._get_kinematics('local_body_pos', compute)
+        return local_body_pos if env_ids is None else local_body_pos[env_ids]
+
     def _compute_observations(self, env_ids=None):
         obs = self._compute_humanoid_obs(env_ids)
 
@@ -421,7 +490,7 @@ class Humanoid(BaseTask):
 
         return
 
-    def _compute_humanoid_obs(self, env_ids=None):
+    def _compute_humanoid_obs(self, env_ids=None, out=None):
         if (env_ids is None):
             body_pos = self._rigid_body_pos
             body_rot = self._rigid_body_rot
@@ -434,7 +503,9 @@ class Humanoid(BaseTask):
             body_ang_vel = self._rigid_body_ang_vel[env_ids]
         
         obs = compute_humanoid_observations_max(body_pos, body_rot, body_vel, body_ang_vel, self._local_root_obs,
-                                                self._root_height_obs)
+                                                self._root_height_obs, out, self._get_heading_quat_inv(env_ids),
+                                                self._get_flat_heading_quat_inv(self.num_bodies, env_ids),
+                                                self._get_local_body_pos(env_ids))
         return obs
 
     def _reset_actors(self, env_ids):
@@ -460,9 +531,12 @@ class Humanoid(BaseTask):
         self.progress_buf += 1
 
         self._refresh_sim_tensors()
-        self._compute_observations()
-        self._compute_reward(self.actions)
-        self._compute_reset()
+        if (self._step_graph is None):
+            self._compute_post_physics()
+        else:
+            self._step_graph()
+            if (self._step_benchmark_interval > 0 and self._step_graph.calls % self._step_benchmark_interval == 0):
+                self._step_graph.report()
         
         self.extras["terminate"] = self._terminate_buf
 
@@ -472,6 +546,13 @@ class Humanoid(BaseTask):
 
         return
 
+    def _compute_post_physics(self):
+        # fixed-shape work of every step, replayed from a graph with captureStep
+        self._compute_observations()
+        self._compute_reward(self.actions)
+        self._compute_reset()
+        return
+
     def render(self, sync_frame_time=False):
         # if self.viewer:
         #     self._update_camera() # hack
@@ -618,49 +699,68 @@ def compute_humanoid_observations(root_pos, root_rot, root_vel, root_ang_vel, do
     return obs
 
 @torch.jit.script
-def compute_humanoid_observations_max(body_pos, body_rot, body_vel, body_ang_vel, local_root_obs, root_height_obs):
-    # type: (Tensor, Tensor, Tensor, Tensor, bool, bool) -> Tensor
+def compute_humanoid_observations_max(body_pos, body_rot, body_vel, body_ang_vel, local_root_obs, root_height_obs, out=None,
+                                      heading_rot=None, flat_heading_rot=None, local_body_pos=None):
+    # type: (Tensor, Tensor, Tensor, Tensor, bool, bool, Optional[Tensor], Optional[Tensor], Optional[Tensor], Optional[Tensor]) -> Tensor
+    # components are written into the slices of out (allocated if not given),
+    # the heading rotations and local body positions are computed unless given
+    num_bodies = body_pos.shape[1]
+    if out is None:
+        obs = body_pos.new_empty((body_pos.shape[0], 1 + 3 * (num_bodies - 1) + 12 * num_bodies))
+    else:
+        obs = out
+
     root_pos = body_pos[:, 0, :]
     root_rot = body_rot[:, 0, :]
 
     root_h = root_pos[:, 2:3]
-    heading_rot = torch_utils.calc_heading_quat_inv(root_rot)
+    if heading_rot is None:
+        heading_rot = torch_utils.calc_heading_quat_inv(root_rot)
     
     if (not root_height_obs):
-        root_h_obs = torch.zeros_like(root_h)
+        obs[:, 0:1] = 0
     else:
-        root_h_obs = root_h
+        obs[:, 0:1] = root_h
     
-    heading_rot_expand = heading_rot.unsqueeze(-2)
-    heading_rot_expand = heading_rot_expand.repeat((1, body_pos.shape[1], 1))
-    flat_heading_rot = heading_rot_expand.reshape(heading_rot_expand.shape[0] * heading_rot_expand.shape[1], 
-                                               heading_rot_expand.shape[2])
+    if flat_heading_rot is None:
+        heading_rot_expand = heading_rot.unsqueeze(-2)
+        heading_rot_expand = heading_rot_expand.repeat((1, body_pos.shape[1], 1))
+        flat_heading_rot = heading_rot_expand.reshape(heading_rot_expand.shape[0] * heading_rot_expand.shape[1], 
+                                                   heading_rot_expand.shape[2])
     
-    root_pos_expand = root_pos.unsqueeze(-2)
-    local_body_pos = body_pos - root_pos_expand
-    flat_local_body_pos = local_body_pos.reshape(local_body_pos.shape[0] * local_body_pos.shape[1], local_body_pos.shape[2])
-    flat_local_body_pos = quat_rotate(flat_heading_rot, flat_local_body_pos)
-    local_body_pos = flat_local_body_pos.reshape(local_body_pos.shape[0], local_body_pos.shape[1] * local_body_pos.shape[2])
-    local_body_pos = local_body_pos[..., 3:] # remove root pos
+    if local_body_pos is None:
+        root_pos_expand = root_pos.unsqueeze(-2)
+        local_body_pos = body_pos - root_pos_expand
+        flat_local_body_pos = local_body_pos.reshape(local_body_pos.shape[0] * local_body_pos.shape[1], local_body_pos.shape[2])
+        local_body_pos = quat_rotate(flat_heading_rot, flat_local_body_pos)
+    local_body_pos = local_body_pos.reshape(body_pos.shape[0], body_pos.shape[1] * body_pos.shape[2])
+    start = 1
+    end = start + 3 * (num_bodies - 1)
+    obs[:, start:end] = local_body_pos[..., 3:] # remove root pos
 
     flat_body_rot = body_rot.reshape(body_rot.shape[0] * body_rot.shape[1], body_rot.shape[2])
     flat_local_body_rot = quat_mul(flat_heading_rot, flat_body_rot)
     flat_local_body_rot_obs = torch_utils.quat_to_tan_norm(flat_local_body_rot)
-    local_body_rot_obs = flat_local_body_rot_obs.reshape(body_rot.shape[0], body_rot.shape[1] * flat_local_body_rot_obs.shape[1])
+    start = end
+    end = start + 6 * num_bodies
+    obs[:, start:end] = flat_local_body_rot_obs.reshape(body_rot.shape[0], body_rot.shape[1] * flat_local_body_rot_obs.shape[1])
     
     if (local_root_obs):
         root_rot_obs = torch_utils.quat_to_tan_norm(root_rot)
-        local_body_rot_obs[..., 0:6] = root_rot_obs
+        obs[:, start:start + 6] = root_rot_obs
 
     flat_body_vel = body_vel.reshape(body_vel.shape[0] * body_vel.shape[1], body_vel.shape[2])
     flat_local_body_vel = quat_rotate(flat_heading_rot, flat_body_vel)
-    local_body_vel = flat_local_body_vel.reshape(body_vel.shape[0], body_vel.shape[1] * body_vel.shape[2])
+    start = end
+    end = start + 3 * num_bodies
+    obs[:, start:end] = flat_local_body_vel.reshape(body_vel.shape[0], body_vel.shape[1] * body_vel.shape[2])
     
     flat_body_ang_vel = body_ang_vel.reshape(body_ang_vel.shape[0] * body_ang_vel.shape[1], body_ang_vel.shape[2])
     flat_local_body_ang_vel = quat_rotate(flat_heading_rot, flat_body_ang_vel)
-    local_body_ang_vel = flat_local_body_ang_vel.reshape(body_ang_vel.shape[0], body_ang_vel.shape[1] * body_ang_vel.shape[2])
+    start = end
+    end = start + 3 * num_bodies
+    obs[:, start:end] = flat_local_body_ang_vel.reshape(body_ang_vel.shape[0], body_ang_vel.shape[1] * body_ang_vel.shape[2])
     
-    obs = torch.cat((root_h_obs, local_body_pos, local_body_rot_obs, local_body_vel, local_body_ang_vel), dim=-1)
     return obs
 
 
@@ -57,6 +57,7 @@ class HumanoidAMP(Humanoid):
         assert(self._num_amp_obs_steps >= 2)
 
         self._reset_default_env_ids = []
+        self._reset_default_mask = None
         self._reset_ref_env_ids = []
 
         self.motion_pos = []
@@ -85,15 +86,18 @@ class HumanoidAMP(Humanoid):
 
     def post_physics_step(self):
         super().post_physics_step()
-        
-        self._update_hist_amp_obs()
-        self._compute_amp_observations()
 
         amp_obs_flat = self._amp_obs_buf.view(-1, self.get_num_amp_obs())
         self.extras["amp_obs"] = amp_obs_flat
 
         return
 
+    def _compute_post_physics(self):
+        super()._compute_post_physics()
+        self._update_hist_amp_obs()
+        self._compute_amp_observations()
+        return
+
     def get_num_amp_obs(self):
         return self._num_amp_obs_steps * self._num_amp_obs_per_step
 
@@ -169,6 +173,7 @@ class HumanoidAMP(Humanoid):
     
     def _reset_envs(self, env_ids):
         self._reset_default_env_ids = []
+        self._reset_default_mask = None
         self._reset_ref_env_ids = []
 
         super()._reset_envs(env_ids)
@@ -176,9 +181,14 @@ class HumanoidAMP(Humanoid):
 
         return
 
-    def _reset_actors(self, env_ids):
+    def _reset_actors(self, env_ids, mask=None):
+        # mask picks the env_ids to reset, the default init applies it with torch.where
+        # instead of indexing the subset, which would sync to size it
+        if (mask is not None and self._state_init != HumanoidAMP.StateInit.Default):
+            env_ids, mask = env_ids[mask], None
+
         if (self._state_init == HumanoidAMP.StateInit.Default):
-            self._reset_default(env_ids)
+            self._reset_default(env_ids, mask)
         elif (self._state_init == HumanoidAMP.StateInit.Start
               or self._state_init == HumanoidAMP.StateInit.Random):
             self._reset_ref_state_init(env_ids)
@@ -188,11 +198,17 @@ class HumanoidAMP(Humanoid):
             assert(False), "Unsupported state initialization strategy: {:s}".format(str(self._state_init))
         return
     
-    def _reset_default(self, env_ids):
-        self._humanoid_root_states[env_ids] = self._initial_humanoid_root_states[env_ids]
-        self._dof_pos[env_ids] = self._initial_dof_pos[env_ids]
-        self._dof_vel[env_ids] = self._initial_dof_vel[env_ids]
+    def _reset_default(self, env_ids, mask=None):
+        if (mask is None):
+            self._humanoid_root_states[env_ids] = self._initial_humanoid_root_states[env_ids]
+            self._dof_pos[env_ids] = self._initial_dof_pos[env_ids]
+            self._dof_vel[env_ids] = self._initial_dof_vel[env_ids]
+        else:
+            self._humanoid_root_states[env_ids] = torch.where(mask[:, None], self._initial_humanoid_root_states[env_ids], self._humanoid_root_states[env_ids])
+            self._dof_pos[env_ids] = torch.where(mask[:, None], self._initial_dof_pos[env_ids], self._dof_pos[env_ids])
+            self._dof_vel[env_ids] = torch.where(mask[:, None], self._initial_dof_vel[env_ids], self._dof_vel[env_ids])
         self._reset_default_env_ids = env_ids
+        self._reset_default_mask = mask
         return
 
     def _reset_ref_state_init(self, env_ids):
@@ -289,7 +305,11 @@ class HumanoidAMP(Humanoid):
 
     def _init_amp_obs_default(self, env_ids):
         curr_amp_obs = self._curr_amp_obs_buf[env_ids].unsqueeze(-2)
-        self._hist_amp_obs_buf[env_ids] = curr_amp_obs
+        if (self._reset_default_mask is None):
+            self._hist_amp_obs_buf[env_ids] = curr_amp_obs
+        else:
+            hist_amp_obs = self._hist_amp_obs_buf[env_ids]
+            self._hist_amp_obs_buf[env_ids] = torch.where(self._reset_default_mask[:, None, None], curr_amp_obs.expand_as(hist_amp_obs), hist_amp_obs)
         return
 
     def _init_amp_obs_ref(self, env_ids, motion_ids, motion_times):
@@ -331,6 +351,7 @@ class HumanoidAMP(Humanoid):
     
     def _compute_amp_observations(self, env_ids=None):
         key_body_pos = self._rigid_body_pos[:, self._key_body_ids, :]
+        local_key_body_pos = self._get_local_body_pos()[:, self._key_body_ids, :]
         if (env_ids is None):
             self._curr_amp_obs_buf[:] = build_amp_observations(self._rigid_body_pos[:, 0, :],
                                                                self._rigid_body_rot[:, 0, :],
@@ -338,7 +359,8 @@ class HumanoidAMP(Humanoid):
                                                                self._rigid_body_ang_vel[:, 0, :],
                                                                self._dof_pos, self._dof_vel, key_body_pos,
                                                                self._local_root_obs, self._root_height_obs, 
-                                                               self._dof_obs_size, self._dof_offsets)
+                                                               self._dof_obs_size, self._dof_offsets,
+                                                               self._get_heading_quat_inv(), local_key_body_pos)
         else:
             self._curr_amp_obs_buf[env_ids] = build_amp_observations(self._rigid_body_pos[env_ids][:, 0, :],
                                                                    self._rigid_body_rot[env_ids][:, 0, :],
@@ -346,7 +368,8 @@ class HumanoidAMP(Humanoid):
                                                                    self._rigid_body_ang_vel[env_ids][:, 0, :],
                                                                    self._dof_pos[env_ids], self._dof_vel[env_ids], key_body_pos[env_ids],
                                                                    self._local_root_obs, self._root_height_obs, 
-                                                                   self._dof_obs_size, self._dof_offsets)
+                                                                   self._dof_obs_size, self._dof_offsets,
+                                                                   self._get_heading_quat_inv(env_ids), local_key_body_pos[env_ids])
         # self.build_motion_obs(env_ids)
         return
 
@@ -389,10 +412,12 @@ class HumanoidAMP(Humanoid):
 
 # @torch.jit.script
 def build_amp_observations(root_pos, root_rot, root_vel, root_ang_vel, dof_pos, dof_vel, key_body_pos, 
-                           local_root_obs, root_height_obs, dof_obs_size, dof_offsets):
-    # type: (Tensor, Tensor, Tensor, Tensor, Tensor, Tensor, Tensor, bool, bool, int, List[int]) -> Tensor
+                           local_root_obs, root_height_obs, dof_obs_size, dof_offsets, heading_rot=None, local_key_body_pos=None):
+    # type: (Tensor, Tensor, Tensor, Tensor, Tensor, Tensor, Tensor, bool, bool, int, List[int], Optional[Tensor], Optional[Tensor]) -> Tensor
+    # the heading rotation and the key body positions in the heading frame are computed unless given
     root_h = root_pos[:, 2:3]
-    heading_rot = torch_utils.calc_heading_quat_inv(root_rot)
+    if heading_rot is None:
+        heading_rot = torch_utils.calc_heading_quat_inv(root_rot)
 
     if (local_root_obs):
         root_rot_obs = quat_mul(heading_rot, root_rot)
@@ -408,16 +433,17 @@ def build_amp_observations(root_pos, root_rot, root_vel, root_ang_vel, dof_pos,
     local_root_vel = quat_rotate(heading_rot, root_vel)
     local_root_ang_vel = quat_rotate(heading_rot, root_ang_vel)
 
-    root_pos_expand = root_pos.unsqueeze(-2)
-    local_key_body_pos = key_body_pos - root_pos_expand
-    
-    heading_rot_expand = heading_rot.unsqueeze(-2)
-    heading_rot_expand = heading_rot_expand.repeat((1, local_key_body_pos.shape[1], 1))
-    flat_end_pos = local_key_body_pos.view(local_key_body_pos.shape[0] * local_key_body_pos.shape[1], local_key_body_pos.shape[2])
-    flat_heading_rot = heading_rot_expand.view(heading_rot_expand.shape[0] * heading_rot_expand.shape[1], 
-                                               heading_rot_expand.shape[2])
-    local_end_pos = quat_rotate(flat_heading_rot, flat_end_pos)
-    flat_local_key_pos = local_end_pos.reshape(local_key_body_pos.shape[0], local_key_body_pos.shape[1] * local_key_body_pos.shape[2])
+    if local_key_body_pos is None:
+        root_pos_expand = root_pos.unsqueeze(-2)
+        local_key_body_pos = key_body_pos - root_pos_expand
+        
+        heading_rot_expand = heading_rot.unsqueeze(-2)
+        heading_rot_expand = heading_rot_expand.repeat((1, local_key_body_pos.shape[1], 1))
+        flat_end_pos = local_key_body_pos.view(local_key_body_pos.shape[0] * local_key_body_pos.shape[1], local_key_body_pos.shape[2])
+        flat_heading_rot = heading_rot_expand.view(heading_rot_expand.shape[0] * heading_rot_expand.shape[1], 
+                                                   heading_rot_expand.shape[2])
+        local_key_body_pos = quat_rotate(flat_heading_rot, flat_end_pos)
+    flat_local_key_pos = local_key_body_pos.reshape(key_body_pos.shape[0], key_body_pos.shape[1] * key_body_pos.shape[2])
     
     dof_obs = dof_to_obs(dof_pos, dof_obs_size, dof_offsets)
     obs = torch.cat((root_h_obs, root_rot_obs, local_root_vel, local_root_ang_vel, dof_obs, dof_vel, flat_local_key_pos), dim=-1)
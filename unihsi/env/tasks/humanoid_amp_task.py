@@ -29,6 +29,7 @@
 import torch
 
 import env.tasks.humanoid_amp as humanoid_amp
+from utils.obs_layout import ObsLayout
 
 class HumanoidAMPTask(humanoid_amp.HumanoidAMP):
     def __init__(self, cfg, sim_params, physics_engine, device_type, device_id, headless):
@@ -40,6 +41,15 @@ class HumanoidAMPTask(humanoid_amp.HumanoidAMP):
                          device_type=device_type,
                          device_id=device_id,
                          headless=headless)
+
+        # observations are written in place into fixed slices of obs_buf, reset
+        # subsets are assembled in the workspace and scattered into obs_buf
+        self._obs_layout = self._build_obs_layout()
+        assert self._obs_layout.size == self.num_obs, self._obs_layout.describe()
+        self._obs_workspace = torch.zeros_like(self.obs_buf)
+        self._obs_layout.write_constants(self._obs_workspace)
+        self._obs_layout.write_constants(self.obs_buf)
+        self._obs_constants_buf = self.obs_buf
         return
 
     
@@ -53,6 +63,17 @@ class HumanoidAMPTask(humanoid_amp.HumanoidAMP):
     def get_task_obs_size(self):
         return 0
 
+    def _build_obs_layout(self):
+        layout = ObsLayout()
+        layout.add('humanoid', super().get_obs_size())
+        if (self._enable_task_obs):
+            self._add_task_obs_layout(layout)
+        return layout
+
+    def _add_task_obs_layout(self, layout):
+        layout.add('task', self.get_task_obs_size())
+        return
+
     def pre_physics_step(self, actions):
         super().pre_physics_step(actions)
         self._update_task()
@@ -77,20 +98,26 @@ class HumanoidAMPTask(humanoid_amp.HumanoidAMP):
         return
 
     def _compute_observations(self, env_ids=None):
-        humanoid_obs = self._compute_humanoid_obs(env_ids)
-        if (self._enable_task_obs):
-            task_obs = self._compute_task_obs(env_ids)
-            obs = torch.cat([humanoid_obs, task_obs], dim=-1)
-        else:
-            obs = humanoid_obs
+        if (self.obs_buf is not self._obs_constants_buf):
+            # observation noise replaces obs_buf
+            self._obs_layout.write_constants(self.obs_buf)
+            self._obs_constants_buf = self.obs_buf
 
         if (env_ids is None):
-            self.obs_buf[:] = obs
+            obs = self.obs_buf
         else:
+            obs = self._obs_workspace[:len(env_ids)]
+
+        humanoid_slice = self._obs_layout.slices['humanoid']
+        self._compute_humanoid_obs(env_ids, out=obs[:, humanoid_slice])
+        if (self._enable_task_obs):
+            self._compute_task_obs(env_ids, out=obs[:, humanoid_slice.stop:])
+
+        if (env_ids is not None):
             self.obs_buf[env_ids] = obs
         return
 
-    def _compute_task_obs(self, env_ids=None):
+    def _compute_task_obs(self, env_ids=None, out=None):
         return NotImplemented
 
     def _compute_reward(self, actions):
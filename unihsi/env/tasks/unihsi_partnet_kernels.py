@@ -0,0 +1,212 @@
+import torch
+from typing import Tuple, Optional
+
+from utils.quat import quat_mul, quat_rotate, quat_to_tan_norm
+from utils.height_map import sample_height_map
+
+# kernels are script compatible, compiled per config through utils/kernels.py.
+# They only need torch so they run without isaacgym
+def compute_strike_observations(root_states, heading_rot, flat_heading_rot, tar_pos, joint_pos_buffer, pcd_buffer, tar_rot, contact_type, contact_valid, contact_direction, 
+                                human_in_mesh, origin_root_pos, local_scale, height_map_pcd, mesh_pos, tar_dir, out,
+                                height_texture, height_frame, height_lookup='brute'):
+    # type: (Tensor, Tensor, Tensor, Tensor, Tensor, Tensor, Tensor, Tensor, Tensor, Tensor, Tensor, Tensor, int, Tensor, Tensor, Tensor, Tensor, Tensor, Tensor, str) -> Tuple[Tensor, Tensor, Tensor]
+    # components are written into their slices of out, see _add_task_obs_layout,
+    # the target velocity is always zero and written once at init. heading_rot is
+    # the inverse heading rotation of the root, flat_heading_rot its rows repeated per joint
+    root_pos = root_states[:, 0:3]
+    root_rot = root_states[:, 3:7]
+
+    local_tar_pos = tar_pos - root_pos
+    local_tar_pos[..., -1] = tar_pos[..., -1]
+    local_tar_pos = quat_rotate(heading_rot, local_tar_pos)
+
+    local_tar_rot = quat_mul(heading_rot, tar_rot)
+    local_tar_rot_obs = quat_to_tan_norm(local_tar_rot)
+
+    env_mesh_pos = mesh_pos[None] + (root_pos -human_in_mesh)[:, None]
+    mesh_dist = (env_mesh_pos - root_pos[:, None]).reshape(-1, 3)
+    # per env, then broadcast over the height map cells
+    heading_rot_for_height = root_rot.clone()
+    heading_rot_for_height[:, :2] = 0
+    heading_rot_norm = torch.sqrt(1 - heading_rot_for_height[:, 3]*heading_rot_for_height[:, 3])
+    heading_rot_for_height[:, 2] = heading_rot_for_height[:, 2] * heading_rot_norm / torch.abs(heading_rot_for_height[:, 2])
+    heading_rot_for_height = heading_rot_for_height[:, None].expand(-1, local_scale*local_scale, -1).reshape(-1, 4)
+    rotated_mesh_dist = quat_rotate(heading_rot_for_height, mesh_dist).reshape(-1, local_scale*local_scale, 3)
+    rotated_mesh_pos = rotated_mesh_dist + root_pos[:, None]
+    rotated_mesh_origin_pos = rotated_mesh_dist + origin_root_pos[:, None]
+    height_map = sample_height_map(height_map_pcd, height_texture, height_frame, rotated_mesh_origin_pos[..., :2], 0.05, height_lookup)
+    height_map = height_map.float()
+
+
+    num_joints = contact_type.shape[1]
+    out[:, 0:3] = local_tar_pos
+    out[:, 3:9] = local_tar_rot_obs
+    out[:, 12:15] = tar_dir
+    start = 15
+    out[:, start:start + num_joints] = contact_type
+    start += num_joints
+    out[:, start:start + num_joints] = contact_valid
+    start += num_joints
+    out[:, start:start + local_scale*local_scale] = height_map
+    start += local_scale*local_scale
+
+    local_target_pos = pcd_buffer - joint_pos_buffer
+    local_target_pos_r = quat_rotate(flat_heading_rot, local_target_pos.view(-1, 3))
+    local_target_pos_r = local_target_pos_r.reshape(local_target_pos.shape)
+    local_target_pos_r = local_target_pos_r * contact_valid[..., None]
+    out[:, start:start + 3 * num_joints] = local_target_pos_r.view(out.shape[0], -1)
+    start += 3 * num_joints
+    out[:, start:start + 3 * num_joints] = contact_direction.reshape(out.shape[0], -1)
+
+    return out, height_map, rotated_mesh_pos
+
+def compute_contact_reward(target, root_state, heading_rot, pcd_buffer, joint_pos_buffer, pcd_origin,
+                           prev_root_pos, dt, contact_type, contact_valid, contact_direction, candidates=None):
+    # type: (Tensor, Tensor, Tensor, Tensor, Tensor, Tensor, Tensor, float, Tensor, Tensor, Tensor, Optional[Tensor]) -> Tuple[Tensor, Tensor, Tensor, Tensor, Tensor]
+    # pcd_buffer holds positions relative to pcd_origin, possibly in reduced
+    # precision, the distances below are formed and reduced in fp32. With
+    # candidates it only holds the candidate points of every joint, candidates
+    # maps them back to point indices
+    dist_threshold = 0.2
+
+    pos_err_scale = 0.5
+    vel_err_scale = 2.0
+    near_pos_err_scale = 10
+
+    tar_speed = 1.0
+    
+    root_pos = root_state[..., 0:3]
+
+    contact_type = contact_type.float()
+    env_ids = torch.arange(pcd_buffer.shape[0], device=pcd_buffer.device)
+
+    # all joints at once, [num_envs, num_joints, num_pts]
+    local_joint_pos = joint_pos_buffer - pcd_origin[:, None]
+    # the [num_envs, num_joints, num_pts, 3] difference is the largest temporary of the step, square it in place
+    near_pos_diff = pcd_buffer - local_joint_pos[:, :, None]
+    near_pos_err = torch.sum(near_pos_diff.square_(), dim=-1)
+    near_pos_err_min_buf, min_pos_idx_buf = near_pos_err.min(-1)
+    near_pos_reward = torch.exp(-near_pos_err_scale * near_pos_err_min_buf)
+    near_pos_reward_contact = near_pos_reward * contact_type + (1-near_pos_reward) * (1-contact_type)
+
+    near_pos = torch.gather(pcd_buffer, 2, min_pos_idx_buf[..., None, None].expand(-1, -1, 1, 3)).squeeze(2)
+    reward_dir = torch.nn.functional.normalize(-(near_pos - local_joint_pos), dim=-1) * contact_direction
+    reward_dir = reward_dir.sum(-1)
+    reward_dir = torch.where(contact_direction.sum(-1)==0, torch.ones_like(reward_dir), reward_dir)
+    reward_dir = torch.where(reward_dir<0, torch.zeros_like(reward_dir), reward_dir)
+    reward_dir = torch.where(contact_type == 0, torch.ones_like(reward_dir), reward_dir)
+    contact_w = (1 - near_pos_reward_contact) / (2 - near_pos_reward_contact - reward_dir + 1e-4)
+    dir_w = (1 - reward_dir) / (2 - near_pos_reward_contact - reward_dir + 1e-4)
+    near_pos_err_min_buf = torch.where(reward_dir<0.5, near_pos_err_min_buf + 1, near_pos_err_min_buf) # not fullfill dir
+    near_pos_reward_contact = contact_w * near_pos_reward_contact + dir_w * reward_dir
+
+    near_pos_reward_buf = torch.where(~contact_valid, torch.ones_like(near_pos_reward_contact), near_pos_reward_contact)
+    near_pos_reward_w = (1 - near_pos_reward_buf) / (pcd_buffer.shape[1] - near_pos_reward_buf.sum(-1, keepdim=True) + 1e-4)
+
+    near_pos_reward = (near_pos_reward_w * near_pos_reward_buf).sum(-1)
+
+    facing_target = (contact_valid.sum(-1) == 1) & (contact_valid[:, -1] | contact_valid[:, -4])
+    facing_dir = torch.zeros_like(root_pos)
+    facing_dir[..., 0] = 1.0
+    facing_dir = quat_rotate(heading_rot, facing_dir)
+    
+    target_pcd = pcd_buffer[env_ids, -1, min_pos_idx_buf[:, -1]] + pcd_origin
+    pos_diff = target_pcd - root_pos
+    tar_dir = torch.nn.functional.normalize(pos_diff[..., 0:2], dim=-1)
+    tar_dir = torch.where(facing_target[:, None], tar_dir, facing_dir[..., 0:2])
+    obj_facing_reward = torch.sum(tar_dir * facing_dir[..., 0:2], dim=-1)
+    obj_facing_reward = torch.clamp_min(obj_facing_reward, 0.0)
+
+    obj_facing_reward_w = (1-obj_facing_reward) / (2-obj_facing_reward-near_pos_reward + 1e-4)
+    near_pos_reward_w = (1-near_pos_reward) / (2-obj_facing_reward-near_pos_reward + 1e-4)
+    
+    near_pos_reward = obj_facing_reward_w * obj_facing_reward + near_pos_reward_w * near_pos_reward
+
+    pos_diff = target - root_pos
+    pos_err = torch.sum(pos_diff * pos_diff, dim=-1)
+    pos_reward = torch.exp(-pos_err_scale * pos_err)
+
+    dist_mask = pos_err < dist_threshold
+
+    tar_dir = torch.nn.functional.normalize(pos_diff[..., 0:2], dim=-1)
+    delta_root_pos = root_pos - prev_root_pos
+    root_vel = delta_root_pos / dt
+    tar_dir_speed = torch.sum(tar_dir * root_vel[..., :2], dim=-1)
+    tar_vel_err = tar_speed - tar_dir_speed
+    vel_reward = torch.exp(-vel_err_scale * (tar_vel_err * tar_vel_err))
+    speed_mask = tar_dir_speed <= 0
+    vel_reward = torch.where(speed_mask, torch.zeros_like(vel_reward), vel_reward)
+    vel_reward = torch.where(dist_mask, torch.ones_like(vel_reward), vel_reward)
+
+    facing_err = torch.sum(tar_dir * facing_dir[..., 0:2], dim=-1)
+    facing_reward = torch.clamp_min(facing_err, 0.0)
+    facing_reward = torch.where(dist_mask, torch.ones_like(facing_reward), facing_reward)
+
+    pos_reward_w = (1-pos_reward) / (3-pos_reward-vel_reward-facing_reward + 1e-4)
+    vel_reward_w = (1-vel_reward) / (3-pos_reward-vel_reward-facing_reward + 1e-4)
+    face_reward_w = (1-facing_reward) / (3-pos_reward-vel_reward-facing_reward + 1e-4)
+
+    far_reward = pos_reward_w * pos_reward + vel_reward_w * vel_reward + face_reward_w * facing_reward
+
+    not_walking = contact_valid.sum(-1)>0
+
+    # dist_mask = pos_err < dist_threshold
+    reward = torch.where(not_walking, near_pos_reward, far_reward)
+    pos_err = torch.where(not_walking, torch.zeros_like(pos_err), pos_err) # once success, keep success
+    if candidates is not None:
+        min_pos_idx_buf = torch.gather(candidates, 2, min_pos_idx_buf[..., None]).squeeze(-1)
+    # reward[dist_mask] = reward_near[dist_mask]
+
+    return reward, pos_err, near_pos_err_min_buf, min_pos_idx_buf, tar_dir
+    
+def compute_humanoid_reset(reset_buf, progress_buf, contact_buf, contact_body_ids, rigid_body_pos, strike_body_ids, max_episode_length,
+                           enable_early_termination, termination_heights, _rigid_body_vel, still_buf, fulfill, big_force):
+    # type: (Tensor, Tensor, Tensor, Tensor, Tensor, Tensor, float, bool, Tensor, Tensor, Tensor, Tensor, Tensor) -> Tuple[Tensor, Tensor, Tensor]
+    contact_force_threshold = 1.0
+    
+    terminated = torch.zeros_like(reset_buf)
+
+    if (enable_early_termination):
+        masked_contact_buf = contact_buf.clone()
+        masked_contact_buf[:, contact_body_ids, :] = 0
+        fall_contact = torch.any(torch.abs(masked_contact_buf) > 0.1, dim=-1)
+        fall_contact = torch.any(fall_contact, dim=-1)
+
+        body_height = rigid_body_pos[..., 2]
+        fall_height = body_height < termination_heights
+        fall_height[:, contact_body_ids] = False
+        fall_height = torch.any(fall_height, dim=-1)
+
+        has_fallen = torch.logical_and(fall_contact, fall_height)
+
+        # tar_has_contact = torch.any(torch.abs(tar_contact_forces[..., 0:2]) > contact_force_threshold, dim=-1)
+        #strike_body_force = contact_buf[:, strike_body_id, :]
+        #strike_body_has_contact = torch.any(torch.abs(strike_body_force) > contact_force_threshold, dim=-1)
+        nonstrike_body_force = masked_contact_buf
+        nonstrike_body_force[:, strike_body_ids, :] = 0
+        nonstrike_body_has_contact = torch.any(torch.abs(nonstrike_body_force) > contact_force_threshold, dim=-1)
+        nonstrike_body_has_contact = torch.any(nonstrike_body_has_contact, dim=-1)
+
+        # tar_fail = torch.logical_and(tar_has_contact, nonstrike_body_has_contact)
+        
+        # has_failed = torch.logical_or(has_fallen, tar_fail)
+        has_failed = has_fallen
+
+        # first timestep can sometimes still have nonzero contact forces
+        # so only check after first couple of steps
+        has_failed = has_failed & (progress_buf > 1)
+        terminated = torch.where(has_failed, torch.ones_like(reset_buf), terminated)
+    
+    max_body_vel = _rigid_body_vel.abs().sum(-1).max(-1)[0]
+    still_buf = torch.where(max_body_vel<0.6, still_buf + 1, still_buf)
+    still_buf = torch.where(max_body_vel>0.6, torch.zeros_like(still_buf), still_buf)
+    # print(_rigid_body_vel.abs().sum(-1).max(-1))
+
+    # print(still_buf)
+
+    terminated = torch.where(big_force, torch.ones_like(reset_buf), terminated) # terminate when force is too big (could cause peneration)
+
+    reset = torch.where(progress_buf >= max_episode_length - 1, torch.ones_like(reset_buf), terminated)
+    reset = torch.where((still_buf>10) & fulfill, torch.ones_like(reset_buf), reset)
+    
+    return reset, terminated, still_buf
\ No newline at end of file
@@ -8,101 +8,24 @@ from isaacgym.torch_utils import *
 
 import env.tasks.humanoid_amp as humanoid_amp
 import env.tasks.humanoid_amp_task as humanoid_amp_task
-from utils import torch_utils
-import open3d as o3d
+from utils import scene_loader
+from utils.scene_cache import SceneCache
+from utils.asset_registry import AssetRegistry
+from utils.height_map import HEIGHT_LOOKUPS, get_height_maps, build_height_textures
+from utils.pointcloud import batched_farthest_point_sample
+from utils.coc_table import build_step_offsets, step_rows, gather_part_pcds, table_nbytes
+from utils.terrain import build_terrain_meshes, add_terrain_meshes, z_rotation
+from utils.sceneplan import SceneplanIndex, materialize_scene_plans
+from utils.kernels import compile_kernel
+from utils.op_counter import OpCounter
+from utils.sync_counter import SyncCounter
+from utils.precision import storage_dtype, report_precision
+from utils.point_index import VoxelPointIndex
+from utils.plan_stats import PlanStepStats
+from utils.task_rng import task_generator, rand, randint
+from env.tasks.unihsi_partnet_kernels import compute_strike_observations, compute_contact_reward, compute_humanoid_reset
 
 
-import json
-
-def load_label(fn):
-    with open(fn, 'r') as fin:
-        lines = [item.rstrip() for item in fin]
-        label = np.array([int(line) for line in lines], dtype=np.int32)
-        return label
-
-def get_leaf_node(dic, results, offset):
-    for i in range(len(results)):
-        result = results[i]
-        if 'children' in result.keys():
-            get_leaf_node(dic, result['children'], offset)
-        else:
-            dic[result['name']+str(result['id'])] = result['id'] + offset
-
-def farthest_point_sample(xyz, npoint):
-    """
-    Input:
-        xyz: pointcloud data, [B, N, 3]
-        npoint: number of samples
-    Return:
-        centroids: sampled pointcloud index, [B, npoint]
-    """
-    device = xyz.device
-    B, N, C = xyz.shape
-    centroids = torch.zeros(B, npoint, dtype=torch.long).to(device)
-    distance = torch.ones(B, N).to(device) * 1e10
-    farthest = torch.randint(0, N, (B,), dtype=torch.long).to(device)
-    batch_indices = torch.arange(B, dtype=torch.long).to(device)
-    for i in range(npoint):
-        centroids[:, i] = farthest
-        centroid = xyz[batch_indices, farthest, :].view(B, 1, 3)
-        dist = torch.sum((xyz - centroid) ** 2, -1)
-        mask = dist < distance
-        distance[mask] = dist[mask]
-        farthest = torch.max(distance, -1)[1]
-    return centroids
-
-def get_height_map(points: np.ndarray, HEIGHT_MAP_DIM: int=16):
-    """ Load region meshes of a scenes
-
-    Args:
-        points: scene point cloud
-        HEIGHT_MAP_DIM: height map dimension
-    
-    Return:
-        Return the floor height map and axis-aligned scene bounding box
-    """
-
-    ## compute floor height map
-    minx, miny = points[:, 0].min(), points[:, 1].min()
-    maxx, maxy = points[:, 0].max(), points[:, 1].max()
-
-    interval_x = (maxx-minx)/HEIGHT_MAP_DIM
-    interval_y = (maxy-miny)/HEIGHT_MAP_DIM
-    voxel_idx_x = (points[:, 0]-minx) // interval_x
-    voxel_idx_y = (points[:, 1]-miny) // interval_y
-
-    height_map2d = np.zeros((HEIGHT_MAP_DIM,HEIGHT_MAP_DIM))
-    for i in range(HEIGHT_MAP_DIM):
-        for j in range(HEIGHT_MAP_DIM):
-            mask = (voxel_idx_x==i)&(voxel_idx_y==j)
-            if mask.sum()==0:
-                pass
-            else:
-                height_map2d[j,i] = points[mask, 2].max()
-
-    x = np.linspace(minx, maxx, HEIGHT_MAP_DIM)
-    y = np.linspace(miny, maxy, HEIGHT_MAP_DIM)
-    xx, yy = np.meshgrid(x, y)
-    # pos2d = np.concatenate([yy[..., None], xx[..., None]], axis=-1)
-    pos2d = np.concatenate([xx[..., None], yy[..., None]], axis=-1)
-
-    height_pcd = np.concatenate([pos2d.reshape(-1,2),height_map2d.reshape(-1,1)], axis=-1)
-
-    return height_pcd
-
-def VaryPoint(data, axis, degree):
-    xyzArray = {
-        'X': np.array([[1, 0, 0],
-                  [0, np.cos(np.radians(degree)), -np.sin(np.radians(degree))],
-                  [0, np.sin(np.radians(degree)), np.cos(np.radians(degree))]]),
-        'Y': np.array([[np.cos(np.radians(degree)), 0, np.sin(np.radians(degree))],
-                  [0, 1, 0],
-                  [-np.sin(np.radians(degree)), 0, np.cos(np.radians(degree))]]),
-        'Z': np.array([[np.cos(np.radians(degree)), -np.sin(np.radians(degree)), 0],
-                  [np.sin(np.radians(degree)), np.cos(np.radians(degree)), 0],
-                  [0, 0, 1]])}
-    newData = np.dot(data, xyzArray[axis])
-    return newData
 
 class UniHSI_PartNet_Train(humanoid_amp_task.HumanoidAMPTask):
 
@@ -113,15 +36,60 @@ class UniHSI_PartNet_Train(humanoid_amp_task.HumanoidAMPTask):
         self.env_array = torch.arange(0, cfg["env"]["numEnvs"], device=device_type, dtype=torch.float)
         self.spacing = cfg["env"]["envSpacing"]
         sceneplan_path = cfg['objFile']
-        with open(sceneplan_path) as f:
-            self.sceneplan = json.load(f)
+        # plans are only materialized once they are drawn into the scene grid
+        self.sceneplan = SceneplanIndex(sceneplan_path)
         strike_body_names = cfg["env"]["strikeBodyNames"]
-        self.plan_items = self.sceneplan
+
+        scene_cache_dir = cfg["env"].get("sceneCacheDir", None)
+        self._scene_cache = SceneCache(scene_cache_dir) if scene_cache_dir else None
+        self._num_loader_workers = cfg["env"].get("numLoaderWorkers", 0)
+        # 0 uploads one triangle mesh per scene tile
+        self._num_terrain_meshes = cfg["env"].get("numTerrainMeshes", 0)
+        # nearest-cell lookup of the local height map: brute (exhaustive search), grid (O(1)
+        # projection) or texture (one grid_sample), gridHeightLookup selects grid
+        self._height_lookup = cfg["env"].get("heightLookup", "grid" if cfg["env"].get("gridHeightLookup", False) else "brute")
+        if self._height_lookup not in HEIGHT_LOOKUPS:
+            raise ValueError('unknown height lookup {}, expected one of {}'.format(self._height_lookup, HEIGHT_LOOKUPS))
+        # eager, script (TorchScript) or compile (torch.compile) for the obs / reward / reset kernels
+        kernel_mode = cfg["env"].get("kernelMode", "eager")
+        verify_kernels = cfg["env"].get("verifyKernels", False)
+        self._compute_strike_observations = compile_kernel(compute_strike_observations, kernel_mode, verify_kernels)
+        self._compute_contact_reward = compile_kernel(compute_contact_reward, kernel_mode, verify_kernels)
+        self._compute_humanoid_reset = compile_kernel(compute_humanoid_reset, kernel_mode, verify_kernels)
+        # count gathers and allocations of the observation / reward step, reported every N steps
+        self._op_count_interval = cfg["env"].get("countTaskOps", 0)
+        self._op_counter = OpCounter('obs + reward') if self._op_count_interval > 0 else None
+        # count the host-device syncs of every step and reset by call site, report every N steps
+        self._sync_count_interval = cfg["env"].get("countSyncs", 0)
+        self._sync_counter = SyncCounter('step') if self._sync_count_interval > 0 else None
+        if (cfg["env"].get("captureStep", False) and (self._op_count_interval > 0 or self._sync_count_interval > 0
+                                                     or cfg["env"].get("checkPrecision", 0) > 0)):
+            # the counters and the precision check run on the host every step
+            print("captureStep: disabled by countTaskOps / countSyncs / checkPrecision")
+            cfg["env"]["captureStep"] = False
+        # fp32, fp16 or bf16 storage of the object pointclouds and height maps
+        self._storage_dtype = storage_dtype(cfg["env"].get("storagePrecision", "fp32"))
+        # compare the task obs / reward against fp32 buffers every N steps, keeps fp32 copies
+        self._precision_check_interval = cfg["env"].get("checkPrecision", 0)
+        self._precision_check_steps = 0
+        # points sampled per contact part
+        self._num_part_points = cfg["env"].get("numPartPoints", 200)
+        # compare every joint against the candidate points of a voxel index of its
+        # target part instead of all part points, see utils/point_index.py
+        self._use_contact_index = cfg["env"].get("contactIndex", False)
+        self._contact_index_dim = cfg["env"].get("contactIndexDim", 12)
+        self._contact_index_candidates = cfg["env"].get("contactIndexCandidates", 48)
+        self._contact_index_margin = cfg["env"].get("contactIndexMargin", 0.5)
+        # seed of the scene placement and reset sampling, the run seed by default
+        self._task_seed = cfg["env"].get("taskSeed", None)
+        registry_max_mb = cfg["env"].get("assetRegistryMaxMB", None)
+        self._asset_registry = AssetRegistry(registry_max_mb * 2**20 if registry_max_mb else None)
 
 
         self.joint_num = len(strike_body_names)
-        self.local_scale = 9
-        self.local_interval = 0.2
+        # local height observation, local_scale x local_scale samples local_interval apart
+        self.local_scale = cfg["env"].get("localHeightScale", 9)
+        self.local_interval = cfg["env"].get("localHeightInterval", 0.2)
 
         self.max_step_pool_number = 30
 
@@ -148,6 +116,9 @@ class UniHSI_PartNet_Train(humanoid_amp_task.HumanoidAMPTask):
 
         self.contact_type = torch.zeros([self.num_envs, self.joint_num], device=self.device, dtype=torch.bool)
         self.contact_valid = torch.zeros([self.num_envs, self.joint_num], device=self.device, dtype=torch.bool)
+        self.contact_direction = torch.zeros([self.num_envs, self.joint_num, 3], device=self.device, dtype=torch.long)
+        self.stand_point = torch.zeros([self.num_envs, 3], device=self.device, dtype=torch.float)
+        self._up_axis = torch.tensor([0.0, 0.0, 1.0], device=self.device)
 
         self.joint_diff_buff = torch.ones([self.num_envs, self.joint_num], device=self.device, dtype=torch.float)
         self.location_diff_buf = torch.ones([self.num_envs], device=self.device, dtype=torch.float)
@@ -160,7 +131,23 @@ class UniHSI_PartNet_Train(humanoid_amp_task.HumanoidAMPTask):
         self.pelvis2torso[:, 2] += 0.15
         self.torso2head = torch.tensor([0, 0, 0.223894]).to(self.device)[None].repeat(self.num_envs, 1)
         self.torso2head[:, 2] += 0.15
-        self.new_rigid_body_pos = torch.ones([self.num_envs, 15, 3], device=self.device, dtype=torch.float)
+        # per-step buffers shared by the task observations and the contact reward
+        self.new_rigid_body_pos = self._rigid_body_pos.clone()
+        self._joint_pos_buf = self.new_rigid_body_pos[:, self._strike_body_ids].clone()
+        self._joint_contact_choice = torch.zeros([self.num_envs, self.joint_pairs.shape[1]], device=self.device, dtype=torch.long)
+        self._valid_joint_contact_choice = torch.zeros([self.num_envs, self.joint_pairs.shape[1]], device=self.device, dtype=torch.bool)
+        if (self._contact_index is None):
+            self._contact_target_idx = None
+            self._contact_target_buf = torch.zeros_like(self.envs_obj_pcd_buffer)
+        else:
+            # point index and position of the candidate targets of every joint
+            self._contact_target_idx = torch.zeros([self.num_envs, self.joint_pairs.shape[1], self._contact_index.num_candidates], device=self.device, dtype=torch.long)
+            self._contact_target_buf = self.envs_obj_pcd_buffer.new_zeros(self._contact_target_idx.shape + (3,))
+        self._contact_target_reference = None
+        if (self._obj_pcd_reference is not None):
+            self._contact_target_reference = torch.zeros_like(self._contact_target_buf, dtype=torch.float)
+        self._obs_tar_rot = torch.zeros([self.num_envs, 4], device=self.device, dtype=torch.float)
+        self._obs_tar_rot[:, 3] = 1
 
         self.step_mode = torch.zeros([self.num_envs], device=self.device, dtype=torch.long)
         self.change_obj = torch.zeros([self.num_envs], device=self.device, dtype=torch.bool)
@@ -185,8 +172,17 @@ class UniHSI_PartNet_Train(humanoid_amp_task.HumanoidAMPTask):
 
     def _create_mesh_ground(self):
         self.plan_number = len(self.sceneplan)
-        min_mesh_dict = self._load_mesh()
-        pcd_list = self._load_pcd(min_mesh_dict)
+        self._rng = task_generator(self.device, self._task_seed)
+        layout = self._draw_scene_layout()
+        self.plan_items, scene_idx = materialize_scene_plans(self.sceneplan, layout['scene_idx'])
+        self.scene_idx = torch.from_numpy(scene_idx).to(self.device)
+        print("sceneplan: {} plans in library, {} materialized".format(self.plan_number, len(self.plan_items)))
+        self.plan_number = len(self.plan_items)
+        self.scene_assets = scene_loader.ingest_partnet_plans(self.plan_items, self._scene_cache, self._num_loader_workers,
+                                                               self._asset_registry)
+        self._asset_registry.report()
+        self._load_mesh(layout)
+        pcd_list = self._load_pcd()
 
         self._get_pcd_parts(pcd_list)
 
@@ -215,6 +211,7 @@ class UniHSI_PartNet_Train(humanoid_amp_task.HumanoidAMPTask):
             joint_pairs = np.zeros(15)
             joint_pairs_valid = np.zeros(15)
             contact_direction_step = np.zeros((15,3))
+            row = int(self.step_offsets[plan_id]) + step_idx
 
             for pair in step:
                 obj_id = pair[0][-3:]
@@ -226,9 +223,10 @@ class UniHSI_PartNet_Train(humanoid_amp_task.HumanoidAMPTask):
                     stand_point = [[0,0,0],[0,0,0],[0,0,0],[0,0,0]]
                 obj_pcd = pcd[int(obj_id)*10000:(int(obj_id)+1)*10000]
                 if pair[1] != 'none' and pair[1] not in self.joint_name:
-                    part_pcd = self._get_obj_parts(pair[0], [pair[1]], label_mapping, label, obj_pcd, stand_point)
+                    part_pcds = self._get_obj_parts(pair[0], [pair[1]], label_mapping, label, obj_pcd, stand_point)
                     joint_number = self.joint_mapping[pair[2]]
-                    self.obj_pcd_buffer[plan_id, step_idx, joint_number] = part_pcd[0]
+                    # sampled later together with the parts of every plan
+                    self.pending_part_pcds.append((row, joint_number, part_pcds[0]))
                     contact_type_step[joint_number] = 1 if pair[3] == 'contact' else 0
                     contact_valid_step[joint_number] = 1
                     contact_direction_step[joint_number] = direction_mapping[pair[4]]
@@ -239,170 +237,96 @@ class UniHSI_PartNet_Train(humanoid_amp_task.HumanoidAMPTask):
                     joint_pairs_valid[joint_number] = 1
                     contact_direction_step[joint_number] = direction_mapping[pair[4]]
             
-            self.scene_stand_point[plan_id, step_idx] = torch.tensor(stand_point).float()
-            self.contact_type_step[plan_id, step_idx] = torch.tensor(contact_type_step)
-            self.contact_valid_step[plan_id, step_idx] = torch.tensor(contact_valid_step)
-            self.contact_direction_step[plan_id, step_idx] = torch.tensor(contact_direction_step) 
-            self.joint_pairs[plan_id, step_idx] = torch.tensor(joint_pairs)
-            self.joint_pairs_valid[plan_id, step_idx] = torch.tensor(joint_pairs_valid)
-
-    def _load_mesh(self):
-
-        mesh_vertices_list = []
-        mesh_triangles_list = []
-
-        min_mesh_dict = dict()
-        for plans in self.plan_items:
-            plan = self.plan_items[plans]
-            objs = plan['obj']
-            min_mesh_dict[plans] = dict()
-
-            l = 0
-            pn = 0
-            mesh_vertices = np.zeros([0, 3]).astype(np.float32)
-            mesh_triangles = np.zeros([0, 3]).astype(np.uint32)
-            for obj_id in objs:
-                obj = objs[obj_id]
-                pid = obj['id']
-                mesh = o3d.io.read_triangle_mesh('data/partnet/'+pid+'/models/model_normalized.obj')
-                for r in obj['rotate']:
-                    R = mesh.get_rotation_matrix_from_xyz(r)
-                    mesh.rotate(R, center=(0, 0, 0))
-                mesh.scale(obj['scale'], center=mesh.get_center())
-                mesh_vertices_single = np.asarray(mesh.vertices).astype(np.float32())
-                mesh.translate((0,0,-mesh_vertices_single[:, 2].min()))
-                mesh.translate(obj['transfer']) #  not collision with init human
-                # mesh.translate(obj['multi_obj_offset'])
-                mesh_vertices_single = np.asarray(mesh.vertices).astype(np.float32())
-                mesh_triangles_single = np.asarray(mesh.triangles).astype(np.uint32)
-
-                min_x_mesh, min_y_mesh, min_z_mesh = mesh_vertices_single[:,0].min(), mesh_vertices_single[:,1].min(), mesh_vertices_single[:,2].min()
-                min_mesh_dict[plans][obj_id] = [min_x_mesh, min_y_mesh, min_z_mesh]
-
-                mesh_vertices = np.concatenate([mesh_vertices, mesh_vertices_single], axis=0)
-                mesh_triangles = np.concatenate([mesh_triangles, mesh_triangles_single], axis=0)
-                mesh_triangles[l:] += pn
-                l = mesh_triangles.shape[0]
-                pn = mesh_vertices.shape[0]
-
-            mesh_vertices_list.append(mesh_vertices)
-            mesh_triangles_list.append(mesh_triangles)
-
-        
-
-        obj_idx = np.random.randint(0, self.plan_number, (self.num_scenes_row, self.num_scenes_col))
-        obj_rotate = np.random.rand(self.num_scenes_row, self.num_scenes_col) * 360.0
+            self.scene_stand_point[row] = torch.tensor(stand_point).float()
+            self.contact_type_step[row] = torch.tensor(contact_type_step)
+            self.contact_valid_step[row] = torch.tensor(contact_valid_step)
+            self.contact_direction_step[row] = torch.tensor(contact_direction_step) 
+            self.joint_pairs[row] = torch.tensor(joint_pairs)
+            self.joint_pairs_valid[row] = torch.tensor(joint_pairs_valid)
+
+    def _draw_scene_layout(self):
+        # random layout of the scene grid, drawn over the whole plan library
+        # before any plan is loaded
+        shape = (self.num_scenes_row, self.num_scenes_col)
+        obj_idx = randint(self._rng, self.plan_number, shape)
+        obj_rotate = (rand(self._rng, shape, torch.float64) * 360.0).cpu().numpy()
         obj_rotate_matrix = np.array([[np.cos(np.radians(obj_rotate)), -np.sin(np.radians(obj_rotate)), obj_rotate*0],
                                     [np.sin(np.radians(obj_rotate)), np.cos(np.radians(obj_rotate)), obj_rotate*0],
                                     [obj_rotate*0, obj_rotate*0, obj_rotate*0+1]])
 
-        self.obj_idx = torch.from_numpy(obj_idx).to(self.device)
+        self.obj_idx = obj_idx
         self.obj_rotate_matrix = torch.from_numpy(obj_rotate_matrix).to(self.device)
 
         dist_max = 2
         dist_min = 1
-        rand_dist_x = (dist_max - dist_min) * np.random.rand(self.num_scenes_row, self.num_scenes_col) + dist_min
-        rand_dist_y = (dist_max - dist_min) * np.random.rand(self.num_scenes_row, self.num_scenes_col) + dist_min
+        rand_dist_x = ((dist_max - dist_min) * rand(self._rng, shape, torch.float64) + dist_min).cpu().numpy()
+        rand_dist_y = ((dist_max - dist_min) * rand(self._rng, shape, torch.float64) + dist_min).cpu().numpy()
         rand_dist_x[0] = 0
         rand_dist_y[0] = 0
         self.rand_dist_x = torch.from_numpy(rand_dist_x).to(self.device)
         self.rand_dist_y = torch.from_numpy(rand_dist_y).to(self.device)
-        rand_dist_z = np.random.rand(self.num_scenes_row, self.num_scenes_col) * 1.2 - 0.6
+        rand_dist_z = (rand(self._rng, shape, torch.float64) * 1.2 - 0.6).cpu().numpy()
         change_height = 0
         rand_dist_z = rand_dist_z * change_height
         self.rand_dist_z = torch.from_numpy(rand_dist_z).to(self.device)
 
 
-        scene_idx = np.random.randint(0, self.plan_number, (self.num_scenes_row, self.num_scenes_col))
-        self.scene_idx = torch.from_numpy(scene_idx).to(self.device)
+        scene_idx = randint(self._rng, self.plan_number, shape).cpu().numpy()
 
-        for i in range(self.num_scenes_row):
-            for j in range(self.num_scenes_col):
-                mesh_vertices = mesh_vertices_list[self.scene_idx[i,j]]
-                mesh_triangles = mesh_triangles_list[self.scene_idx[i,j]]
-                mesh_vertices_offset = mesh_vertices.copy()
-                mesh_vertices_offset = VaryPoint(mesh_vertices_offset, 'Z', obj_rotate[i,j]).astype(np.float32)
-                mesh_vertices_offset[:, 0] += self.spacing *2 * i + rand_dist_x[i, j]
-                mesh_vertices_offset[:, 1] += self.spacing *2 * j + rand_dist_y[i, j]
-                mesh_vertices_offset[:, 2] += rand_dist_z[i, j]
-
-                tm_params = gymapi.TriangleMeshParams()
-                tm_params.nb_vertices = mesh_vertices_offset.shape[0]
-                tm_params.nb_triangles = mesh_triangles.shape[0]
-                self.gym.add_triangle_mesh(self.sim, mesh_vertices_offset.flatten(order='C'),
-                                        mesh_triangles.flatten(order='C'),
-                                        tm_params)
-        
-        return min_mesh_dict
-    
-    def _load_pcd(self, min_mesh_dict):
+        return {'obj_rotate': obj_rotate, 'rand_dist_x': rand_dist_x, 'rand_dist_y': rand_dist_y,
+                'rand_dist_z': rand_dist_z, 'scene_idx': scene_idx}
 
-        trans_mat_path = 'data/partnet/chair_table_storagefurniture_bed_shapenetv1_to_partnet_alignment.json'
-        with open(trans_mat_path, 'r') as fcc_file:
-            trans_mat = fcc_file.read()
-        trans_mat = json.loads(trans_mat)
+    def _load_mesh(self, layout):
 
+        mesh_vertices_list = []
+        mesh_triangles_list = []
+
+        self.min_mesh_dict = dict()
+        for plans in self.plan_items:
+            mesh_vertices_list.append(self.scene_assets[plans]['vertices'])
+            mesh_triangles_list.append(self.scene_assets[plans]['triangles'])
+            self.min_mesh_dict[plans] = self.scene_assets[plans]['min_mesh']
+
+        obj_rotate = layout['obj_rotate']
+        rand_dist_x = layout['rand_dist_x']
+        rand_dist_y = layout['rand_dist_y']
+        rand_dist_z = layout['rand_dist_z']
+        scene_idx = self.scene_idx.cpu().numpy()
+
+        tile_offsets = np.stack([self.spacing * 2 * np.arange(self.num_scenes_row)[:, None] + rand_dist_x,
+                                 self.spacing * 2 * np.arange(self.num_scenes_col)[None] + rand_dist_y,
+                                 rand_dist_z], axis=-1)
+        tile_rotations = np.array([[z_rotation(obj_rotate[i, j]) for j in range(self.num_scenes_col)] for i in range(self.num_scenes_row)])
+        meshes = build_terrain_meshes(mesh_vertices_list, mesh_triangles_list, scene_idx, tile_offsets, tile_rotations,
+                                      self._num_terrain_meshes)
+        num_meshes, num_vertices, num_triangles = add_terrain_meshes(self.gym, self.sim, meshes, gymapi.TriangleMeshParams)
+        print("terrain: {} meshes, {} vertices, {} triangles".format(num_meshes, num_vertices, num_triangles))
+        
+        return
+    
+    def _load_pcd(self):
+        # point samples are already aligned with the meshes by scene_loader
         pcds = dict()
         for plans in self.plan_items:
-            plan = self.plan_items[plans]
-            objs = plan['obj']
-
-            pcd_multi = []
-            for obj_id in objs:
-                obj = objs[obj_id]
-                pid = obj['id']
-                pcd = o3d.io.read_point_cloud("data/partnet/"+pid+"/point_sample/sample-points-all-pts-label-10000.ply")
-
-                if pid == '11570' or pid == "11873" or pid == "4376" or pid == "5861":
-                    pcd.scale(0.5, center=pcd.get_center())
-                else:
-                    matrix = np.array(trans_mat[pid]['transmat']).reshape(4,4)
-                    tmp = matrix[0].copy()
-                    matrix[0] = matrix[2]
-                    matrix[2] = tmp
-                    matrix = np.linalg.inv(matrix)
-                    pcd.transform(matrix)
-
-                for r in obj['rotate']:
-                    R = pcd.get_rotation_matrix_from_xyz(r)
-                    pcd.rotate(R, center=(0, 0, 0))
-                pcd.scale(obj['scale'], center=pcd.get_center())
-
-                if pid == '11570':
-                    R = pcd.get_rotation_matrix_from_xyz((0, 0, -np.pi))
-                    pcd.rotate(R, center=(0, 0, 0))
-                
-
-                pcd = np.asarray(pcd.points).astype(np.float32())
-
-                max_y = pcd[:, 1].max()
-                pcd[:, 1] = max_y - pcd[:, 1] # flip
-
-                min_x_pcd, min_y_pcd, min_z_pcd = pcd[:,0].min(), pcd[:,1].min(), pcd[:,2].min()
-                min_x_mesh, min_y_mesh, min_z_mesh = min_mesh_dict[plans][obj_id]
-                pcd[:,0] += min_x_mesh-min_x_pcd 
-                pcd[:,1] += min_y_mesh-min_y_pcd 
-                pcd[:,2] += min_z_mesh-min_z_pcd
-                pcd_multi.append(pcd)
-            pcd_multi = np.concatenate(pcd_multi, axis=0)
-
-            pcds[plans] = pcd_multi
+            pcds[plans] = self.scene_assets[plans]['pcd']
         
         return pcds
 
     def _get_pcd_parts(self, pcd_list):
         # self.valid_joints_mask = torch.zeros([self.obj_number, 2, self.joint_num], dtype=bool, device=self.device) # hard code
 
-        self.height_map = []
-        self.obj_pcd_buffer = torch.zeros([self.plan_number, self.max_step_pool_number, 15, 200, 3])
-        self.contact_type_step = torch.zeros([self.plan_number, self.max_step_pool_number, 15])
-        self.contact_valid_step = torch.zeros([self.plan_number, self.max_step_pool_number, 15])
-        self.contact_direction_step = torch.zeros([self.plan_number, self.max_step_pool_number, 15, 3])
-        self.joint_pairs = torch.zeros([self.plan_number, self.max_step_pool_number, 15])
-        self.joint_pairs_valid = torch.zeros([self.plan_number, self.max_step_pool_number, 15])        
-        self.scene_stand_point = torch.zeros([self.plan_number, self.max_step_pool_number, 4, 3])        
-        self.max_steps = torch.zeros(self.plan_number).int()
+        # packed CoC tables with one row per existing (plan, step), see utils/coc_table.py
+        self.max_steps = torch.tensor([len(self.plan_items[plan_id]['contact_pairs']) for plan_id in self.plan_items]).int()
+        self.step_offsets, num_rows = build_step_offsets(self.max_steps)
+        self.part_slot = torch.zeros([num_rows, 15]).long()
+        self.contact_type_step = torch.zeros([num_rows, 15])
+        self.contact_valid_step = torch.zeros([num_rows, 15])
+        self.contact_direction_step = torch.zeros([num_rows, 15, 3])
+        self.joint_pairs = torch.zeros([num_rows, 15])
+        self.joint_pairs_valid = torch.zeros([num_rows, 15])
+        self.scene_stand_point = torch.zeros([num_rows, 4, 3])
         self.contact_pairs = []
+        self.pending_part_pcds = []
 
         for idx, plan_id in enumerate(self.plan_items):
             obj = self.plan_items[plan_id]['obj']
@@ -412,20 +336,18 @@ class UniHSI_PartNet_Train(humanoid_amp_task.HumanoidAMPTask):
 
             label_dict = dict()
             for obj_item in obj:
-                obj_id = obj[obj_item]['id']
-                label, label_mapping = self._get_part_labels(obj_id)
+                label, label_mapping = self.scene_assets[plan_id]['labels'][obj_item]
                 label_dict[obj_item] = {'label': label, 'label_mapping': label_mapping}
 
             self.process_contact(label_dict, pcd, obj, contact_pairs, step_number, idx)
-            heigh_pcd = get_height_map(pcd, HEIGHT_MAP_DIM=20)
-            self.height_map.append(torch.from_numpy(heigh_pcd).to(self.device))
-            self.max_steps[idx] = step_number
             self.contact_pairs.append(contact_pairs)
 
 
             
 
-        self.height_map = torch.stack(self.height_map,0).to(self.device)
+        self._sample_part_pcds()
+        heigh_pcds = get_height_maps([pcd_list[plan_id] for plan_id in self.plan_items], HEIGHT_MAP_DIM=20)
+        self.height_map = torch.from_numpy(heigh_pcds).to(self.device)
         self.scene_stand_point =  self.scene_stand_point.to(self.device)
         self.contact_type_step = self.contact_type_step.to(self.device).bool()
         self.contact_valid_step = self.contact_valid_step.to(self.device).bool()
@@ -434,32 +356,24 @@ class UniHSI_PartNet_Train(humanoid_amp_task.HumanoidAMPTask):
         self.joint_pairs_valid = self.joint_pairs_valid.to(self.device).bool()
         self.contact_valid_step = self.contact_valid_step | self.joint_pairs_valid  # TODO add joint contact type
         self.contact_type_step = self.contact_type_step | self.joint_pairs_valid
-        self.obj_pcd_buffer = self.obj_pcd_buffer.to(self.device)
+        self.part_slot = self.part_slot.to(self.device)
+        self.step_offsets = self.step_offsets.to(self.device)
         self.max_steps = self.max_steps.to(self.device)
-
-    def _get_part_labels(self, partnet_id):
-
-        if not isinstance(partnet_id, list):
-            partnet_id = [partnet_id]
-
-        result_dict_full = dict()
-        offset = 0
-        labels = []
-        for pid in partnet_id:
-            label_file = "data/partnet/"+pid+"/point_sample/sample-points-all-label-10000.txt"
-            label = load_label(label_file) + offset
-            result_file = "data/partnet/"+pid+"/result.json"
-            with open(result_file, 'r') as fcc_file:
-                result_file = fcc_file.read()
-            result = json.loads(result_file)
-            result_dict = dict()
-            get_leaf_node(result_dict, result, offset)
-            result_dict_full.update(result_dict)
-            offset += 100 # hard code
-            labels.append(label)
-        labels = np.concatenate(labels, axis=0)
-        
-        return labels, result_dict_full
+        # outcome counters of every step, flushed by the agent every plan_stats_freq epochs
+        self.plan_stats = None
+        if self.cfg["env"].get("planStats", True):
+            self.plan_stats = PlanStepStats(self.step_offsets, self.max_steps, num_rows, self.plan_items.keys(), self.device)
+
+        dense_nbytes = self.plan_number * self.max_step_pool_number * 15 * table_nbytes(self.part_pcds[0])
+        print("CoC tables: {} step rows, {} contact parts, {:.1f} MB (dense {:.1f} MB)".format(
+            num_rows, self.part_pcds.shape[0] - 1, table_nbytes(self.part_pcds) / 2**20, dense_nbytes / 2**20))
+
+        self._contact_index = None
+        if self._use_contact_index:
+            self._contact_index = VoxelPointIndex(self.part_pcds, self._contact_index_dim, self._contact_index_candidates, self._contact_index_margin)
+            print("Contact index: {} candidates of {} points, {:.1f} listed per cell, {:.1%} cells truncated, {:.1f} MB".format(
+                self._contact_index.num_candidates, self.part_pcds.shape[1], self._contact_index.mean_listed,
+                self._contact_index.truncated, self._contact_index.nbytes() / 2**20))
 
     def _get_obj_parts(self, object, contact_parts, label_mapping, label, pcd, stand_point):
 
@@ -468,7 +382,7 @@ class UniHSI_PartNet_Train(humanoid_amp_task.HumanoidAMPTask):
         obj_pcd_buffer = []
         for p in contact_parts:
             if 'floor' in p:
-                out_part_pcd = torch.rand(30000,3).cuda()
+                out_part_pcd = rand(self._rng, (30000, 3))
                 out_part_pcd[:,0] = out_part_pcd[:,0] * ((max_x+0.5)-(min_x-0.5)) + min_x-0.5
                 out_part_pcd[:,1] = out_part_pcd[:,1] * ((max_y+0.5)-(min_y-0.5)) + min_y-0.5
                 out_part_pcd[:,2] = out_part_pcd[:,2] * 0.08
@@ -487,18 +401,40 @@ class UniHSI_PartNet_Train(humanoid_amp_task.HumanoidAMPTask):
                 out_part_pcd = part_pcd[(part_pcd[:,0] <= max((max_x-0.2), (max_x-min_x)/5*4+min_x)) & (part_pcd[:,0] >= min(min_x+0.2, (max_x-min_x)/5*1+min_x)) &
                                     (part_pcd[:,1] <= max((max_y-0.2), (max_y-min_y)/5*4+min_y)) & (part_pcd[:,1] >= min(min_y+0.2, (max_y-min_y)/5*1+min_y))] # filter edge
                 out_part_pcd = torch.from_numpy(out_part_pcd).to(self.device)
-            idx = farthest_point_sample(out_part_pcd[None], 200)
-            out_part_pcd = out_part_pcd[idx]
             obj_pcd_buffer.append(out_part_pcd)
-        obj_pcd_buffer = torch.cat(obj_pcd_buffer, 0)
 
         return obj_pcd_buffer
 
+    def _sample_part_pcds(self):
+        # a single batched FPS pass over the contact parts collected from all plans
+        self.part_pcds = torch.zeros([len(self.pending_part_pcds) + 1, self._num_part_points, 3], device=self.device)
+        if len(self.pending_part_pcds) == 0:
+            return
+        part_pcds = [part_pcd for _, _, part_pcd in self.pending_part_pcds]
+        sample_idx = batched_farthest_point_sample(part_pcds, self._num_part_points, self._rng)
+        for slot, ((row, joint_number, part_pcd), idx) in enumerate(zip(self.pending_part_pcds, sample_idx), 1):
+            self.part_pcds[slot] = part_pcd[idx]
+            self.part_slot[row, joint_number] = slot
+        self.pending_part_pcds = []
+
     def get_task_obs_size(self):
         obs_size = 0
         if (self._enable_task_obs):
             obs_size = 15 + self.joint_num * 2 + self.joint_num * 3  + self.local_scale*self.local_scale + self.joint_num*3
         return obs_size
+
+    def _add_task_obs_layout(self, layout):
+        # in the order compute_strike_observations writes them
+        layout.add('tar_pos', 3)
+        layout.add('tar_rot', 6)
+        layout.add('tar_vel', 3, constant=0)
+        layout.add('tar_dir', 3)
+        layout.add('contact_type', self.joint_num)
+        layout.add('contact_valid', self.joint_num)
+        layout.add('height_map', self.local_scale*self.local_scale)
+        layout.add('contact_target', self.joint_num * 3)
+        layout.add('contact_direction', self.joint_num * 3)
+        return
     
     def _create_envs(self, num_envs, spacing, num_per_row):
         self.spacing = spacing # env==2,3 have stupid bug
@@ -510,24 +446,40 @@ class UniHSI_PartNet_Train(humanoid_amp_task.HumanoidAMPTask):
         self.x_offset = (self.env_array % num_per_row % self.num_scenes_row) * spacing * 2 - (self.env_array % num_per_row) * spacing * 2
         self.y_offset = (self.env_array // num_per_row % self.num_scenes_col) * spacing * 2- (self.env_array // num_per_row) * spacing * 2
 
+        # reduced precision pointclouds are stored relative to the env origin
+        self._pcd_origin = torch.stack([self.x_offset, self.y_offset, torch.zeros_like(self.x_offset)], -1).float()
+        if (self._storage_dtype == torch.float32):
+            self._pcd_origin.zero_()
         # [num_envs, num_obj, num_part_sequence, num_pts. 3]
-        self.envs_obj_pcd_buffer = self.obj_pcd_buffer.new_zeros([self.num_envs, self.obj_pcd_buffer.shape[2], self.obj_pcd_buffer.shape[3], self.obj_pcd_buffer.shape[4]])
+        self.envs_obj_pcd_buffer = self.part_pcds.new_zeros([self.num_envs, self.part_slot.shape[1], self.part_pcds.shape[1], self.part_pcds.shape[2]], dtype=self._storage_dtype)
         
         # self.envs_heightmap = self.height_map[self.scene_for_env].float()
 
         self.obj_rotate_matrix = self.obj_rotate_matrix.permute(2,3,0,1).float()
-        self.scene_stand_point = torch.einsum("nmoe,neg->nmog", self.scene_stand_point[self.scene_for_env], self.obj_rotate_matrix[self.env_scene_idx_row, self.env_scene_idx_col])
-        self.scene_stand_point[..., 0] += self.x_offset[:,None,None] + self.rand_dist_x[self.env_scene_idx_row, self.env_scene_idx_col][:,None,None]
-        self.scene_stand_point[..., 1] += self.y_offset[:,None,None] + self.rand_dist_y[self.env_scene_idx_row, self.env_scene_idx_col][:,None,None]     
-        
+        # contact parts are placed at part_pcd @ rot + offset, see _reset_target
+        self._part_rot = self.obj_rotate_matrix[self.env_scene_idx_row, self.env_scene_idx_col]
+        self._part_offset = torch.stack([self.x_offset + self.rand_dist_x[self.env_scene_idx_row, self.env_scene_idx_col],
+                                         self.y_offset + self.rand_dist_y[self.env_scene_idx_row, self.env_scene_idx_col],
+                                         self.rand_dist_z[self.env_scene_idx_row, self.env_scene_idx_col]], -1).float()
         self.envs_heightmap = self.height_map[self.scene_for_env].float()
         self.envs_heightmap[..., 0] += self.rand_dist_x[self.env_scene_idx_row, self.env_scene_idx_col][..., None]
         self.envs_heightmap[..., 1] += self.rand_dist_y[self.env_scene_idx_row, self.env_scene_idx_col][..., None]
         self.envs_heightmap[..., 2] += self.rand_dist_z[self.env_scene_idx_row, self.env_scene_idx_col][..., None]
         self.envs_heightmap = torch.einsum("nae,neg->nag", self.envs_heightmap, self.obj_rotate_matrix[self.env_scene_idx_row, self.env_scene_idx_col])
+
+        self._obj_pcd_reference = None
+        self._heightmap_reference = None
+        if (self._precision_check_interval > 0):
+            self._obj_pcd_reference = torch.zeros_like(self.envs_obj_pcd_buffer, dtype=torch.float)
+            self._heightmap_reference = self.envs_heightmap
+        self._height_texture, self._height_frame = build_height_textures(self.envs_heightmap)
+        self.envs_heightmap = self.envs_heightmap.to(self._storage_dtype)
         super()._create_envs(num_envs, spacing, num_per_row)
         return
 
+    def _coc_rows(self):
+        return step_rows(self.step_offsets, self.max_steps, self.scene_for_env, self.step_mode)
+
     def _build_strike_body_ids_tensor(self, env_ptr, actor_handle, body_names):
         env_ptr = self.envs[0]
         actor_handle = self.humanoid_handles[0]
@@ -548,89 +500,246 @@ class UniHSI_PartNet_Train(humanoid_amp_task.HumanoidAMPTask):
         self._reset_target(env_ids, success)
 
     def _reset_target(self, env_ids, success):
-
-        contact_type_steps = self.contact_type_step[self.scene_for_env, self.step_mode]
-        contact_valid_steps = self.contact_valid_step[self.scene_for_env, self.step_mode]
+        # only the rows of env_ids change, sample and scatter for those alone. The envs
+        # to reset are picked by torch.where, boolean indexing would sync to size them
+        coc_rows = step_rows(self.step_offsets, self.max_steps, self.scene_for_env[env_ids], self.step_mode[env_ids])
+        contact_type_steps = self.contact_type_step[coc_rows]
+        contact_valid_steps = self.contact_valid_step[coc_rows]
         fulfill = ((contact_valid_steps & \
-                     (((contact_type_steps) & (self.joint_diff_buff < 0.1)) | (((~contact_type_steps) & (self.joint_diff_buff >= 0.05))))) \
-                        | (~contact_valid_steps))[env_ids] & (success[:, None]) # need add contact direction
+                     (((contact_type_steps) & (self.joint_diff_buff[env_ids] < 0.1)) | (((~contact_type_steps) & (self.joint_diff_buff[env_ids] >= 0.05))))) \
+                        | (~contact_valid_steps)) & (success[:, None]) # need add contact direction
         fulfill = torch.all(fulfill, dim=-1)
+        self._record_plan_stats(env_ids, coc_rows, fulfill)
 
-        self.step_mode[env_ids[fulfill]] += 1
+        step_mode = self.step_mode[env_ids] + fulfill.long()
 
-        max_step = self.step_mode[env_ids] == self.max_steps[self.scene_for_env][env_ids]
+        max_step = step_mode == self.max_steps[self.scene_for_env[env_ids]]
 
 
         reset = ~fulfill | max_step
-        super()._reset_actors(env_ids[reset])
+        super()._reset_actors(env_ids, reset)
 
-        self.still_buf[env_ids[reset|fulfill]] = 0
+        # every env either moves to its next step or resets
+        self.still_buf[env_ids] = 0
 
-        rand_rot_theta = 2 * np.pi * torch.rand([self.num_envs], device=self.device)
-        axis = torch.tensor([0.0, 0.0, 1.0], device=self.device)
-        rand_rot = quat_from_angle_axis(rand_rot_theta, axis)
-        self._humanoid_root_states[env_ids[reset], 3:7] = rand_rot[env_ids[reset]]
+        # draw for every env and keep the rows of env_ids like the full-size draws did,
+        # so a seed gives each env the same samples whichever other envs reset with it
+        rand_rot_theta = 2 * np.pi * rand(self._rng, self.num_envs)[env_ids]
+        rand_rot = quat_from_angle_axis(rand_rot_theta, self._up_axis)
+        root_states = self._humanoid_root_states[env_ids]
+        root_states[:, 3:7] = torch.where(reset[:, None], rand_rot, root_states[:, 3:7])
 
         dist_max = 4
         dist_min = 2
-        rand_dist_y = (dist_max - dist_min) * torch.rand([self.num_envs], device=self.device) + dist_min
-        rand_dist_x = (dist_max - dist_min) * torch.rand([self.num_envs], device=self.device) + dist_min
-        x_sign = torch.from_numpy(np.random.choice((-1, 1), [self.num_envs])).to(self.device)
-        y_sign = torch.from_numpy(np.random.choice((-1, 1), [self.num_envs])).to(self.device)
-        self._humanoid_root_states[env_ids[reset], 0] += self.x_offset[env_ids[reset]] + x_sign[env_ids[reset]] * rand_dist_x[env_ids[reset]]
-        self._humanoid_root_states[env_ids[reset], 1] += self.y_offset[env_ids[reset]] + y_sign[env_ids[reset]] * rand_dist_y[env_ids[reset]] - 2
-        self.step_mode[env_ids[reset]] = 0
-
-        stand_point_choice = torch.from_numpy(np.random.choice((0,1,2,3), [self.num_envs])).to(self.device)
-        self.stand_point_choice[env_ids[reset]] = stand_point_choice[env_ids[reset]]
+        rand_dist_y = (dist_max - dist_min) * rand(self._rng, self.num_envs)[env_ids] + dist_min
+        rand_dist_x = (dist_max - dist_min) * rand(self._rng, self.num_envs)[env_ids] + dist_min
+        x_sign = randint(self._rng, 2, self.num_envs)[env_ids] * 2 - 1
+        y_sign = randint(self._rng, 2, self.num_envs)[env_ids] * 2 - 1
+        root_states[:, 0] = torch.where(reset, root_states[:, 0] + (self.x_offset[env_ids] + x_sign * rand_dist_x), root_states[:, 0])
+        root_states[:, 1] = torch.where(reset, root_states[:, 1] + (self.y_offset[env_ids] + y_sign * rand_dist_y - 2), root_states[:, 1])
+        self._humanoid_root_states[env_ids] = root_states
+        self.step_mode[env_ids] = torch.where(reset, torch.zeros_like(step_mode), step_mode)
+
+        stand_point_choice = randint(self._rng, 4, self.num_envs)[env_ids]
+        self.stand_point_choice[env_ids] = torch.where(reset, stand_point_choice, self.stand_point_choice[env_ids])
+
+        coc_rows = step_rows(self.step_offsets, self.max_steps, self.scene_for_env[env_ids], self.step_mode[env_ids])
+        self.contact_type[env_ids] = self.contact_type_step[coc_rows]
+        self.contact_valid[env_ids] = self.contact_valid_step[coc_rows]
+        self.contact_direction[env_ids] = self.contact_direction_step[coc_rows]
+
+        # stand points are stored per plan, move them into the scene tile of every env
+        scene_row = self.env_scene_idx_row[env_ids]
+        scene_col = self.env_scene_idx_col[env_ids]
+        obj_rotate_matrix = self.obj_rotate_matrix[scene_row, scene_col]
+        x_offset = self.x_offset[env_ids] + self.rand_dist_x[scene_row, scene_col]
+        y_offset = self.y_offset[env_ids] + self.rand_dist_y[scene_row, scene_col]
+        stand_point = torch.einsum("ne,neg->ng", self.scene_stand_point[coc_rows, self.stand_point_choice[env_ids]], obj_rotate_matrix)
+        stand_point[..., 0] += x_offset
+        stand_point[..., 1] += y_offset
+        self.stand_point[env_ids] = stand_point
+
+        obj_pcd = gather_part_pcds(self.part_pcds, self.part_slot, coc_rows)
+        obj_pcd = torch.einsum("nmoe,neg->nmog", obj_pcd, obj_rotate_matrix)
+        obj_pcd[..., 0] += x_offset[:, None, None]
+        obj_pcd[..., 1] += y_offset[:, None, None]
+        obj_pcd[..., 2] += self.rand_dist_z[scene_row, scene_col][..., None, None]
+        self._store_obj_pcds(env_ids, obj_pcd)
+
+    def _record_plan_stats(self, env_ids, coc_rows, fulfill):
+        if (self.plan_stats is None):
+            return
+        terminated = self._terminate_buf[env_ids] > 0
+        big_force = self.big_force[env_ids]
+        timeout = (self.progress_buf[env_ids] >= self.max_episode_length - 1) & ~terminated
+        # the first reset of an env ends no step
+        self.plan_stats.record(coc_rows, self.progress_buf[env_ids] > 0, fulfill, timeout, big_force,
+                               terminated & ~big_force, self.progress_buf[env_ids])
+        return
 
-        self.contact_type = self.contact_type_step[self.scene_for_env, self.step_mode]
-        self.contact_valid = self.contact_valid_step[self.scene_for_env, self.step_mode]
-        self.contact_direction = self.contact_direction_step[self.scene_for_env, self.step_mode]
+    def _store_obj_pcds(self, env_ids, obj_pcd):
+        obj_pcd = obj_pcd - self._pcd_origin[env_ids][:, None, None]
+        self.envs_obj_pcd_buffer[env_ids] = obj_pcd
+        if (self._obj_pcd_reference is not None):
+            self._obj_pcd_reference[env_ids] = obj_pcd
+        return
 
-        self.stand_point = self.scene_stand_point[range(len(self.step_mode)), self.step_mode, self.stand_point_choice]
+    def step(self, actions):
+        if self._sync_counter is None:
+            super().step(actions)
+            return
+        with self._sync_counter:
+            super().step(actions)
+        self._sync_counter.step()
+        if self._sync_counter.calls % self._sync_count_interval == 0:
+            self._sync_counter.report()
+            self._sync_counter.reset()
+        return
 
-        self.envs_obj_pcd_buffer[env_ids] = self.obj_pcd_buffer[self.scene_for_env[env_ids], self.step_mode[env_ids]]
-        self.envs_obj_pcd_buffer[env_ids] = torch.einsum("nmoe,neg->nmog", self.envs_obj_pcd_buffer[env_ids], self.obj_rotate_matrix[self.env_scene_idx_row, self.env_scene_idx_col][env_ids])
-        self.envs_obj_pcd_buffer[env_ids, ..., 0] += self.x_offset[:, None, None][env_ids] + self.rand_dist_x[self.env_scene_idx_row, self.env_scene_idx_col][..., None, None][env_ids]
-        self.envs_obj_pcd_buffer[env_ids, ..., 1] += self.y_offset[:, None, None][env_ids] + self.rand_dist_y[self.env_scene_idx_row, self.env_scene_idx_col][..., None, None][env_ids]
-        self.envs_obj_pcd_buffer[env_ids, ..., 2] += self.rand_dist_z[self.env_scene_idx_row, self.env_scene_idx_col][..., None, None][env_ids]
+    def reset(self, env_ids=None):
+        # resets between steps count towards the next step
+        if self._sync_counter is None:
+            super().reset(env_ids)
+            return
+        with self._sync_counter:
+            super().reset(env_ids)
+        return
 
     def pre_physics_step(self, actions):
         super().pre_physics_step(actions)
         self._prev_root_pos[:] = self._humanoid_root_states[..., 0:3]
         return
     
-    def _compute_task_obs(self, env_ids=None):
+    def _query_contact_index(self, env_ids, coc_rows, joint_pos, valid_joint_contact_choice):
+        # joints in the frame of their target part, joints standing in for another
+        # joint keep point 0 like the brute-force argmin over identical points
+        part_joint_pos = torch.einsum("njg,neg->nje", joint_pos - self._part_offset[env_ids][:, None], self._part_rot[env_ids])
+        candidates = self._contact_index.query(self.part_slot[coc_rows], part_joint_pos)
+        return torch.where(valid_joint_contact_choice[..., None], torch.zeros_like(candidates), candidates)
+
+    def _update_contact_targets(self, env_ids=None):
+        # joint positions, joint-pair substitution and contact targets of the
+        # current step, computed once and consumed by observations and reward
+        if (env_ids is not None):
+            self._update_contact_targets_subset(env_ids)
+            return
+
+        coc_rows = self._coc_rows()
+        self.new_rigid_body_pos[:] = self._rigid_body_pos
+        self.new_rigid_body_pos[:, 2] = quat_rotate(self._rigid_body_rot[:, 1], self.torso2head) + self._rigid_body_pos[:, 1]
+        self.new_rigid_body_pos[:, 1] = quat_rotate(self._rigid_body_rot[:, 0], self.pelvis2torso) + self._rigid_body_pos[:, 0]
+        torch.index_select(self.new_rigid_body_pos, 1, self._strike_body_ids, out=self._joint_pos_buf)
+        torch.index_select(self.joint_pairs, 0, coc_rows, out=self._joint_contact_choice)
+        torch.index_select(self.joint_pairs_valid, 0, coc_rows, out=self._valid_joint_contact_choice)
+
+        # joint pair ids index the flattened joint buffer
+        joints_contact = self._joint_pos_buf.view(-1, 3)[self._joint_contact_choice.view(-1)].view(self._joint_pos_buf.shape)
+        # the targets are stored like the pointclouds, relative to the env origin
+        joints_contact = (joints_contact - self._pcd_origin[:, None]).to(self._contact_target_buf.dtype)
+        if (self._contact_index is None):
+            torch.where(self._valid_joint_contact_choice[..., None, None], joints_contact[:, :, None], self.envs_obj_pcd_buffer,
+                        out=self._contact_target_buf)
+            return
+
+        self._contact_target_idx[:] = self._query_contact_index(self.envs_idx, coc_rows, self._joint_pos_buf, self._valid_joint_contact_choice)
+        candidates = torch.gather(self.envs_obj_pcd_buffer, 2, self._contact_target_idx[..., None].expand(-1, -1, -1, 3))
+        torch.where(self._valid_joint_contact_choice[..., None, None], joints_contact[:, :, None], candidates,
+                    out=self._contact_target_buf)
+
+    def _update_contact_targets_subset(self, env_ids):
+        # other envs have not moved since post_physics_step, their rows are current
+        coc_rows = step_rows(self.step_offsets, self.max_steps, self.scene_for_env[env_ids], self.step_mode[env_ids])
+        rigid_body_pos = self._rigid_body_pos[env_ids]
+        rigid_body_rot = self._rigid_body_rot[env_ids]
+        new_rigid_body_pos = rigid_body_pos.clone()
+        new_rigid_body_pos[:, 2] = quat_rotate(rigid_body_rot[:, 1], self.torso2head[env_ids]) + rigid_body_pos[:, 1]
+        new_rigid_body_pos[:, 1] = quat_rotate(rigid_body_rot[:, 0], self.pelvis2torso[env_ids]) + rigid_body_pos[:, 0]
+        self.new_rigid_body_pos[env_ids] = new_rigid_body_pos
+        self._joint_pos_buf[env_ids] = new_rigid_body_pos[:, self._strike_body_ids]
+        joint_contact_choice = self.joint_pairs[coc_rows]
+        valid_joint_contact_choice = self.joint_pairs_valid[coc_rows]
+        self._joint_contact_choice[env_ids] = joint_contact_choice
+        self._valid_joint_contact_choice[env_ids] = valid_joint_contact_choice
+
+        joints_contact = self._joint_pos_buf.view(-1, 3)[joint_contact_choice.view(-1)].view(joint_contact_choice.shape + (3,))
+        joints_contact = (joints_contact - self._pcd_origin[env_ids][:, None]).to(self._contact_target_buf.dtype)
+        if (self._contact_index is None):
+            candidates = self.envs_obj_pcd_buffer[env_ids]
+        else:
+            contact_target_idx = self._query_contact_index(env_ids, coc_rows, self._joint_pos_buf[env_ids], valid_joint_contact_choice)
+            self._contact_target_idx[env_ids] = contact_target_idx
+            candidates = torch.gather(self.envs_obj_pcd_buffer[env_ids], 2, contact_target_idx[..., None].expand(-1, -1, -1, 3))
+        self._contact_target_buf[env_ids] = torch.where(valid_joint_contact_choice[..., None, None], joints_contact[:, :, None], candidates)
+
+    def _compute_observations(self, env_ids=None):
+        check_precision = False
+        if (env_ids is None and self._precision_check_interval > 0):
+            self._precision_check_steps += 1
+            check_precision = self._precision_check_steps % self._precision_check_interval == 0
+        if check_precision:
+            # the observation reads the target choice of the previous reward step
+            prev_targets = (self.joint_idx_buff.clone(), self.tar_dir.clone())
+
+        if self._op_counter is None:
+            super()._compute_observations(env_ids)
+        else:
+            with self._op_counter:
+                super()._compute_observations(env_ids)
+            self._op_counter.step()
+            if self._op_counter.calls % self._op_count_interval == 0:
+                self._op_counter.report()
+                self._op_counter.reset()
+
+        if check_precision:
+            self._check_storage_precision(*prev_targets)
+        return
 
-        pcd_buffer = []
-        self.new_rigid_body_pos = self._rigid_body_pos.clone()
+    def _check_storage_precision(self, joint_idx_buff, tar_dir):
+        # rerun the task obs / reward of this step on the fp32 copies of the stored
+        # buffers and report how far the stored precision moved the results
+        outputs = ['rew_buf', 'location_diff_buf', 'joint_diff_buff', 'joint_idx_buff', 'tar_dir']
+        reduced = dict((name, getattr(self, name).clone()) for name in outputs)
+        reduced['obs'] = self.obs_buf.clone()
+        reduced_maps = (self.local_height_map, self.rotated_mesh_pos)
+        buffers = (self.envs_obj_pcd_buffer, self.envs_heightmap, self._contact_target_buf)
+
+        self.envs_obj_pcd_buffer, self.envs_heightmap, self._contact_target_buf = \
+            self._obj_pcd_reference, self._heightmap_reference, self._contact_target_reference
+        self.joint_idx_buff[:] = joint_idx_buff
+        self.tar_dir[:] = tar_dir
+        obs = self.obs_buf.clone()
+        self._compute_task_obs(None, out=obs[:, self._obs_layout.slices['humanoid'].stop:])
+        reference = dict((name, getattr(self, name).clone()) for name in outputs)
+        reference['obs'] = obs
+
+        self.envs_obj_pcd_buffer, self.envs_heightmap, self._contact_target_buf = buffers
+        self.local_height_map, self.rotated_mesh_pos = reduced_maps
+        for name in outputs:
+            getattr(self, name)[:] = reduced[name]
+        report_precision('storage precision {}'.format(self._storage_dtype), reference, reduced, self._obs_layout, skip=['humanoid'])
+        return
 
-        head = quat_rotate(self._rigid_body_rot[:, 1], self.torso2head)
-        head += self._rigid_body_pos[:, 1]
-        self.new_rigid_body_pos[:, 2] = head
+    def _compute_task_obs(self, env_ids=None, out=None):
 
-        torso = quat_rotate(self._rigid_body_rot[:, 0], self.pelvis2torso)
-        torso += self._rigid_body_pos[:, 0]
-        self.new_rigid_body_pos[:, 1] = torso
-        joint_pos_buffer = []
+        self._update_contact_targets(env_ids)
         if (env_ids is None):
             root_states = self._humanoid_root_states
             tar_pos = self.stand_point
-            pcd_buffer = self.envs_obj_pcd_buffer[self.envs_idx]
-            env_num, joint_num, point_num, point_dim = pcd_buffer.shape
-            pcd_buffer = pcd_buffer.view(-1, point_num, point_dim)
-            pcd_buffer = pcd_buffer[range(pcd_buffer.shape[0]), self.joint_idx_buff.view(-1)]
-            pcd_buffer = pcd_buffer.reshape(env_num, joint_num, point_dim)
-            joint_pos_buffer = self.new_rigid_body_pos[:, self._strike_body_ids]
-
-            joint_contact_choice = self.joint_pairs[self.scene_for_env, self.step_mode]
-            valid_joint_contact_choice = self.joint_pairs_valid[self.scene_for_env, self.step_mode]
-            joints_contact = joint_pos_buffer.view(-1, 3)[joint_contact_choice.view(-1)].clone()
-            pcd_buffer_view = pcd_buffer.view(-1, 3)
-            pcd_buffer_view[valid_joint_contact_choice.view(-1)] = joints_contact[valid_joint_contact_choice.view(-1)]
+            # target point of every joint, chosen by the previous reward step
+            joint_pos_buffer = self._joint_pos_buf
+            if (self._contact_index is None):
+                pcd_buffer = torch.gather(self._contact_target_buf, 2, self.joint_idx_buff[..., None, None].expand(-1, -1, 1, 3)).squeeze(2)
+                pcd_buffer = pcd_buffer + self._pcd_origin[:, None]
+            else:
+                # the contact targets only hold the candidates of the current step
+                pcd_buffer = torch.gather(self.envs_obj_pcd_buffer, 2, self.joint_idx_buff[..., None, None].expand(-1, -1, 1, 3)).squeeze(2)
+                pcd_buffer = pcd_buffer + self._pcd_origin[:, None]
+                joints_contact = joint_pos_buffer.view(-1, 3)[self._joint_contact_choice.view(-1)].view(joint_pos_buffer.shape)
+                pcd_buffer = torch.where(self._valid_joint_contact_choice[..., None], joints_contact, pcd_buffer)
 
             height_map = self.envs_heightmap
+            height_texture = self._height_texture
+            height_frame = self._height_frame
 
             contact_type = self.contact_type
             contact_valid = self.contact_valid
@@ -643,21 +752,19 @@ class UniHSI_PartNet_Train(humanoid_amp_task.HumanoidAMPTask):
         else:
             root_states = self._humanoid_root_states[env_ids]
             tar_pos = self.stand_point[env_ids]
-            pcd_buffer = self.envs_obj_pcd_buffer[self.envs_idx]
-            env_num, joint_num, point_num, point_dim = pcd_buffer.shape
-            pcd_buffer = pcd_buffer.view(-1, point_num, point_dim)
-            pcd_buffer = pcd_buffer[range(pcd_buffer.shape[0]), self.joint_idx_buff.view(-1)]
-            pcd_buffer = pcd_buffer.reshape(env_num, joint_num, point_dim)
-            pcd_buffer = pcd_buffer[env_ids]
-            joint_pos_buffer = self.new_rigid_body_pos[:, self._strike_body_ids][env_ids]
-
-            joint_contact_choice = self.joint_pairs[self.scene_for_env, self.step_mode][env_ids]
-            valid_joint_contact_choice = self.joint_pairs_valid[self.scene_for_env, self.step_mode][env_ids]
-            joints_contact = joint_pos_buffer.view(-1, 3)[joint_contact_choice.view(-1)].clone()
-            pcd_buffer_view = pcd_buffer.view(-1, 3)
-            pcd_buffer_view[valid_joint_contact_choice.view(-1)] = joints_contact[valid_joint_contact_choice.view(-1)]
+            pcd_buffer = torch.gather(self.envs_obj_pcd_buffer[env_ids], 2, self.joint_idx_buff[env_ids][..., None, None].expand(-1, -1, 1, 3)).squeeze(2)
+            pcd_buffer = pcd_buffer + self._pcd_origin[env_ids][:, None]
+            joint_pos_buffer = self._joint_pos_buf[env_ids]
+
+            # the joint pairs of the subset index its own flattened joint buffer
+            joint_contact_choice = self._joint_contact_choice[env_ids]
+            valid_joint_contact_choice = self._valid_joint_contact_choice[env_ids]
+            joints_contact = joint_pos_buffer.view(-1, 3)[joint_contact_choice.view(-1)].view(joint_pos_buffer.shape)
+            pcd_buffer = torch.where(valid_joint_contact_choice[..., None], joints_contact, pcd_buffer)
 
             height_map = self.envs_heightmap[env_ids]
+            height_texture = self._height_texture[env_ids]
+            height_frame = self._height_frame[env_ids]
             contact_type = self.contact_type[env_ids]
             contact_valid = self.contact_valid[env_ids]
             contact_direction = self.contact_direction[env_ids]
@@ -667,46 +774,50 @@ class UniHSI_PartNet_Train(humanoid_amp_task.HumanoidAMPTask):
             origin_root_pos[:, 1] = origin_root_pos[:, 1] - self.y_offset[env_ids]
             tar_dir = self.tar_dir[env_ids]
 
-        tar_rot = root_states.new_zeros([root_states.shape[0],4])
-        tar_rot[:, 3] = 1
-        tar_vel = root_states.new_zeros([root_states.shape[0],3])
-        tar_ang_vel = root_states.new_zeros([root_states.shape[0],3])
-        obs, self.local_height_map, self.rotated_mesh_pos = compute_strike_observations(root_states, tar_pos, joint_pos_buffer, pcd_buffer, tar_rot, tar_vel, tar_ang_vel, contact_type, contact_valid, contact_direction,
-                                                                                 self.humanoid_in_mesh, origin_root_pos, self.local_scale, height_map, self.mesh_pos, tar_dir)
+        if (out is None):
+            out = root_states.new_zeros([root_states.shape[0], self.get_task_obs_size()])
+        tar_rot = self._obs_tar_rot[:root_states.shape[0]]
+        heading_rot = self._get_heading_quat_inv(env_ids, source='actor')
+        flat_heading_rot = self._get_flat_heading_quat_inv(self.joint_num, env_ids, source='actor')
+        obs, self.local_height_map, self.rotated_mesh_pos = self._compute_strike_observations(root_states, heading_rot, flat_heading_rot, tar_pos, joint_pos_buffer, pcd_buffer, tar_rot, contact_type, contact_valid, contact_direction,
+                                                                                 self.humanoid_in_mesh, origin_root_pos, self.local_scale, height_map, self.mesh_pos, tar_dir,
+                                                                                 out, height_texture, height_frame, self._height_lookup)
         
-        char_root_state = self._humanoid_root_states
-        target = self.stand_point
-
-        pcd_buffer = self.envs_obj_pcd_buffer[self.envs_idx]
-        joint_pos_buffer = self.new_rigid_body_pos[..., self._strike_body_ids, :]
-
-        joint_contact_choice = self.joint_pairs[self.scene_for_env, self.step_mode]
-        valid_joint_contact_choice = self.joint_pairs_valid[self.scene_for_env, self.step_mode]
-        joints_contact = joint_pos_buffer.view(-1, 3)[joint_contact_choice.view(-1)].clone()
-        pcd_buffer_view = pcd_buffer.view(-1, pcd_buffer.shape[-2], 3)
-        pcd_buffer_view[valid_joint_contact_choice.view(-1)] = joints_contact[valid_joint_contact_choice.view(-1)][:, None]
-        pcd_buffer = pcd_buffer_view.reshape(pcd_buffer.shape)
-
-        self.rew_buf[:], self.location_diff_buf[:], self.joint_diff_buff[:], self.joint_idx_buff[:], self.tar_dir[:, :2] = compute_contact_reward(target, char_root_state,
-                                                                                 pcd_buffer, joint_pos_buffer,
-                                                                                 self._prev_root_pos,
-                                                                                 self.dt, self.contact_type, self.contact_valid, self.contact_direction)
+        if (env_ids is None):
+            char_root_state = self._humanoid_root_states
+            target = self.stand_point
+
+            self.rew_buf[:], self.location_diff_buf[:], self.joint_diff_buff[:], self.joint_idx_buff[:], self.tar_dir[:, :2] = self._compute_contact_reward(target, char_root_state, self._get_heading_quat(source='actor'),
+                                                                                     self._contact_target_buf, self._joint_pos_buf, self._pcd_origin,
+                                                                                     self._prev_root_pos,
+                                                                                     self.dt, self.contact_type, self.contact_valid, self.contact_direction,
+                                                                                     self._contact_target_idx)
+        else:
+            # rewards and joint diffs are recomputed by post_physics_step before they are read,
+            # only the target point choice and direction feed the next observation
+            _, _, _, self.joint_idx_buff[env_ids], self.tar_dir[env_ids, :2] = self._compute_contact_reward(self.stand_point[env_ids], self._humanoid_root_states[env_ids], self._get_heading_quat(env_ids, source='actor'),
+                                                                                     self._contact_target_buf[env_ids], self._joint_pos_buf[env_ids], self._pcd_origin[env_ids],
+                                                                                     self._prev_root_pos[env_ids],
+                                                                                     self.dt, self.contact_type[env_ids], self.contact_valid[env_ids], self.contact_direction[env_ids],
+                                                                                     None if self._contact_target_idx is None else self._contact_target_idx[env_ids])
         
         return obs
 
     def _compute_reset(self):
         # calcute reset conditions
         success = (self.location_diff_buf < 0.1) & ~self.big_force
-        contact_type_steps = self.contact_type_step[self.scene_for_env, self.step_mode]
-        contact_valid_steps = self.contact_valid_step[self.scene_for_env, self.step_mode]
+        coc_rows = self._coc_rows()
+        contact_type_steps = self.contact_type_step[coc_rows]
+        contact_valid_steps = self.contact_valid_step[coc_rows]
         fulfill = ((contact_valid_steps & \
                      (((contact_type_steps) & (self.joint_diff_buff < 0.3)) | (((~contact_type_steps) & (self.joint_diff_buff >= 0.1))))) \
                         | (~contact_valid_steps))& (success[:, None])
         fulfill = torch.all(fulfill, dim=-1)
-        self.still = self.still_buf>10 & fulfill
-        self.big_force = (self._contact_forces.abs()>10000).sum((-2,-1))>0
+        # written in place, a captured step keeps reading the buffers it was captured with
+        self.still[:] = self.still_buf>10 & fulfill
+        self.big_force[:] = (self._contact_forces.abs()>10000).sum((-2,-1))>0
 
-        self.reset_buf[:], self._terminate_buf[:], self.still_buf[:] = compute_humanoid_reset(self.reset_buf, self.progress_buf,
+        self.reset_buf[:], self._terminate_buf[:], self.still_buf[:] = self._compute_humanoid_reset(self.reset_buf, self.progress_buf,
                                                            self._contact_forces, self._contact_body_ids,
                                                            self._rigid_body_pos,
                                                            self._strike_body_ids, self.max_episode_length,
@@ -718,11 +829,12 @@ class UniHSI_PartNet_Train(humanoid_amp_task.HumanoidAMPTask):
         self.gym.clear_lines(self.viewer)
         cols = np.array([[0.0, 1.0, 0.0]], dtype=np.float32)
         starts = self.new_rigid_body_pos[0][self._strike_body_ids][self.contact_valid[0]]
-        ends = self.envs_obj_pcd_buffer[0][range(15), self.joint_idx_buff[0]][self.contact_valid[0]]
+        ends = (self.envs_obj_pcd_buffer[0][range(15), self.joint_idx_buff[0]].float() + self._pcd_origin[0])[self.contact_valid[0]]
 
+        coc_rows = self._coc_rows()
         joint_pos_buffer = self.new_rigid_body_pos[:, self._strike_body_ids][0]
-        joint_contact_choice = self.joint_pairs[self.scene_for_env, self.step_mode][0]
-        valid_joint_contact_choice = self.joint_pairs_valid[self.scene_for_env, self.step_mode][0]
+        joint_contact_choice = self.joint_pairs[coc_rows][0]
+        valid_joint_contact_choice = self.joint_pairs_valid[coc_rows][0]
         joints_contact = joint_pos_buffer.view(-1, 3)[joint_contact_choice.view(-1)].clone()
         ends[valid_joint_contact_choice.view(-1)[self.contact_valid[0]]] = joints_contact[valid_joint_contact_choice.view(-1)]
         verts = torch.cat([starts, ends], dim=-1).cpu().numpy()
@@ -746,214 +858,3 @@ class UniHSI_PartNet_Train(humanoid_amp_task.HumanoidAMPTask):
             self.gym.add_lines(self.viewer, env_ptr, curr_verts.shape[0], curr_verts, cols)
 
         return
-
-#####################################################################
-###=========================jit functions=========================###
-#####################################################################
-
-# @torch.jit.script
-def compute_strike_observations(root_states, tar_pos, joint_pos_buffer, pcd_buffer, tar_rot, tar_vel, tar_ang_vel, contact_type, contact_valid, contact_direction, 
-                                human_in_mesh, origin_root_pos, local_scale, height_map_pcd, mesh_pos, tar_dir):
-    # type: (Tensor, Tensor) -> Tensor
-    root_pos = root_states[:, 0:3]
-    root_rot = root_states[:, 3:7]
-
-    heading_rot = torch_utils.calc_heading_quat_inv(root_rot)
-
-    local_tar_pos = tar_pos - root_pos
-    local_tar_pos[..., -1] = tar_pos[..., -1]
-    local_tar_pos = quat_rotate(heading_rot, local_tar_pos)
-    local_tar_vel = quat_rotate(heading_rot, tar_vel)
-    local_tar_ang_vel = quat_rotate(heading_rot, tar_ang_vel)
-
-    local_tar_rot = quat_mul(heading_rot, tar_rot)
-    local_tar_rot_obs = torch_utils.quat_to_tan_norm(local_tar_rot)
-
-    mesh_pos = mesh_pos[None] + (root_pos -human_in_mesh)[:, None]
-    mesh_dist = (mesh_pos - root_pos[:, None]).reshape(-1, 3)
-    heading_rot_for_height = root_rot[:, None].repeat(1, local_scale*local_scale, 1).reshape(-1, 4)
-    heading_rot_for_height[:, :2] = 0
-    heading_rot_norm = torch.sqrt(1 - heading_rot_for_height[:, 3]*heading_rot_for_height[:, 3])
-    heading_rot_for_height[:, 2] = heading_rot_for_height[:, 2] * heading_rot_norm / torch.abs(heading_rot_for_height[:, 2])
-    rotated_mesh_dist = quat_rotate(heading_rot_for_height, mesh_dist).reshape(-1, local_scale*local_scale, 3)
-    rotated_mesh_pos = rotated_mesh_dist + root_pos[:, None]
-    rotated_mesh_origin_pos = rotated_mesh_dist + origin_root_pos[:, None]
-    dist = rotated_mesh_origin_pos[..., :2][:, None] - height_map_pcd[..., :2][:, :, None]
-    sum_dist = torch.sum(dist * dist, dim=-1)
-    shape = sum_dist.shape
-    sum_dist = sum_dist.permute(1,0,2).reshape(shape[1], -1)
-    min_idx = sum_dist.argmin(0)
-    dist_min = sum_dist[min_idx, range(min_idx.shape[0])]
-    valid_mask = dist_min < 0.05
-    height_map = height_map_pcd.reshape(-1, 3)[min_idx, 2]
-    height_map[~valid_mask] = 0.0
-    height_map = height_map.reshape(shape[0], shape[2]).float()
-
-
-    contact_direction = contact_direction.reshape(-1, 45)
-    obs = torch.cat([local_tar_pos, local_tar_rot_obs, local_tar_vel, tar_dir, contact_type, contact_valid, height_map], dim=-1)
-
-    local_target_pos = pcd_buffer - joint_pos_buffer
-    local_target_pos_r = quat_rotate(heading_rot[:, None].repeat(1, local_target_pos.shape[1], 1).view(-1, 4), local_target_pos.view(-1, 3))
-    local_target_pos_r = local_target_pos_r.reshape(local_target_pos.shape)
-    local_target_pos_r *= contact_valid[..., None]
-    obs = torch.cat([obs, local_target_pos_r.view(obs.shape[0], -1), contact_direction], dim=-1)
-
-    return obs, height_map, rotated_mesh_pos
-
-def compute_contact_reward(target, root_state, pcd_buffer, joint_pos_buffer, 
-                           prev_root_pos, dt, contact_type, contact_valid, contact_direction):
-    # type: (Tensor, Tensor, Tensor, Tensor, Tensor, float, float) -> Tensor
-    dist_threshold = 0.2
-
-    pos_err_scale = 0.5
-    vel_err_scale = 2.0
-    near_pos_err_scale = 10
-
-    tar_speed = 1.0
-    
-    root_pos = root_state[..., 0:3]
-    root_rot = root_state[..., 3:7]
-
-    contact_type = contact_type.float()
-
-    near_pos_reward_buf = []
-    min_pos_idx_buf = []
-    near_pos_err_min_buf = []
-    for i in range(pcd_buffer.shape[1]):
-        near_pos_diff = pcd_buffer[:, i] - joint_pos_buffer[:, i][:, None]
-        near_pos_err = torch.sum(near_pos_diff * near_pos_diff, dim=-1)
-        near_pos_err_min, min_pos_idx = near_pos_err.min(-1)
-        near_pos_reward = torch.exp(-near_pos_err_scale * near_pos_err_min)
-        near_pos_reward_contact = near_pos_reward * contact_type[:,i] + (1-near_pos_reward) * (1-contact_type[:,i])
-
-        reward_dir = torch.nn.functional.normalize(-near_pos_diff[range(near_pos_diff.shape[0]), min_pos_idx], dim=-1) * contact_direction[:,i]
-        reward_dir = reward_dir.sum(-1)
-        reward_dir[contact_direction[:,i].sum(1)==0] = 1
-        reward_dir[reward_dir<0] = 0
-        reward_dir[~contact_type[:,i].bool()] = 1
-        contact_w = (1 - near_pos_reward_contact) / (2 - near_pos_reward_contact - reward_dir + 1e-4)
-        dir_w = (1 - reward_dir) / (2 - near_pos_reward_contact - reward_dir + 1e-4)
-        near_pos_err_min[reward_dir<0.5] += 1 # not fullfill dir
-        near_pos_reward_contact = contact_w * near_pos_reward_contact + dir_w * reward_dir
-
-        near_pos_reward_contact[~contact_valid[:, i]] = 1
-        near_pos_reward_buf.append(near_pos_reward_contact)
-        min_pos_idx_buf.append(min_pos_idx)
-        near_pos_err_min_buf.append(near_pos_err_min)
-    near_pos_err_min_buf = torch.stack(near_pos_err_min_buf, 1)
-    near_pos_reward_buf = torch.stack(near_pos_reward_buf, 0)
-    min_pos_idx_buf = torch.stack(min_pos_idx_buf, 1)
-    near_pos_reward_w = (1 - near_pos_reward_buf) / (pcd_buffer.shape[1] - near_pos_reward_buf.sum(0) + 1e-4)
-
-    near_pos_reward = (near_pos_reward_w * near_pos_reward_buf).sum(0)
-
-    facing_target = (contact_valid.sum(-1) == 1) & (contact_valid[:, -1] | contact_valid[:, -4])
-    heading_rot = torch_utils.calc_heading_quat(root_rot)
-    facing_dir = torch.zeros_like(root_pos)
-    facing_dir[..., 0] = 1.0
-    facing_dir = quat_rotate(heading_rot, facing_dir)
-    
-    target_pcd = pcd_buffer[range(pcd_buffer.shape[0]), -1, min_pos_idx_buf[:, -1]]
-    pos_diff = target_pcd - root_pos
-    tar_dir = torch.nn.functional.normalize(pos_diff[..., 0:2], dim=-1)
-    tar_dir[~facing_target] = facing_dir[~facing_target][..., 0:2]
-    obj_facing_reward = torch.sum(tar_dir * facing_dir[..., 0:2], dim=-1)
-    obj_facing_reward = torch.clamp_min(obj_facing_reward, 0.0)
-
-    obj_facing_reward_w = (1-obj_facing_reward) / (2-obj_facing_reward-near_pos_reward + 1e-4)
-    near_pos_reward_w = (1-near_pos_reward) / (2-obj_facing_reward-near_pos_reward + 1e-4)
-    
-    near_pos_reward = obj_facing_reward_w * obj_facing_reward + near_pos_reward_w * near_pos_reward
-
-    pos_diff = target - root_pos
-    pos_err = torch.sum(pos_diff * pos_diff, dim=-1)
-    pos_reward = torch.exp(-pos_err_scale * pos_err)
-
-    dist_mask = pos_err < dist_threshold
-
-    tar_dir = torch.nn.functional.normalize(pos_diff[..., 0:2], dim=-1)
-    delta_root_pos = root_pos - prev_root_pos
-    root_vel = delta_root_pos / dt
-    tar_dir_speed = torch.sum(tar_dir * root_vel[..., :2], dim=-1)
-    tar_vel_err = tar_speed - tar_dir_speed
-    vel_reward = torch.exp(-vel_err_scale * (tar_vel_err * tar_vel_err))
-    speed_mask = tar_dir_speed <= 0
-    vel_reward[speed_mask] = 0
-    vel_reward[dist_mask] = 1
-
-    heading_rot = torch_utils.calc_heading_quat(root_rot)
-    facing_dir = torch.zeros_like(root_pos)
-    facing_dir[..., 0] = 1.0
-    facing_dir = quat_rotate(heading_rot, facing_dir)
-    facing_err = torch.sum(tar_dir * facing_dir[..., 0:2], dim=-1)
-    facing_reward = torch.clamp_min(facing_err, 0.0)
-    facing_reward[dist_mask] = 1
-
-    pos_reward_w = (1-pos_reward) / (3-pos_reward-vel_reward-facing_reward + 1e-4)
-    vel_reward_w = (1-vel_reward) / (3-pos_reward-vel_reward-facing_reward + 1e-4)
-    face_reward_w = (1-facing_reward) / (3-pos_reward-vel_reward-facing_reward + 1e-4)
-
-    far_reward = pos_reward_w * pos_reward + vel_reward_w * vel_reward + face_reward_w * facing_reward
-
-    not_walking = contact_valid.sum(-1)>0
-
-    # dist_mask = pos_err < dist_threshold
-    reward = far_reward
-    reward[not_walking] = near_pos_reward[not_walking]
-    pos_err[not_walking] = 0 # once success, keep success
-    # reward[dist_mask] = reward_near[dist_mask]
-
-    return reward, pos_err, near_pos_err_min_buf, min_pos_idx_buf, tar_dir
-    
-# @torch.jit.script
-def compute_humanoid_reset(reset_buf, progress_buf, contact_buf, contact_body_ids, rigid_body_pos, strike_body_ids, max_episode_length,
-                           enable_early_termination, termination_heights, _rigid_body_vel, still_buf, fulfill, big_force):
-    # type: (Tensor, Tensor, Tensor, Tensor, Tensor, Tensor, Tensor, float, bool, Tensor) -> Tuple[Tensor, Tensor]
-    contact_force_threshold = 1.0
-    
-    terminated = torch.zeros_like(reset_buf)
-
-    if (enable_early_termination):
-        masked_contact_buf = contact_buf.clone()
-        masked_contact_buf[:, contact_body_ids, :] = 0
-        fall_contact = torch.any(torch.abs(masked_contact_buf) > 0.1, dim=-1)
-        fall_contact = torch.any(fall_contact, dim=-1)
-
-        body_height = rigid_body_pos[..., 2]
-        fall_height = body_height < termination_heights
-        fall_height[:, contact_body_ids] = False
-        fall_height = torch.any(fall_height, dim=-1)
-
-        has_fallen = torch.logical_and(fall_contact, fall_height)
-
-        # tar_has_contact = torch.any(torch.abs(tar_contact_forces[..., 0:2]) > contact_force_threshold, dim=-1)
-        #strike_body_force = contact_buf[:, strike_body_id, :]
-        #strike_body_has_contact = torch.any(torch.abs(strike_body_force) > contact_force_threshold, dim=-1)
-        nonstrike_body_force = masked_contact_buf
-        nonstrike_body_force[:, strike_body_ids, :] = 0
-        nonstrike_body_has_contact = torch.any(torch.abs(nonstrike_body_force) > contact_force_threshold, dim=-1)
-        nonstrike_body_has_contact = torch.any(nonstrike_body_has_contact, dim=-1)
-
-        # tar_fail = torch.logical_and(tar_has_contact, nonstrike_body_has_contact)
-        
-        # has_failed = torch.logical_or(has_fallen, tar_fail)
-        has_failed = has_fallen
-
-        # first timestep can sometimes still have nonzero contact forces
-        # so only check after first couple of steps
-        has_failed *= (progress_buf > 1)
-        terminated = torch.where(has_failed, torch.ones_like(reset_buf), terminated)
-    
-    still_buf[_rigid_body_vel.abs().sum(-1).max(-1)[0]<0.6] += 1
-    still_buf[_rigid_body_vel.abs().sum(-1).max(-1)[0]>0.6] = 0
-    # print(_rigid_body_vel.abs().sum(-1).max(-1))
-
-    # print(still_buf)
-
-    terminated = torch.where(big_force, torch.ones_like(reset_buf), terminated) # terminate when force is too big (could cause peneration)
-
-    reset = torch.where(progress_buf >= max_episode_length - 1, torch.ones_like(reset_buf), terminated)
-    reset = torch.where((still_buf>10) & fulfill, torch.ones_like(reset_buf), reset)
-    
-    return reset, terminated, still_buf
\ No newline at end of file
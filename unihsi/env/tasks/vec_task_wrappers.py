@@ -57,5 +57,9 @@ class VecTaskPythonWrapper(VecTaskPython):
     def amp_observation_space(self):
         return self._amp_obs_space
 
+    @property
+    def obs_layout(self):
+        return getattr(self.task, '_obs_layout', None)
+
     def fetch_amp_obs_demo(self, num_samples):
         return self.task.fetch_amp_obs_demo(num_samples)
\ No newline at end of file
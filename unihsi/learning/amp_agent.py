@@ -455,6 +455,7 @@ class AMPAgent(common_agent.CommonAgent):
     def _build_net_config(self):
         config = super()._build_net_config()
         config['amp_input_shape'] = self._amp_observation_space.shape
+        config['obs_layout'] = self.env_info.get('obs_layout')
         return config
     
     def _build_rand_action_probs(self):
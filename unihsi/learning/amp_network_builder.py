@@ -36,6 +36,12 @@ import numpy as np
 
 DISC_LOGIT_INIT_SCALE = 1.0
 
+def height_map_slice(obs_layout):
+    # the env's ObsLayout, passed on as obs_layout by the agent and player net configs
+    if obs_layout is None or 'height_map' not in obs_layout.slices:
+        raise ValueError('MyAMPBuilder needs an env observation with a height_map component')
+    return obs_layout.slices['height_map']
+
 class AMPBuilder(network_builder.A2CBuilder):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -171,7 +177,10 @@ class MyAMPBuilder(network_builder.A2CBuilder):
                     
             amp_input_shape = kwargs.get('amp_input_shape')
             self._build_disc(amp_input_shape)
-            self._build_heightmap_enc((12, 12, 1))
+            # columns of the local height map in the env observation, see _add_task_obs_layout
+            self._height_slice = height_map_slice(kwargs.get('obs_layout'))
+            self._heightmap_size = int(round((self._height_slice.stop - self._height_slice.start) ** 0.5))
+            self._build_heightmap_enc((self._heightmap_size, self._heightmap_size, 1))
             return
 
         def load(self, params):
@@ -196,9 +205,7 @@ class MyAMPBuilder(network_builder.A2CBuilder):
             return output
 
         def eval_actor(self, obs):
-            height_map_obs = obs[..., -144:].reshape(-1, 12, 12, 1).permute(0,3,1,2)
-            enc_height_map_obs = self._heightmap_enc(height_map_obs).squeeze(-1).squeeze(-1)
-            obs = torch.cat([obs[..., :-144], enc_height_map_obs], dim=-1)
+            obs = self._encode_height_map(obs)
 
             a_out = self.actor_cnn(obs)
             a_out = a_out.contiguous().view(a_out.size(0), -1)
@@ -223,9 +230,7 @@ class MyAMPBuilder(network_builder.A2CBuilder):
             return
 
         def eval_critic(self, obs):
-            height_map_obs = obs[..., -144:].reshape(-1, 12, 12, 1).permute(0,3,1,2)
-            enc_height_map_obs = self._heightmap_enc(height_map_obs).squeeze(-1).squeeze(-1)
-            obs = torch.cat([obs[..., :-144], enc_height_map_obs], dim=-1)
+            obs = self._encode_height_map(obs)
 
             c_out = self.critic_cnn(obs)
             c_out = c_out.contiguous().view(c_out.size(0), -1)
@@ -233,6 +238,12 @@ class MyAMPBuilder(network_builder.A2CBuilder):
             value = self.value_act(self.value(c_out))
             return value
 
+        def _encode_height_map(self, obs):
+            # the height map columns are dropped and their encoding appended after the remaining ones
+            height_map_obs = obs[..., self._height_slice].reshape(-1, self._heightmap_size, self._heightmap_size, 1).permute(0,3,1,2)
+            enc_height_map_obs = self._heightmap_enc(height_map_obs).squeeze(-1).squeeze(-1)
+            return torch.cat([obs[..., :self._height_slice.start], obs[..., self._height_slice.stop:], enc_height_map_obs], dim=-1)
+
         def eval_disc(self, amp_obs):
             disc_mlp_out = self._disc_mlp(amp_obs)
             disc_logits = self._disc_logits(disc_mlp_out)
@@ -294,6 +305,7 @@ class MyAMPBuilder(network_builder.A2CBuilder):
             return
         
     def build(self, name, **kwargs):
-        kwargs['input_shape'] = (kwargs['input_shape'][0] - 144 + 5,)
+        height_slice = height_map_slice(kwargs.get('obs_layout'))
+        kwargs['input_shape'] = (kwargs['input_shape'][0] - (height_slice.stop - height_slice.start) + 5,)
         net = MyAMPBuilder.Network(self.params, **kwargs)
         return net
\ No newline at end of file
@@ -68,8 +68,10 @@ class AMPPlayerContinuous(common_player.CommonPlayer):
         config = super()._build_net_config()
         if (hasattr(self, 'env')):
             config['amp_input_shape'] = self.env.amp_observation_space.shape
+            config['obs_layout'] = self.env.obs_layout
         else:
             config['amp_input_shape'] = self.env_info['amp_observation_space']
+            config['obs_layout'] = self.env_info.get('obs_layout')
         return config
 
     def _amp_debug(self, info):
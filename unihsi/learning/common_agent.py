@@ -47,6 +47,7 @@ import torch
 from torch import optim
 
 import learning.amp_datasets as amp_datasets
+from utils.plan_stats import report_plan_stats
 
 from tensorboardX import SummaryWriter
 
@@ -61,6 +62,8 @@ class CommonAgent(a2c_continuous.A2CAgent):
         self.bounds_loss_coef = config.get('bounds_loss_coef', None)
         self.clip_actions = config.get('clip_actions', True)
         self._save_intermediate = config.get('save_intermediate', False)
+        # epochs between flushes of the plan / step outcome counters of the task
+        self._plan_stats_freq = config.get('plan_stats_freq', 50)
 
         net_config = self._build_net_config()
         self.model = self.network.build(net_config)
@@ -148,6 +151,8 @@ class CommonAgent(a2c_continuous.A2CAgent):
                 self.writer.add_scalar('performance/step_fps', curr_frames / scaled_play_time, frame)
                 self.writer.add_scalar('info/epochs', epoch_num, frame)
                 self._log_train_info(train_info, frame)
+                if (self._plan_stats_freq > 0 and epoch_num % self._plan_stats_freq == 0):
+                    self._log_plan_stats(frame)
 
                 self.algo_observer.after_print_stats(frame, epoch_num, total_time)
                 
@@ -579,6 +584,13 @@ class CommonAgent(a2c_continuous.A2CAgent):
     def _record_train_batch_info(self, batch_dict, train_info):
         return
 
+    def _log_plan_stats(self, frame):
+        plan_stats = getattr(self.vec_env.env.task, 'plan_stats', None)
+        if (plan_stats is None):
+            return
+        report_plan_stats(plan_stats, plan_stats.flush(), self.writer, frame)
+        return
+
     def _log_train_info(self, train_info, frame):
         self.writer.add_scalar('performance/update_time', train_info['update_time'], frame)
         self.writer.add_scalar('performance/play_time', train_info['play_time'], frame)
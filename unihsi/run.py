@@ -155,6 +155,7 @@ class RLGPUEnv(vecenv.IVecEnv):
         info['action_space'] = self.env.action_space
         info['observation_space'] = self.env.observation_space
         info['amp_observation_space'] = self.env.amp_observation_space
+        info['obs_layout'] = self.env.obs_layout
 
         if self.use_global_obs:
             info['state_space'] = self.env.state_space
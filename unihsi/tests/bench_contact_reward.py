@@ -0,0 +1,40 @@
+""" Time compute_contact_reward against its per-joint loop
+
+    python tests/bench_contact_reward.py [--device cuda:0] [--num_envs 4096]
+
+Runs the joint loop the reward had before it was batched, the batched eager
+kernel and its TorchScript variant on the same random inputs.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import torch
+
+from benchmark import benchmark_kernel
+from env.tasks import unihsi_partnet_kernels
+from kernel_cases import contact_reward_inputs, contact_reward_loop
+from utils.kernels import compile_kernel
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--num_envs', type=int, default=4096)
+    parser.add_argument('--num_pts', type=int, default=200)
+    parser.add_argument('--iters', type=int, default=50)
+    args = parser.parse_args()
+
+    inputs = contact_reward_inputs(args.num_envs, num_pts=args.num_pts)
+    inputs = tuple(x.to(args.device) if isinstance(x, torch.Tensor) else x for x in inputs)
+    variants = [('joint loop', contact_reward_loop), ('batched', unihsi_partnet_kernels.compute_contact_reward),
+                ('batched, script', compile_kernel(unihsi_partnet_kernels.compute_contact_reward, 'script'))]
+    for name, fn in variants:
+        ms = benchmark_kernel(fn, inputs, args.iters)
+        print("{:16s} {:d} envs, {:d} points: {:.2f} ms".format(name, args.num_envs, args.num_pts, ms))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+""" Time brute-force and indexed nearest-point queries against the number of points per set
+
+    python tests/bench_point_index.py [--device cuda:0]
+
+The point sets are random box surfaces of 0.5 - 2 m, queries lie within 1 m
+of them, roughly what the joints see around their contact parts.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import torch
+
+from benchmark import benchmark_kernel
+from point_cases import box_surface_points, queries_near, nearest_points_brute, nearest_points_indexed
+from utils.point_index import VoxelPointIndex
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--point_counts', type=int, nargs='+', default=[200, 500, 1000, 2000, 4000])
+    parser.add_argument('--num_queries', type=int, default=4096)
+    parser.add_argument('--num_sets', type=int, default=64)
+    parser.add_argument('--grid_dim', type=int, default=12)
+    parser.add_argument('--max_candidates', type=int, default=48)
+    parser.add_argument('--margin', type=float, default=0.5)
+    parser.add_argument('--iters', type=int, default=20)
+    args = parser.parse_args()
+
+    generator = torch.Generator(device=args.device).manual_seed(0)
+    for num_pts in args.point_counts:
+        points = box_surface_points(args.num_sets, num_pts, generator, args.device)
+        sets, query = queries_near(points, args.num_queries, generator)
+        index = VoxelPointIndex(points, args.grid_dim, args.max_candidates, args.margin)
+        set_points = points[sets]
+        candidates = index.query(sets, query)
+
+        brute_ms = benchmark_kernel(nearest_points_brute, (set_points, query), args.iters, 2)
+        query_ms = benchmark_kernel(index.query, (sets, query), args.iters, 2)
+        indexed_ms = benchmark_kernel(nearest_points_indexed, (set_points, candidates, query), args.iters, 2)
+        mismatches = int((nearest_points_indexed(set_points, candidates, query)[1] != nearest_points_brute(set_points, query)[1]).sum())
+        print("{:5d} points: brute {:.2f} ms, indexed {:.2f} ms + index query {:.2f} ms, {} of {} nearest points differ, {:.1%} cells truncated".format(
+            num_pts, brute_ms, indexed_ms, query_ms, mismatches, args.num_queries, index.truncated))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+""" Timing helper of the benchmark scripts """
+import time
+
+import torch
+
+
+def benchmark_kernel(fn, args, iters=100, warmup=10):
+    """ Time a kernel on fixed inputs, synchronizing the device around the timed calls
+
+    Return:
+        Return the mean wall time of a call in milliseconds
+    """
+    sync = torch.cuda.synchronize if torch.cuda.is_available() and torch.cuda.is_initialized() else (lambda: None)
+    for _ in range(warmup):
+        fn(*args)
+    sync()
+    start = time.perf_counter()
+    for _ in range(iters):
+        fn(*args)
+    sync()
+    return (time.perf_counter() - start) / iters * 1000
@@ -0,0 +1,74 @@
+import copy
+import os
+import sys
+
+# isaacgym has to be imported before torch
+try:
+    from isaacgym import gymapi, gymutil
+except ImportError:
+    gymapi = None
+
+import pytest
+import yaml
+
+UNIHSI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(UNIHSI_DIR)
+# the code imports utils, env and learning from the unihsi directory like run.py
+if UNIHSI_DIR not in sys.path:
+    sys.path.insert(0, UNIHSI_DIR)
+
+TASK_CFG = os.path.join(UNIHSI_DIR, 'data/cfg/humanoid_unified_interaction_scene_1.yaml')
+# sceneplan and motion of the task tests, relative to the repository root like the scripts
+TASK_PLANS = {
+    'UniHSI_ScanNet': (os.environ.get('UNIHSI_TEST_SCANNET_PLAN', 'sceneplan_demo/scannet_example.json'), 'data/scannet/'),
+    'UniHSI_PartNet': (os.environ.get('UNIHSI_TEST_PARTNET_PLAN', 'sceneplan/partnet_test_simple.json'), 'data/partnet/'),
+}
+TASK_MOTION = 'motion_clips/chair_mo014.npy'
+
+
+@pytest.fixture
+def make_task(monkeypatch):
+    """ Build a small UniHSI task on cpu the way run.py does
+
+    make_task(task_name, seed, **env) returns the task with cfg["env"] updated by
+    env, after seeding the global RNGs with utils.config.set_seed. Skipped without
+    isaacgym or without the scene data of the task.
+    """
+    if gymapi is None:
+        pytest.skip('isaacgym is not installed')
+    monkeypatch.chdir(REPO_DIR)
+    from utils.config import SIM_TIMESTEP, set_seed
+    from utils import parse_task
+
+    with open(TASK_CFG) as f:
+        base_cfg = yaml.load(f, Loader=yaml.SafeLoader)
+
+    tasks = []
+    def _make(task_name, seed=0, num_envs=8, **env):
+        obj_file, data_root = TASK_PLANS[task_name]
+        if not (os.path.exists(obj_file) and os.path.isdir(data_root)):
+            pytest.skip('scene data of {} not found'.format(task_name))
+        cfg = copy.deepcopy(base_cfg)
+        cfg['env'].update(numEnvs=num_envs, motion_file=TASK_MOTION, **env)
+        cfg['name'] = task_name
+        cfg['headless'] = True
+        cfg['task'] = {'randomize': False}
+        cfg['seed'] = seed
+        cfg['env']['seed'] = seed
+        cfg['objFile'] = obj_file
+
+        sim_params = gymapi.SimParams()
+        sim_params.dt = SIM_TIMESTEP
+        sim_params.use_gpu_pipeline = False
+        sim_params.physx.use_gpu = False
+        gymutil.parse_sim_config(cfg['sim'], sim_params)
+
+        set_seed(seed)
+        task = getattr(parse_task, task_name)(cfg=cfg, sim_params=sim_params, physics_engine=gymapi.SIM_PHYSX,
+                                              device_type='cpu', device_id=0, headless=True)
+        tasks.append(task)
+        return task
+
+    yield _make
+    for task in tasks:
+        task.gym.destroy_sim(task.sim)
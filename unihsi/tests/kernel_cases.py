@@ -0,0 +1,166 @@
+""" Random inputs of the task kernels and reference versions they are compared against """
+import torch
+
+from utils.height_map import get_height_maps, build_height_textures
+from utils.quat import quat_rotate
+
+
+def random_quat(num, generator):
+    quat = torch.randn(num, 4, generator=generator)
+    return quat / quat.norm(dim=-1, keepdim=True)
+
+def heading_quat(num, generator):
+    # rotations about z, like the heading rotations of the root
+    theta = torch.rand(num, generator=generator) * 6.2832
+    quat = torch.zeros(num, 4)
+    quat[:, 2] = torch.sin(theta / 2)
+    quat[:, 3] = torch.cos(theta / 2)
+    return quat
+
+def strike_observation_inputs(num_envs=64, num_joints=15, local_scale=9, local_interval=0.2, height_lookup='brute', seed=0):
+    """ Arguments of compute_strike_observations on random regular height maps, laid out like the task """
+    generator = torch.Generator().manual_seed(seed)
+    root_states = torch.randn(num_envs, 13, generator=generator)
+    root_states[:, 3:7] = heading_quat(num_envs, generator)
+    scene = torch.rand(num_envs, 2000, 3, generator=generator) * torch.tensor([4.0, 4.0, 1.0])
+    height_map_pcd = torch.from_numpy(get_height_maps(list(scene.numpy()), 20)).float()
+    height_texture, height_frame = build_height_textures(height_map_pcd)
+
+    grid = torch.stack(torch.meshgrid(torch.arange(local_scale), torch.arange(local_scale), indexing='xy'), -1).reshape(-1, 2)
+    mesh_pos = torch.cat([grid, grid[:, 1:]], -1).float() * local_interval
+    human_in_mesh = torch.tensor([local_interval * (local_scale - 1) / 4, local_interval * (local_scale - 1) / 2, 0])
+    contact_direction = torch.randint(-1, 2, (num_envs, num_joints, 3), generator=generator)
+    out = torch.zeros(num_envs, 15 + 8 * num_joints + local_scale * local_scale)
+    return (root_states, heading_quat(num_envs, generator), heading_quat(num_envs * num_joints, generator),
+            torch.randn(num_envs, 3, generator=generator), torch.randn(num_envs, num_joints, 3, generator=generator),
+            torch.randn(num_envs, num_joints, 3, generator=generator), random_quat(num_envs, generator),
+            torch.rand(num_envs, num_joints, generator=generator) < 0.5, torch.rand(num_envs, num_joints, generator=generator) < 0.5,
+            contact_direction, human_in_mesh, torch.rand(num_envs, 3, generator=generator) * 4, local_scale, height_map_pcd,
+            mesh_pos, torch.randn(num_envs, 3, generator=generator), out, height_texture, height_frame, height_lookup)
+
+def contact_reward_inputs(num_envs=64, num_joints=15, num_pts=200, seed=0):
+    """ Arguments of compute_contact_reward with every joint mask combination present """
+    generator = torch.Generator().manual_seed(seed)
+    root_state = torch.randn(num_envs, 13, generator=generator)
+    root_state[:, 3:7] = random_quat(num_envs, generator)
+    pcd_origin = torch.randn(num_envs, 3, generator=generator)
+    pcd_buffer = torch.rand(num_envs, num_joints, num_pts, 3, generator=generator) * 2 - 1
+    joint_pos_buffer = pcd_origin[:, None] + torch.randn(num_envs, num_joints, 3, generator=generator)
+    contact_type = torch.rand(num_envs, num_joints, generator=generator) < 0.5
+    contact_valid = torch.rand(num_envs, num_joints, generator=generator) < 0.3
+    # walking envs without any valid contact, and envs facing their target
+    contact_valid[:num_envs // 8] = False
+    contact_valid[num_envs // 8:num_envs // 4] = False
+    contact_valid[num_envs // 8:num_envs // 4, -1] = True
+    contact_direction = torch.randint(-1, 2, (num_envs, num_joints, 3), generator=generator)
+    return (torch.randn(num_envs, 3, generator=generator), root_state, heading_quat(num_envs, generator), pcd_buffer,
+            joint_pos_buffer, pcd_origin, root_state[:, 0:3] - 0.02 * torch.randn(num_envs, 3, generator=generator),
+            1.0 / 30.0, contact_type, contact_valid, contact_direction)
+
+def humanoid_reset_inputs(num_envs=64, num_bodies=15, enable_early_termination=True, seed=0):
+    """ Arguments of compute_humanoid_reset with fallen, still, timed out and pushed envs present """
+    generator = torch.Generator().manual_seed(seed)
+    contact_buf = torch.randn(num_envs, num_bodies, 3, generator=generator) * (torch.rand(num_envs, num_bodies, 1, generator=generator) > 0.8)
+    return (torch.randint(0, 2, (num_envs,), generator=generator), torch.randint(0, 300, (num_envs,), generator=generator),
+            contact_buf, torch.tensor([3, 6]), torch.rand(num_envs, num_bodies, 3, generator=generator), torch.tensor([11, 14]),
+            300.0, enable_early_termination, torch.full((num_bodies,), 0.15), torch.rand(num_envs, num_bodies, 3, generator=generator) * 0.3,
+            torch.randint(0, 15, (num_envs,), generator=generator).float(), torch.rand(num_envs, generator=generator) > 0.5,
+            torch.rand(num_envs, generator=generator) > 0.9)
+
+def contact_reward_loop(target, root_state, heading_rot, pcd_buffer, joint_pos_buffer, pcd_origin,
+                        prev_root_pos, dt, contact_type, contact_valid, contact_direction, pos_err_scale=0.5):
+    """ compute_contact_reward before its joints were batched, one iteration per joint.
+    The ScanNet task uses pos_err_scale 5 """
+    dist_threshold = 0.2
+
+    vel_err_scale = 2.0
+    near_pos_err_scale = 10
+
+    tar_speed = 1.0
+
+    root_pos = root_state[..., 0:3]
+
+    contact_type = contact_type.float()
+    env_ids = torch.arange(pcd_buffer.shape[0], device=pcd_buffer.device)
+
+    near_pos_reward_list = []
+    min_pos_idx_list = []
+    near_pos_err_min_list = []
+    local_joint_pos = joint_pos_buffer - pcd_origin[:, None]
+    for i in range(pcd_buffer.shape[1]):
+        near_pos_diff = pcd_buffer[:, i] - local_joint_pos[:, i][:, None]
+        near_pos_err = torch.sum(near_pos_diff * near_pos_diff, dim=-1)
+        near_pos_err_min, min_pos_idx = near_pos_err.min(-1)
+        near_pos_reward = torch.exp(-near_pos_err_scale * near_pos_err_min)
+        near_pos_reward_contact = near_pos_reward * contact_type[:,i] + (1-near_pos_reward) * (1-contact_type[:,i])
+
+        reward_dir = torch.nn.functional.normalize(-near_pos_diff[env_ids, min_pos_idx], dim=-1) * contact_direction[:,i]
+        reward_dir = reward_dir.sum(-1)
+        reward_dir = torch.where(contact_direction[:,i].sum(1)==0, torch.ones_like(reward_dir), reward_dir)
+        reward_dir = torch.where(reward_dir<0, torch.zeros_like(reward_dir), reward_dir)
+        reward_dir = torch.where(contact_type[:,i] == 0, torch.ones_like(reward_dir), reward_dir)
+        contact_w = (1 - near_pos_reward_contact) / (2 - near_pos_reward_contact - reward_dir + 1e-4)
+        dir_w = (1 - reward_dir) / (2 - near_pos_reward_contact - reward_dir + 1e-4)
+        near_pos_err_min = torch.where(reward_dir<0.5, near_pos_err_min + 1, near_pos_err_min)
+        near_pos_reward_contact = contact_w * near_pos_reward_contact + dir_w * reward_dir
+
+        near_pos_reward_contact = torch.where(~contact_valid[:, i], torch.ones_like(near_pos_reward_contact), near_pos_reward_contact)
+        near_pos_reward_list.append(near_pos_reward_contact)
+        min_pos_idx_list.append(min_pos_idx)
+        near_pos_err_min_list.append(near_pos_err_min)
+    near_pos_err_min_buf = torch.stack(near_pos_err_min_list, 1)
+    near_pos_reward_buf = torch.stack(near_pos_reward_list, 0)
+    min_pos_idx_buf = torch.stack(min_pos_idx_list, 1)
+    near_pos_reward_w = (1 - near_pos_reward_buf) / (pcd_buffer.shape[1] - near_pos_reward_buf.sum(0) + 1e-4)
+
+    near_pos_reward = (near_pos_reward_w * near_pos_reward_buf).sum(0)
+
+    facing_target = (contact_valid.sum(-1) == 1) & (contact_valid[:, -1] | contact_valid[:, -4])
+    facing_dir = torch.zeros_like(root_pos)
+    facing_dir[..., 0] = 1.0
+    facing_dir = quat_rotate(heading_rot, facing_dir)
+
+    target_pcd = pcd_buffer[env_ids, -1, min_pos_idx_buf[:, -1]] + pcd_origin
+    pos_diff = target_pcd - root_pos
+    tar_dir = torch.nn.functional.normalize(pos_diff[..., 0:2], dim=-1)
+    tar_dir = torch.where(facing_target[:, None], tar_dir, facing_dir[..., 0:2])
+    obj_facing_reward = torch.sum(tar_dir * facing_dir[..., 0:2], dim=-1)
+    obj_facing_reward = torch.clamp_min(obj_facing_reward, 0.0)
+
+    obj_facing_reward_w = (1-obj_facing_reward) / (2-obj_facing_reward-near_pos_reward + 1e-4)
+    near_pos_reward_w = (1-near_pos_reward) / (2-obj_facing_reward-near_pos_reward + 1e-4)
+
+    near_pos_reward = obj_facing_reward_w * obj_facing_reward + near_pos_reward_w * near_pos_reward
+
+    pos_diff = target - root_pos
+    pos_err = torch.sum(pos_diff * pos_diff, dim=-1)
+    pos_reward = torch.exp(-pos_err_scale * pos_err)
+
+    dist_mask = pos_err < dist_threshold
+
+    tar_dir = torch.nn.functional.normalize(pos_diff[..., 0:2], dim=-1)
+    delta_root_pos = root_pos - prev_root_pos
+    root_vel = delta_root_pos / dt
+    tar_dir_speed = torch.sum(tar_dir * root_vel[..., :2], dim=-1)
+    tar_vel_err = tar_speed - tar_dir_speed
+    vel_reward = torch.exp(-vel_err_scale * (tar_vel_err * tar_vel_err))
+    speed_mask = tar_dir_speed <= 0
+    vel_reward = torch.where(speed_mask, torch.zeros_like(vel_reward), vel_reward)
+    vel_reward = torch.where(dist_mask, torch.ones_like(vel_reward), vel_reward)
+
+    facing_err = torch.sum(tar_dir * facing_dir[..., 0:2], dim=-1)
+    facing_reward = torch.clamp_min(facing_err, 0.0)
+    facing_reward = torch.where(dist_mask, torch.ones_like(facing_reward), facing_reward)
+
+    pos_reward_w = (1-pos_reward) / (3-pos_reward-vel_reward-facing_reward + 1e-4)
+    vel_reward_w = (1-vel_reward) / (3-pos_reward-vel_reward-facing_reward + 1e-4)
+    face_reward_w = (1-facing_reward) / (3-pos_reward-vel_reward-facing_reward + 1e-4)
+
+    far_reward = pos_reward_w * pos_reward + vel_reward_w * vel_reward + face_reward_w * facing_reward
+
+    not_walking = contact_valid.sum(-1)>0
+
+    reward = torch.where(not_walking, near_pos_reward, far_reward)
+    pos_err = torch.where(not_walking, torch.zeros_like(pos_err), pos_err)
+
+    return reward, pos_err, near_pos_err_min_buf, min_pos_idx_buf, tar_dir
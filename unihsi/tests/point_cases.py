@@ -0,0 +1,30 @@
+""" Point sets and nearest-point searches the voxel point index is compared against """
+import torch
+
+
+def box_surface_points(num_sets, num_pts, generator, device='cpu'):
+    """ Random box surfaces of 0.5 - 2 m, roughly the contact parts, [num_sets, num_pts, 3] """
+    size = torch.rand(num_sets, 1, 3, generator=generator, device=device) * 1.5 + 0.5
+    points = torch.rand(num_sets, num_pts, 3, generator=generator, device=device)
+    face = torch.randint(0, 3, (num_sets, num_pts), generator=generator, device=device)
+    side = torch.randint(0, 2, (num_sets, num_pts), generator=generator, device=device).float()
+    points.scatter_(2, face[..., None], side[..., None])
+    return points * size
+
+def queries_near(points, num_queries, generator, spread=1.0):
+    """ Point set and position of queries within spread of the sets """
+    num_sets = points.shape[0]
+    sets = torch.randint(0, num_sets, (num_queries,), generator=generator, device=points.device)
+    query = points[sets, 0] + (torch.rand(num_queries, 3, generator=generator, device=points.device) * 2 - 1) * spread
+    return sets, query
+
+def nearest_points_brute(points, query):
+    """ Squared distance to and index of the nearest of points, [B, P, 3], for query, [B, 3] """
+    diff = points - query[:, None]
+    return torch.sum(diff * diff, dim=-1).min(-1)
+
+def nearest_points_indexed(points, candidates, query):
+    """ Same as nearest_points_brute over the candidates [B, K] of VoxelPointIndex.query """
+    candidate_points = torch.gather(points, 1, candidates[..., None].expand(-1, -1, 3))
+    err, pos = nearest_points_brute(candidate_points, query)
+    return err, torch.gather(candidates, 1, pos[:, None]).squeeze(1)
@@ -0,0 +1,63 @@
+import numpy as np
+
+from utils.asset_registry import AssetRegistry
+
+
+def load_array(num_bytes):
+    calls = []
+    def loader():
+        calls.append(1)
+        return np.zeros(num_bytes, dtype=np.uint8)
+    return loader, calls
+
+
+def test_hits_reuse_the_loaded_value():
+    registry = AssetRegistry()
+    loader, calls = load_array(10)
+    a = registry.get(('partnet_mesh', '1'), loader)
+    b = registry.get(('partnet_mesh', '1'), loader)
+    assert a is b and len(calls) == 1
+    assert registry.counts() == {'hits': 1, 'misses': 1, 'evictions': 0}
+
+
+def test_least_recently_used_entries_are_evicted_past_capacity():
+    registry = AssetRegistry(max_bytes=300)
+    for key in 'abc':
+        registry.get(key, load_array(100)[0])
+    assert list(registry.entries) == ['a', 'b', 'c'] and registry.total_bytes == 300
+
+    # a becomes the most recent, d pushes out b, the least recently used
+    registry.get('a', load_array(100)[0])
+    registry.get('d', load_array(100)[0])
+    assert list(registry.entries) == ['c', 'a', 'd']
+    assert registry.total_bytes == 300 and registry.evictions == 1
+
+    # a large entry evicts as many old entries as it needs
+    registry.get('e', load_array(250)[0])
+    assert list(registry.entries) == ['e']
+    assert registry.total_bytes == 250 and registry.evictions == 4
+
+    # an evicted key is loaded again
+    loader, calls = load_array(10)
+    registry.get('b', loader)
+    assert len(calls) == 1 and list(registry.entries) == ['e', 'b']
+
+
+def test_entry_larger_than_capacity_is_kept_alone():
+    registry = AssetRegistry(max_bytes=100)
+    registry.get('a', load_array(50)[0])
+    registry.get('big', load_array(500)[0])
+    assert list(registry.entries) == ['big'] and registry.total_bytes == 500
+
+
+def test_nested_values_are_sized():
+    registry = AssetRegistry(max_bytes=1000)
+    registry.get('labels', lambda: (np.zeros(100, dtype=np.int32), {'seat1': 1}))
+    assert registry.entry_bytes['labels'] == 400 + len('seat1') + 8
+
+
+def test_worker_counts_are_merged():
+    registry = AssetRegistry()
+    registry.get('a', load_array(1)[0])
+    registry.add_counts({'hits': 3, 'misses': 2, 'evictions': 1})
+    assert registry.counts() == {'hits': 3, 'misses': 3, 'evictions': 1}
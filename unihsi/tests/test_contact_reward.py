@@ -0,0 +1,32 @@
+import pytest
+import torch
+
+from env.tasks import unihsi_partnet_kernels, unihsi_scannet_kernels
+from kernel_cases import contact_reward_inputs, contact_reward_loop
+
+# kernel module and the pos_err_scale of its reward, the PartNet training task runs the PartNet kernels
+KERNEL_MODULES = [pytest.param(unihsi_partnet_kernels, 0.5, id='partnet'), pytest.param(unihsi_scannet_kernels, 5.0, id='scannet')]
+
+
+@pytest.mark.parametrize('module,pos_err_scale', KERNEL_MODULES)
+@pytest.mark.parametrize('num_envs', [64, 257])
+def test_batched_contact_reward_matches_joint_loop(module, pos_err_scale, num_envs):
+    args = contact_reward_inputs(num_envs, seed=num_envs)
+    expected = contact_reward_loop(*args, pos_err_scale=pos_err_scale)
+    actual = module.compute_contact_reward(*args)
+
+    # pos_err, the per-joint min error, the nearest point indices and tar_dir are exact,
+    # the reward sums the joints in another order
+    for name, e, a in zip(['pos_err', 'near_pos_err_min', 'min_pos_idx', 'tar_dir'], expected[1:], actual[1:]):
+        assert torch.equal(e, a), name
+    torch.testing.assert_close(actual[0], expected[0], rtol=1e-3, atol=1e-5)
+
+
+def test_contact_reward_all_candidates_matches_all_points():
+    args = contact_reward_inputs(32, num_pts=50)
+    num_envs, num_joints, num_pts = args[3].shape[:3]
+    candidates = torch.arange(num_pts).expand(num_envs, num_joints, num_pts)
+    expected = unihsi_partnet_kernels.compute_contact_reward(*args)
+    actual = unihsi_partnet_kernels.compute_contact_reward(*args, candidates)
+    for e, a in zip(expected, actual):
+        assert torch.equal(e, a)
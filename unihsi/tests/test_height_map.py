@@ -0,0 +1,146 @@
+import numpy as np
+import pytest
+import torch
+
+from utils.height_map import (HEIGHT_LOOKUPS, get_height_map, get_height_maps, build_height_textures,
+                              sample_height_map, sample_height_map_brute)
+
+
+def height_map_loop(points, HEIGHT_MAP_DIM, scannet=False):
+    """ The per-cell loop get_height_map replaced, the ScanNet variant cut off
+    heights from 1.5 and clamped negative cells to 0 """
+    points = points.copy()
+    minx, miny = points[:, 0].min(), points[:, 1].min()
+    maxx, maxy = points[:, 0].max(), points[:, 1].max()
+
+    if scannet:
+        height_mask = points[:, 2] < 1.5
+        points[~height_mask, 2] = 0.0
+
+    interval_x = (maxx-minx)/HEIGHT_MAP_DIM
+    interval_y = (maxy-miny)/HEIGHT_MAP_DIM
+    voxel_idx_x = (points[:, 0]-minx) // interval_x
+    voxel_idx_y = (points[:, 1]-miny) // interval_y
+
+    height_map2d = np.zeros((HEIGHT_MAP_DIM,HEIGHT_MAP_DIM))
+    for i in range(HEIGHT_MAP_DIM):
+        for j in range(HEIGHT_MAP_DIM):
+            mask = (voxel_idx_x==i)&(voxel_idx_y==j)
+            if mask.sum()==0:
+                pass
+            else:
+                height_map2d[j,i] = points[mask, 2].max()
+
+    x = np.linspace(minx, maxx, HEIGHT_MAP_DIM)
+    y = np.linspace(miny, maxy, HEIGHT_MAP_DIM)
+    xx, yy = np.meshgrid(x, y)
+    pos2d = np.concatenate([xx[..., None], yy[..., None]], axis=-1)
+
+    height_pcd = np.concatenate([pos2d.reshape(-1,2),height_map2d.reshape(-1,1)], axis=-1)
+    if scannet:
+        height_pcd[height_pcd[:,2]<0,2] = 0
+    return height_pcd
+
+def scene_points(num_points, rng):
+    # float32 like the mesh vertices, with cells left empty, points below the
+    # floor and above the ScanNet cutoff
+    points = rng.random((num_points, 3)).astype(np.float32) * np.array([4.0, 3.0, 2.5], dtype=np.float32)
+    sunken = points[:, 0] > 3.0
+    points[sunken, 2] = -0.1 * points[sunken, 2]
+    keep = ~((points[:, 0] > 1.0) & (points[:, 0] < 1.6) & (points[:, 1] < 1.0))
+    return points[keep]
+
+def random_height_maps(num_envs, dim, seed=0, rotate=True):
+    """ Height maps of random scenes, translated and rotated about z like the env maps """
+    rng = np.random.default_rng(seed)
+    scenes = [rng.random((2000, 3)).astype(np.float32) * np.array([4.0, 3.0, 1.0], dtype=np.float32) for _ in range(num_envs)]
+    height_map_pcd = torch.from_numpy(get_height_maps(scenes, dim)).float()
+    if rotate:
+        theta = torch.from_numpy(rng.random(num_envs)).float() * 6.2832
+        rot = torch.stack([torch.cos(theta), -torch.sin(theta), torch.sin(theta), torch.cos(theta)], -1).view(-1, 2, 2)
+        shift = torch.from_numpy(rng.random((num_envs, 1, 2))).float() * 10 - 5
+        height_map_pcd[..., :2] = height_map_pcd[..., :2] @ rot.transpose(1, 2) + shift
+    return height_map_pcd
+
+def random_queries(height_map_pcd, num_queries, seed=0):
+    # around the map, a part of them off it
+    generator = torch.Generator().manual_seed(seed)
+    lo = height_map_pcd[..., :2].min(1)[0][:, None]
+    hi = height_map_pcd[..., :2].max(1)[0][:, None]
+    u = torch.rand(height_map_pcd.shape[0], num_queries, 2, generator=generator) * 1.4 - 0.2
+    return lo + u * (hi - lo)
+
+def unexplained_mismatches(height_map_pcd, query_xy, expected, actual, valid_sq_dist=0.05, tie_tol=1e-5):
+    """ Queries whose heights differ, other than by a query equidistant to two cells
+    or on the valid_sq_dist boundary, where rounding alone can flip the result """
+    env_ids, query_ids = torch.nonzero(expected != actual, as_tuple=True)
+    dist = query_xy[env_ids, query_ids][:, None] - height_map_pcd[env_ids][..., :2]
+    sum_dist = torch.sum(dist * dist, dim=-1)
+    nearest = sum_dist.min(-1)[0]
+    tie = ((sum_dist - nearest[:, None]).abs() <= tie_tol).sum(-1) > 1
+    boundary = (nearest - valid_sq_dist).abs() <= tie_tol
+    return int((~(tie | boundary)).sum())
+
+
+@pytest.mark.parametrize('lookup', ['grid', 'texture'])
+@pytest.mark.parametrize('dim,rotate', [(16, False), (16, True), (100, True)])
+def test_lookup_matches_brute_force(lookup, dim, rotate):
+    height_map_pcd = random_height_maps(8, dim, seed=dim, rotate=rotate)
+    query_xy = random_queries(height_map_pcd, 81, seed=dim)
+    height_texture, height_frame = build_height_textures(height_map_pcd)
+    # the maps of all envs share one layout, see sample_height_map_grid, query the first one
+    expected = sample_height_map_brute(height_map_pcd[:1].expand(8, -1, -1), query_xy)
+    actual = sample_height_map(height_map_pcd[:1].expand(8, -1, -1), height_texture[:1].expand(8, -1, -1, -1),
+                               height_frame[:1].expand(8, -1, -1), query_xy, 0.05, lookup)
+    assert actual.shape == expected.shape and actual.dtype == expected.dtype
+    assert unexplained_mismatches(height_map_pcd[:1].expand(8, -1, -1), query_xy, expected, actual) == 0
+    assert (expected != actual).float().mean() < 0.01
+
+
+@pytest.mark.parametrize('lookup', HEIGHT_LOOKUPS)
+def test_valid_mask_zeroes_far_queries(lookup):
+    height_map_pcd = random_height_maps(1, 4, rotate=False)
+    height_map_pcd[..., 2] = 1.0
+    height_texture, height_frame = build_height_textures(height_map_pcd)
+    cell = height_map_pcd[:, 5, :2]
+    # the cells are about 1 m apart, cell 5 stays the nearest of all queries but the last:
+    # on it, just inside and just outside the 0.05 squared distance, far off the map
+    query_xy = torch.stack([cell[0], cell[0] + torch.tensor([0.2, 0.0]), cell[0] + torch.tensor([0.0, 0.23]),
+                            cell[0] + torch.tensor([20.0, 20.0])])[None]
+    heights = sample_height_map(height_map_pcd, height_texture, height_frame, query_xy, 0.05, lookup)
+    assert heights.tolist() == [[1.0, 1.0, 0.0, 0.0]]
+
+
+@pytest.mark.parametrize('lookup', HEIGHT_LOOKUPS)
+def test_flat_scene_does_not_divide_by_zero(lookup):
+    points = np.zeros((50, 3), dtype=np.float32)
+    points[:, 0] = np.linspace(0, 2, 50)
+    height_map_pcd = torch.from_numpy(get_height_map(points, 8))[None].float()
+    height_texture, height_frame = build_height_textures(height_map_pcd)
+    query_xy = torch.tensor([[[0.5, 0.0], [1.0, 0.01], [5.0, 5.0]]])
+    heights = sample_height_map(height_map_pcd, height_texture, height_frame, query_xy, 0.05, lookup)
+    assert torch.isfinite(heights).all()
+    assert torch.equal(heights, sample_height_map_brute(height_map_pcd, query_xy))
+
+
+@pytest.mark.parametrize('dim', [20, 100])
+def test_height_maps_match_the_per_cell_loop(dim):
+    rng = np.random.default_rng(dim)
+    scenes = [scene_points(n, rng) for n in (300, 3000)]
+    partnet = get_height_maps(scenes, dim)
+    scannet = get_height_maps(scenes, dim, height_cutoff=1.5, clamp_negative=True)
+    for i, scene in enumerate(scenes):
+        assert np.array_equal(partnet[i], height_map_loop(scene, dim))
+        assert np.array_equal(scannet[i], height_map_loop(scene, dim, scannet=True))
+        assert np.array_equal(get_height_map(scene, dim), height_map_loop(scene, dim))
+        assert np.array_equal(get_height_map(scene, dim, height_cutoff=1.5, clamp_negative=True),
+                              height_map_loop(scene, dim, scannet=True))
+        assert (partnet[i][:, 2] < 0).any() and (partnet[i][:, 2] > 1.5).any()
+
+
+def test_batched_height_maps_match_single_scene():
+    rng = np.random.default_rng(0)
+    scenes = [rng.random((n, 3)).astype(np.float32) * 3 for n in (100, 500, 2000)]
+    batched = get_height_maps(scenes, 16, height_cutoff=2.5, clamp_negative=True)
+    for scene, height_map in zip(scenes, batched):
+        assert np.array_equal(get_height_map(scene, 16, height_cutoff=2.5, clamp_negative=True), height_map)
@@ -0,0 +1,102 @@
+import pytest
+import torch
+
+from env.tasks import unihsi_partnet_kernels, unihsi_scannet_kernels
+from kernel_cases import random_quat, strike_observation_inputs, contact_reward_inputs, humanoid_reset_inputs
+from utils.height_map import HEIGHT_LOOKUPS
+from utils.kernels import compile_kernel, check_kernel, compare_kernel_outputs, VerifiedKernel
+from utils.quat import quat_mul, quat_rotate, quat_to_tan_norm
+
+# the PartNet training task runs the PartNet kernels
+KERNEL_MODULES = [pytest.param(unihsi_partnet_kernels, id='partnet'), pytest.param(unihsi_scannet_kernels, id='scannet')]
+
+KERNEL_CASES = [
+    pytest.param('compute_strike_observations', lambda n: strike_observation_inputs(n, seed=n), id='obs'),
+    pytest.param('compute_strike_observations', lambda n: strike_observation_inputs(n, height_lookup='grid', seed=n), id='obs_grid'),
+    pytest.param('compute_strike_observations', lambda n: strike_observation_inputs(n, height_lookup='texture', seed=n), id='obs_texture'),
+    pytest.param('compute_strike_observations', lambda n: strike_observation_inputs(n, local_scale=5, seed=n), id='obs_scale5'),
+    pytest.param('compute_contact_reward', lambda n: contact_reward_inputs(n, seed=n), id='reward'),
+    pytest.param('compute_humanoid_reset', lambda n: humanoid_reset_inputs(n, seed=n), id='reset'),
+    pytest.param('compute_humanoid_reset', lambda n: humanoid_reset_inputs(n, enable_early_termination=False, seed=n), id='reset_no_et'),
+]
+
+
+@pytest.mark.parametrize('module', KERNEL_MODULES)
+@pytest.mark.parametrize('kernel,make_inputs', KERNEL_CASES)
+def test_scripted_kernel_matches_eager(module, kernel, make_inputs):
+    fn = getattr(module, kernel)
+    scripted = compile_kernel(fn, 'script')
+    # a second batch size, the scripted kernel must not specialize on the first
+    for num_envs in (64, 17):
+        check_kernel(fn, scripted, make_inputs(num_envs))
+
+
+def test_compiled_kernel_matches_eager():
+    torch._dynamo.reset()
+    fn = unihsi_partnet_kernels.compute_contact_reward
+    compiled = compile_kernel(fn, 'compile')
+    for num_envs in (64, 17):
+        check_kernel(fn, compiled, contact_reward_inputs(num_envs, seed=num_envs))
+
+
+def test_eager_mode_returns_the_kernel():
+    fn = unihsi_partnet_kernels.compute_humanoid_reset
+    assert compile_kernel(fn, 'eager') is fn
+    with pytest.raises(ValueError):
+        compile_kernel(fn, 'fast')
+
+
+def test_verified_kernel_checks_first_call_only():
+    fn = unihsi_partnet_kernels.compute_humanoid_reset
+    def wrong(*args):
+        reset, terminated, still_buf = fn(*args)
+        return reset, terminated, still_buf + 1
+    kernel = VerifiedKernel(fn, wrong, 'script')
+    with pytest.raises(ValueError):
+        kernel(*humanoid_reset_inputs())
+    verified = compile_kernel(fn, 'script', verify=True)
+    verified(*humanoid_reset_inputs())
+    assert verified.verified
+
+
+@pytest.mark.parametrize('lookup', HEIGHT_LOOKUPS)
+def test_observation_layout_is_filled(lookup):
+    args = strike_observation_inputs(32, height_lookup=lookup)
+    out, height_map, _ = unihsi_partnet_kernels.compute_strike_observations(*args)
+    assert out.data_ptr() == args[16].data_ptr()
+    # everything but the zero target velocity is written
+    num_joints, local_scale = args[7].shape[1], args[12]
+    start = 15 + 2 * num_joints
+    assert torch.equal(out[:, start:start + local_scale * local_scale], height_map)
+    assert torch.equal(out[:, 9:12], torch.zeros(32, 3))
+
+
+def test_compare_kernel_outputs_rejects_mismatches():
+    a = (torch.ones(4), torch.arange(4))
+    assert compare_kernel_outputs(a, (torch.ones(4) + 1e-7, torch.arange(4))) < 1e-6
+    with pytest.raises(ValueError):
+        compare_kernel_outputs(a, (torch.ones(4), torch.arange(4) + 1))
+    with pytest.raises(ValueError):
+        compare_kernel_outputs(a, (torch.ones(4).double(), torch.arange(4)))
+    with pytest.raises(ValueError):
+        compare_kernel_outputs(a, (torch.ones(4),))
+
+
+def test_quat_ops_match_isaacgym():
+    torch_utils = pytest.importorskip('isaacgym.torch_utils')
+    generator = torch.Generator().manual_seed(0)
+    a, b = random_quat(64, generator), random_quat(64, generator)
+    v = torch.randn(64, 3, generator=generator)
+    assert torch.equal(quat_mul(a, b), torch_utils.quat_mul(a, b))
+    assert torch.equal(quat_rotate(a, v), torch_utils.quat_rotate(a, v))
+    from utils import torch_utils as task_torch_utils
+    assert torch.equal(quat_to_tan_norm(a), task_torch_utils.quat_to_tan_norm(a))
+
+
+def test_tasks_run_the_kernel_modules():
+    pytest.importorskip('isaacgym')
+    from env.tasks import unihsi_partnet, unihsi_partnet_train, unihsi_scannet
+    for task, kernels in ((unihsi_partnet, unihsi_partnet_kernels), (unihsi_partnet_train, unihsi_partnet_kernels),
+                          (unihsi_scannet, unihsi_scannet_kernels)):
+        for name in ('compute_strike_observations', 'compute_contact_reward', 'compute_humanoid_reset'):
+            assert getattr(task, name) is getattr(kernels, name)
@@ -0,0 +1,62 @@
+import numpy as np
+import torch
+
+from utils.coc_table import build_step_offsets, step_rows
+from utils.plan_stats import STAT_KEYS, PlanStepStats
+
+# plans without steps in the middle and at the end of the packed tables
+STEP_NUMBERS = [2, 0, 3, 1, 0]
+
+
+def make_stats():
+    offsets, num_rows = build_step_offsets(STEP_NUMBERS)
+    max_steps = torch.tensor(STEP_NUMBERS)
+    return PlanStepStats(offsets, max_steps, num_rows, ['plan_{}'.format(i) for i in range(len(STEP_NUMBERS))], 'cpu'), \
+        offsets, max_steps
+
+def record(stats, offsets, max_steps, plan_ids, step_ids, ended, fulfilled, sim_steps):
+    plan_ids, step_ids = torch.tensor(plan_ids), torch.tensor(step_ids)
+    rows = step_rows(offsets, max_steps, plan_ids, step_ids)
+    false = torch.zeros(len(plan_ids), dtype=torch.bool)
+    stats.record(rows, torch.tensor(ended), torch.tensor(fulfilled), ~torch.tensor(fulfilled), false, false,
+                 torch.tensor(sim_steps))
+    return rows
+
+
+def test_record_adds_to_the_step_rows():
+    stats, offsets, max_steps = make_stats()
+    rows = record(stats, offsets, max_steps, [0, 0, 2, 2, 3, 0], [0, 1, 2, 2, 0, 0],
+                  [True, True, True, True, True, False], [True, False, True, False, True, True], [10, 20, 30, 40, 50, 60])
+    assert rows.tolist() == [1, 2, 5, 5, 6, 1]
+    counts = stats.counts.numpy()
+    # the first reset of an env did not run a step and adds nothing
+    assert counts[1].tolist() == [1, 1, 0, 0, 0, 10]
+    assert counts[5].tolist() == [2, 1, 1, 0, 0, 70]
+    assert counts[0].sum() == 0
+
+
+def test_flush_sums_plans_and_clears():
+    stats, offsets, max_steps = make_stats()
+    record(stats, offsets, max_steps, [0, 0, 0, 2, 2, 2, 3], [0, 0, 1, 0, 1, 2, 0],
+           [True] * 7, [True, False, True, True, True, False, True], [5, 6, 7, 8, 9, 10, 11])
+    summary = stats.flush()
+    steps, plans = summary['steps'], summary['plans']
+    assert steps.shape == (sum(STEP_NUMBERS) + 1, len(STAT_KEYS))
+    assert stats.counts.sum() == 0
+
+    attempts, fulfilled, sim_steps = STAT_KEYS.index('attempts'), STAT_KEYS.index('fulfilled'), STAT_KEYS.index('sim_steps')
+    # attempts of the first step, fulfilled of the last one, the other counters summed over the steps
+    assert plans[:, attempts].tolist() == [2, 0, 1, 1, 0]
+    assert plans[:, fulfilled].tolist() == [1, 0, 0, 1, 0]
+    assert plans[:, sim_steps].tolist() == [18, 0, 27, 11, 0]
+    assert stats.flush()['plans'].sum() == 0
+
+
+def test_plans_without_steps_count_nothing():
+    # every row counted, plans without steps must not pick up their neighbours' rows
+    stats, offsets, max_steps = make_stats()
+    stats.counts[1:] = 1
+    plans = stats.flush()['plans']
+    assert np.array_equal(plans[:, STAT_KEYS.index('sim_steps')], STEP_NUMBERS)
+    assert plans[[1, 4]].sum() == 0
+    assert stats.step_names() == ['padding', 'plan_0/0', 'plan_0/1', 'plan_2/0', 'plan_2/1', 'plan_2/2', 'plan_3/0']
@@ -0,0 +1,54 @@
+import pytest
+import torch
+
+from point_cases import box_surface_points, queries_near, nearest_points_brute, nearest_points_indexed
+from utils.point_index import VoxelPointIndex
+
+
+@pytest.mark.parametrize('num_pts', [50, 200, 1000])
+def test_indexed_nearest_points_match_brute_force(num_pts):
+    generator = torch.Generator().manual_seed(num_pts)
+    points = box_surface_points(16, num_pts, generator)
+    sets, query = queries_near(points, 2048, generator)
+    # enough candidates that no cell is truncated, the lookup is then exact
+    index = VoxelPointIndex(points, grid_dim=8, max_candidates=num_pts)
+    assert index.truncated == 0
+
+    brute_err, brute_idx = nearest_points_brute(points[sets], query)
+    err, idx = nearest_points_indexed(points[sets], index.query(sets, query), query)
+    assert torch.equal(idx, brute_idx)
+    assert torch.equal(err, brute_err)
+
+
+def test_truncated_cells_rarely_miss():
+    # the task defaults on dense parts, nearly every cell lists more points than it keeps
+    generator = torch.Generator().manual_seed(0)
+    points = box_surface_points(16, 2000, generator)
+    sets, query = queries_near(points, 2048, generator)
+    index = VoxelPointIndex(points, grid_dim=12, max_candidates=48)
+    assert index.truncated > 0.5
+
+    brute_err, brute_idx = nearest_points_brute(points[sets], query)
+    err, idx = nearest_points_indexed(points[sets], index.query(sets, query), query)
+    assert (err >= brute_err).all()
+    assert (idx != brute_idx).float().mean() < 0.01
+
+
+def test_queries_outside_the_grid_use_border_cells():
+    generator = torch.Generator().manual_seed(1)
+    points = box_surface_points(4, 100, generator)
+    index = VoxelPointIndex(points, grid_dim=6, max_candidates=100)
+    sets = torch.arange(4)
+    query = points.max(1)[0] + 5.0
+    candidates = index.query(sets, query)
+    assert candidates.shape == (4, 100)
+    assert ((candidates >= 0) & (candidates < 100)).all()
+
+
+def test_ties_resolve_like_argmin():
+    # duplicated points, the lower index wins like the brute-force argmin
+    points = torch.tensor([[[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]])
+    index = VoxelPointIndex(points, grid_dim=4, max_candidates=4)
+    query = torch.tensor([[0.9, 0.1, 0.0]])
+    _, idx = nearest_points_indexed(points, index.query(torch.zeros(1, dtype=torch.long), query), query)
+    assert idx.item() == 1
@@ -0,0 +1,239 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from utils import scene_loader
+from utils.asset_registry import AssetRegistry
+from utils.scene_cache import SceneCache
+
+PARTNET_IDS = ['2001', '2002', '11570']
+
+
+def write_partnet_labels(root, pid, rng):
+    os.makedirs(os.path.join(root, pid, 'point_sample'), exist_ok=True)
+    np.savetxt(os.path.join(root, pid, 'point_sample/sample-points-all-label-10000.txt'), rng.integers(1, 4, 300), fmt='%d')
+    result = [{'name': 'chair', 'id': 0, 'children': [{'name': 'seat', 'id': 1}, {'name': 'back', 'id': 2},
+                                                       {'name': 'leg', 'id': 3}]}]
+    with open(os.path.join(root, pid, 'result.json'), 'w') as f:
+        json.dump(result, f)
+
+def write_partnet_object(root, pid, size, rng):
+    o3d = pytest.importorskip('open3d')
+    os.makedirs(os.path.join(root, pid, 'models'))
+    write_partnet_labels(root, pid, rng)
+    mesh = o3d.geometry.TriangleMesh.create_box(*size)
+    o3d.io.write_triangle_mesh(os.path.join(root, pid, 'models/model_normalized.obj'), mesh)
+    points = rng.random((300, 3)) * np.array(size)
+    o3d.io.write_point_cloud(os.path.join(root, pid, 'point_sample/sample-points-all-pts-label-10000.ply'),
+                             o3d.geometry.PointCloud(o3d.utility.Vector3dVector(points)))
+
+def write_partnet_alignment(rng):
+    alignment = dict()
+    for pid in PARTNET_IDS:
+        alignment[pid] = {'transmat': (np.eye(4) + rng.random((4, 4)) * 0.1 * np.array([1, 1, 1, 0])).reshape(-1).tolist()}
+    with open(scene_loader.PARTNET_ALIGNMENT_FILE, 'w') as f:
+        json.dump(alignment, f)
+
+def partnet_obj(pid, rotate, scale, transfer):
+    return {'id': pid, 'rotate': rotate, 'scale': scale, 'transfer': transfer}
+
+def make_partnet_plans():
+    """ Three PartNet objects placed in three plans, one placement shared by two plans """
+    chair = partnet_obj('2001', [[1.5708, 0, 0]], 1.0, [1.0, 0.0, 0.0])
+    return {
+        'plan_0': {'obj': {'000': chair, '001': partnet_obj('2002', [[1.5708, 0, 0], [0, 0, 0.5]], 1.2, [0.0, 1.0, 0.0])}},
+        'plan_1': {'obj': {'000': partnet_obj('11570', [[1.5708, 0, 0]], 0.8, [0.0, 0.0, 0.0]), '001': dict(chair)}},
+        'plan_2': {'obj': {'000': partnet_obj('2001', [[1.5708, 0, 3.1416]], 0.9, [-1.0, 0.5, 0.0])}},
+    }
+
+def write_scannet_segments(scene_id, num_vertices, rng):
+    with open(scene_loader.scannet_segs_file(scene_id), 'w') as f:
+        json.dump({'segIndices': rng.integers(0, 12, num_vertices).tolist()}, f)
+    with open(scene_loader.scannet_aggregation_file(scene_id), 'w') as f:
+        json.dump({'segGroups': [{'segments': [0, 3, 5]}, {'segments': [1, 2, 7, 11]}]}, f)
+
+def scannet_plan(scene_id, rotate, scale):
+    return {'scene_id': scene_id, 'rotate': rotate, 'scale': scale, 'transfer': [0.5, 0.5, 0.0],
+            'obj': {'000': {'name': 'chair', 'id': '0', 'part_id': {'seat': [0, 1], 'back': [2]}},
+                    '001': {'name': 'table', 'id': '1', 'part_id': {'top': [1, 3]}}}}
+
+def make_scannet_plans():
+    """ Three plans on two ScanNet scenes, one scene used by two plans """
+    return {'plan_0': scannet_plan('0001_00', [[1.5708, 0, 0]], 1.0), 'plan_1': scannet_plan('0002_00', [[1.5708, 0, 0]], 1.0),
+            'plan_2': scannet_plan('0001_00', [[1.5708, 0, 0.3]], 0.9)}
+
+@pytest.fixture
+def partnet_plans(tmp_path, monkeypatch):
+    """ Synthetic PartNet objects written as the raw files, needs open3d """
+    monkeypatch.chdir(tmp_path)
+    rng = np.random.default_rng(0)
+    for i, pid in enumerate(PARTNET_IDS):
+        write_partnet_object(scene_loader.PARTNET_ROOT, pid, (0.5 + 0.1 * i, 0.6, 0.9 - 0.1 * i), rng)
+    write_partnet_alignment(rng)
+    return make_partnet_plans()
+
+@pytest.fixture
+def scannet_plans(tmp_path, monkeypatch):
+    """ Synthetic ScanNet scenes written as the raw files, needs open3d """
+    o3d = pytest.importorskip('open3d')
+    monkeypatch.chdir(tmp_path)
+    rng = np.random.default_rng(1)
+    os.makedirs(scene_loader.SCANNET_ROOT)
+    for scene_id in ('0001_00', '0002_00'):
+        mesh = o3d.geometry.TriangleMesh.create_box(3.0, 2.0, 2.5).subdivide_midpoint(2)
+        o3d.io.write_triangle_mesh(scene_loader.scannet_mesh_file(scene_id), mesh)
+        write_scannet_segments(scene_id, np.asarray(mesh.vertices).shape[0], rng)
+    return make_scannet_plans()
+
+def cached_geometry(vertices_shape, rng):
+    return {'vertices': rng.random(vertices_shape).astype(np.float32),
+            'triangles': rng.integers(0, vertices_shape[0], (vertices_shape[0] * 2, 3)).astype(np.uint32)}
+
+@pytest.fixture
+def cached_partnet_plans(tmp_path, monkeypatch):
+    """ PartNet plans whose transformed geometry is already in the cache, so
+    ingestion only reads labels and the cache and runs without open3d """
+    monkeypatch.chdir(tmp_path)
+    rng = np.random.default_rng(2)
+    for pid in PARTNET_IDS:
+        write_partnet_labels(scene_loader.PARTNET_ROOT, pid, rng)
+    write_partnet_alignment(rng)
+    cache = SceneCache(str(tmp_path / 'cache'))
+    plans = make_partnet_plans()
+    for plan in plans.values():
+        for obj in plan['obj'].values():
+            pid = obj['id']
+            key = cache.make_key(dict(obj), [scene_loader.partnet_mesh_file(pid), scene_loader.partnet_pcd_file(pid),
+                                             scene_loader.PARTNET_ALIGNMENT_FILE])
+            arrays = cached_geometry((40, 3), rng)
+            arrays['pcd'] = rng.random((300, 3)).astype(np.float32)
+            arrays['min_mesh'] = arrays['vertices'].min(0)
+            cache.save(key, arrays)
+    return plans, cache
+
+@pytest.fixture
+def cached_scannet_plans(tmp_path, monkeypatch):
+    """ ScanNet plans with cached meshes and raw segmentation files, runs without open3d """
+    monkeypatch.chdir(tmp_path)
+    rng = np.random.default_rng(3)
+    os.makedirs(scene_loader.SCANNET_ROOT)
+    cache = SceneCache(str(tmp_path / 'cache'))
+    plans = make_scannet_plans()
+    for scene_id in ('0001_00', '0002_00'):
+        write_scannet_segments(scene_id, 200, rng)
+    for plan in plans.values():
+        entry = {'scene_id': plan['scene_id'], 'rotate': plan['rotate'], 'scale': plan['scale'], 'transfer': plan['transfer']}
+        cache.save(cache.make_key(entry, [scene_loader.scannet_mesh_file(plan['scene_id'])]), cached_geometry((200, 3), rng))
+    return plans, cache
+
+def assert_same(expected, actual, path='assets'):
+    if isinstance(expected, dict):
+        assert list(expected) == list(actual), path
+        for key in expected:
+            assert_same(expected[key], actual[key], '{}[{!r}]'.format(path, key))
+    elif isinstance(expected, (list, tuple)):
+        assert len(expected) == len(actual), path
+        for i, (e, a) in enumerate(zip(expected, actual)):
+            assert_same(e, a, '{}[{}]'.format(path, i))
+    elif isinstance(expected, np.ndarray) or isinstance(actual, np.ndarray):
+        expected, actual = np.asarray(expected), np.asarray(actual)
+        assert expected.dtype == actual.dtype and np.array_equal(expected, actual), path
+    else:
+        assert expected == actual, path
+
+
+def test_cached_partnet_pool_matches_serial(cached_partnet_plans):
+    plans, cache = cached_partnet_plans
+    serial = scene_loader.ingest_partnet_plans(plans, cache, num_workers=0)
+    pooled = scene_loader.ingest_partnet_plans(plans, cache, num_workers=2)
+    assert list(serial) == list(plans)
+    assert_same(serial, pooled)
+    # the shared placement is served by one transform
+    assert serial['plan_0']['min_mesh']['000'] == serial['plan_1']['min_mesh']['001']
+
+
+def test_cached_scannet_pool_matches_serial(cached_scannet_plans):
+    plans, cache = cached_scannet_plans
+    serial = scene_loader.ingest_scannet_plans(plans, cache, num_workers=0)
+    pooled = scene_loader.ingest_scannet_plans(plans, cache, num_workers=2)
+    assert list(serial) == list(plans)
+    assert_same(serial, pooled)
+    assert serial['plan_0']['labels']['chair000'] == {'seat': [0, 3], 'back': [5]}
+
+
+def test_partnet_pool_matches_serial(partnet_plans):
+    serial = scene_loader.ingest_partnet_plans(partnet_plans, num_workers=0)
+    pooled = scene_loader.ingest_partnet_plans(partnet_plans, num_workers=2)
+    assert list(serial) == list(partnet_plans)
+    assert_same(serial, pooled)
+
+
+def test_partnet_shared_placement_is_transformed_once(partnet_plans):
+    registry = AssetRegistry()
+    assets = scene_loader.ingest_partnet_plans(partnet_plans, registry=registry)
+    # '2001' is read once for its two placements, the shared placement is not transformed again
+    assert registry.counts()['misses'] == 3 * len(PARTNET_IDS)
+    plan_0, plan_1 = assets['plan_0'], assets['plan_1']
+    assert plan_0['min_mesh']['000'] == plan_1['min_mesh']['001']
+
+
+def test_partnet_cache_matches_fresh_load(partnet_plans, tmp_path):
+    cache = SceneCache(str(tmp_path / 'cache'))
+    fresh = scene_loader.ingest_partnet_plans(partnet_plans)
+    cold = scene_loader.ingest_partnet_plans(partnet_plans, cache=cache, num_workers=2)
+    warm = scene_loader.ingest_partnet_plans(partnet_plans, cache=cache)
+    assert_same(fresh, cold)
+    assert_same(fresh, warm)
+
+
+def test_scannet_pool_matches_serial(scannet_plans):
+    serial = scene_loader.ingest_scannet_plans(scannet_plans, num_workers=0)
+    pooled = scene_loader.ingest_scannet_plans(scannet_plans, num_workers=2)
+    assert list(serial) == list(scannet_plans)
+    assert_same(serial, pooled)
+    assert serial['plan_0']['labels']['chair000'] == {'seat': [0, 3], 'back': [5]}
+
+
+@pytest.fixture
+def scannet_segments(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(scene_loader.SCANNET_ROOT)
+    rng = np.random.default_rng(4)
+    # segment ids are sparse and unordered like the ScanNet over-segmentation
+    seg_indices = rng.choice([3, 17, 4, 250, 1000, 41], 500)
+    with open(scene_loader.scannet_segs_file('0003_00'), 'w') as f:
+        json.dump({'segIndices': seg_indices.tolist()}, f)
+    with open(scene_loader.scannet_aggregation_file('0003_00'), 'w') as f:
+        json.dump({'segGroups': [{'segments': [17, 3]}, {'segments': [250, 4, 41]}, {'segments': []}]}, f)
+    return seg_indices
+
+
+def test_segment_index_matches_per_segment_masks(scannet_segments):
+    segments = scene_loader.load_scannet_segments('0003_00')
+    assert segments['seg_indices'].dtype == np.int32
+    assert np.array_equal(segments['seg_indices'], scannet_segments)
+    for seg in (3, 1000, [17, 4], [41, 3, 250], [999], [], [5, 17]):
+        # the mask the per-segment comparison built
+        mask = np.zeros(len(scannet_segments), dtype=bool)
+        for s in np.atleast_1d(seg):
+            mask[scannet_segments == s] = True
+        assert np.array_equal(scene_loader.scannet_segment_vertices(segments, seg), np.nonzero(mask)[0]), seg
+
+
+def test_label_mapping_reads_the_group_segments(scannet_segments):
+    segments = scene_loader.load_scannet_segments('0003_00')
+    assert scene_loader.scannet_label_mapping(segments, '1', {'top': [0, 2], 'leg': [1]}) == {'top': [250, 41], 'leg': [4]}
+    assert scene_loader.scannet_label_mapping(segments, '0', {'seat': [1]}) == {'seat': [3]}
+
+
+def test_segments_are_parsed_once_and_cached(scannet_segments, tmp_path):
+    cache = SceneCache(str(tmp_path / 'cache'))
+    registry = AssetRegistry()
+    cold = scene_loader.load_scannet_segments('0003_00', cache, registry)
+    assert scene_loader.load_scannet_segments('0003_00', cache, registry) is cold
+    assert registry.counts()['misses'] == 1 and registry.counts()['hits'] == 1
+    # a fresh process reads the cached arrays
+    warm = scene_loader.load_scannet_segments('0003_00', cache, AssetRegistry())
+    assert_same(dict(cold), dict(warm))
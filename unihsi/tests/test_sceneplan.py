@@ -0,0 +1,81 @@
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+from conftest import REPO_DIR
+from utils.sceneplan import MANIFEST_FILE, convert_sceneplan, SceneplanIndex, materialize_scene_plans
+
+
+def make_library(num_plans=10):
+    library = OrderedDict()
+    for i in range(num_plans):
+        # ids out of sort order, nested objects and non-ascii names
+        library['{:03d}'.format((i * 7) % num_plans)] = {
+            'obj': {'000': {'id': str(1000 + i), 'name': 'chäir', 'rotate': [[1.5708, 0, 0]], 'scale': 1.0 + i / 10,
+                            'transfer': [i, 0, 0]}},
+            'chain_of_contacts': [[['chair000', 'seat', 'contact', 'pelvis', 'none']]] * (i % 3 + 1),
+        }
+    return library
+
+@pytest.fixture
+def library_files(tmp_path):
+    library = make_library()
+    sceneplan_file = str(tmp_path / 'library.json')
+    with open(sceneplan_file, 'w') as f:
+        json.dump(library, f)
+    shard_dir = str(tmp_path / 'library')
+    convert_sceneplan(sceneplan_file, shard_dir, plans_per_shard=3)
+    return library, sceneplan_file, shard_dir
+
+
+def test_sharded_library_round_trips(library_files):
+    library, sceneplan_file, shard_dir = library_files
+    shards = sorted(f for f in os.listdir(shard_dir) if f.endswith('.jsonl'))
+    assert len(shards) == 4 and MANIFEST_FILE in os.listdir(shard_dir)
+
+    index = SceneplanIndex(shard_dir)
+    assert index.plan_ids == list(library) and len(index) == len(library)
+    assert index.plans is None
+    assert index.load(index.plan_ids) == library
+    # single plans and any order, across shards
+    picked = [index.plan_ids[i] for i in (9, 0, 4, 3)]
+    assert list(index.load(picked).items()) == [(plan_id, library[plan_id]) for plan_id in picked]
+
+
+def test_sharded_and_json_libraries_materialize_the_same(library_files):
+    library, sceneplan_file, shard_dir = library_files
+    scene_idx = np.array([[7, 2, 7], [9, 0, 2]])
+    sharded_items, sharded_idx = materialize_scene_plans(SceneplanIndex(shard_dir), scene_idx)
+    json_items, json_idx = materialize_scene_plans(SceneplanIndex(sceneplan_file), scene_idx)
+
+    plan_ids = list(library)
+    assert list(sharded_items) == [plan_ids[i] for i in (0, 2, 7, 9)]
+    assert sharded_items == json_items
+    assert np.array_equal(sharded_idx, json_idx)
+    assert np.array_equal(sharded_idx, np.array([[2, 1, 2], [3, 0, 1]]))
+    # the compact indices point at the plans of the tiles
+    for library_idx, plan_idx in zip(scene_idx.reshape(-1), sharded_idx.reshape(-1)):
+        assert list(sharded_items)[plan_idx] == plan_ids[library_idx]
+
+
+def test_directory_without_sharded_manifest_is_rejected(tmp_path):
+    with open(str(tmp_path / MANIFEST_FILE), 'w') as f:
+        json.dump({'format': 'other', 'plans': []}, f)
+    with pytest.raises(ValueError):
+        SceneplanIndex(str(tmp_path))
+
+
+@pytest.mark.parametrize('name', ['partnet_test_simple.json', 'scannet_test.json'])
+def test_shipped_sceneplans_round_trip(tmp_path, name):
+    sceneplan_file = os.path.join(REPO_DIR, 'sceneplan', name)
+    if not os.path.exists(sceneplan_file):
+        pytest.skip('{} is not in the tree'.format(name))
+    convert_sceneplan(sceneplan_file, str(tmp_path / 'shards'), plans_per_shard=7)
+    with open(sceneplan_file) as f:
+        expected = json.load(f, object_pairs_hook=OrderedDict)
+    index = SceneplanIndex(str(tmp_path / 'shards'))
+    assert index.load(index.plan_ids) == expected
+    assert list(index.load(index.plan_ids)) == list(expected)
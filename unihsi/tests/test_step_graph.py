@@ -0,0 +1,124 @@
+import pytest
+import torch
+
+from utils.step_graph import StepGraph
+
+
+class ToyTask(object):
+    """ Step and reset shaped like the humanoid tasks: the step reads actions
+    rebound every step and buffers updated in place, the reset path writes the
+    reset envs in place and rebinds per-reset bookkeeping of varying size """
+
+    def __init__(self, num_envs=16, stale_read=False):
+        self.num_envs = num_envs
+        self.stale_read = stale_read
+        self.state = torch.zeros(num_envs, 3)
+        self.actions = torch.zeros(num_envs, 3)
+        self.obs_buf = torch.zeros(num_envs, 3)
+        self.rew_buf = torch.zeros(num_envs)
+        self.still = torch.zeros(num_envs, dtype=torch.bool)
+        self._reset_env_ids = torch.zeros(0, dtype=torch.long)
+
+    def compute(self):
+        self.obs_buf[:] = self.state * 2 + self.still[:, None].float()
+        self.rew_buf = torch.exp(-self.obs_buf.square().sum(-1)) + self.actions.sum(-1)
+        still = self.rew_buf > 1.0
+        if self.stale_read:
+            self.still = still
+        else:
+            self.still[:] = still
+
+    def pre_step(self, actions):
+        self.actions = actions.clone()
+        self.state += 0.1 * self.actions
+
+    def reset(self, env_ids):
+        self._reset_env_ids = env_ids
+        self.state[env_ids] = 0
+        self.still[env_ids] = False
+
+
+def run_toy(steps, capture, stale_read=False, warmup=2, num_envs=16, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    task = ToyTask(num_envs, stale_read)
+    graph = StepGraph(task, task.compute, ['actions'], warmup, capture)
+    outputs = []
+    for i in range(steps):
+        task.pre_step(torch.rand(num_envs, 3, generator=generator) * 2 - 1)
+        graph()
+        outputs.append((task.obs_buf.clone(), task.rew_buf.clone(), task.still.clone()))
+        # a different number of envs resets after every step
+        num_reset = (i * 5) % num_envs
+        task.reset(torch.randperm(num_envs, generator=generator)[:num_reset])
+    return outputs, graph
+
+
+def assert_outputs_equal(expected, actual):
+    for step, (e, a) in enumerate(zip(expected, actual)):
+        for i, (e_t, a_t) in enumerate(zip(e, a)):
+            assert torch.equal(e_t, a_t), 'step {} output {} differs'.format(step, i)
+
+
+def test_replays_through_resets_of_different_sizes():
+    steps, warmup = 20, 2
+    eager, _ = run_toy(steps, False, warmup=warmup)
+    captured, graph = run_toy(steps, True, warmup=warmup)
+    assert_outputs_equal(eager, captured)
+    # warm-up, one capture, then every step replays despite the varying resets
+    assert graph.replays == steps - warmup - 1
+
+
+def test_input_shape_change_recaptures():
+    task = ToyTask(4)
+    graph = StepGraph(task, task.compute, ['actions'], warmup=1)
+    for _ in range(4):
+        task.pre_step(torch.ones(4, 3))
+        graph()
+    assert graph.replays == 2
+
+    # the call with the new shape runs eagerly as the warm-up of the next capture
+    task.actions = torch.ones(4, 2)
+    graph()
+    assert graph.replays == 2
+    task.actions = torch.ones(4, 3)
+    graph()
+    assert graph.replays == 2
+    graph()
+    assert graph.replays == 3
+
+
+def test_stale_read_differs_from_eager():
+    # still is read before it is rebound, a graph keeps reading the captured tensor
+    eager, _ = run_toy(20, False, stale_read=True)
+    captured, graph = run_toy(20, True, stale_read=True)
+    assert graph.replays > 0
+    assert any(not torch.equal(e[0], c[0]) for e, c in zip(eager, captured))
+
+
+def test_disabled_runs_eagerly():
+    _, graph = run_toy(10, False)
+    assert graph.replays == 0 and graph.calls == 10
+
+
+def _task_outputs(task):
+    return (task.obs_buf.clone(), task.rew_buf.clone(), task.reset_buf.clone(), task._terminate_buf.clone(),
+            task.extras['amp_obs'].clone())
+
+@pytest.mark.parametrize('task_name', ['UniHSI_PartNet', 'UniHSI_ScanNet'])
+def test_captured_task_step_matches_eager(make_task, task_name):
+    steps, warmup = 30, 3
+    tasks = [make_task(task_name, seed=0), make_task(task_name, seed=0, captureStep=True, captureWarmup=warmup)]
+    actions = torch.Generator().manual_seed(0)
+    for task in tasks:
+        task.reset()
+
+    for i in range(steps):
+        action = torch.rand(tasks[0].num_envs, tasks[0].num_actions, generator=actions) * 2 - 1
+        outputs = []
+        for task in tasks:
+            task.step(action)
+            outputs.append(_task_outputs(task))
+            task.reset(task.reset_buf.nonzero(as_tuple=False).squeeze(-1))
+        for j, (e, c) in enumerate(zip(*outputs)):
+            assert torch.equal(e, c), 'step {} output {} differs'.format(i, j)
+    assert tasks[1]._step_graph.replays == steps - warmup - 1
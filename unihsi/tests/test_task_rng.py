@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+import torch
+
+from utils.pointcloud import batched_farthest_point_sample
+from utils.task_rng import task_generator, rand, randint
+
+# per-env tables refreshed by _reset_target
+RESET_STATE_KEYS = ['_humanoid_root_states', 'step_mode', 'stand_point_choice', 'stand_point', 'contact_type',
+                    'contact_valid', 'contact_direction', 'envs_obj_pcd_buffer']
+
+
+def draw_reset_samples(generator, num_envs, env_ids=None):
+    # the draws of one _reset_target call, in its order, drawn for every env and kept for env_ids
+    env_ids = torch.arange(num_envs) if env_ids is None else env_ids
+    return [rand(generator, num_envs)[env_ids], rand(generator, num_envs)[env_ids], rand(generator, num_envs)[env_ids],
+            randint(generator, 2, num_envs)[env_ids] * 2 - 1, randint(generator, 2, num_envs)[env_ids] * 2 - 1,
+            randint(generator, 4, num_envs)[env_ids]]
+
+
+def test_same_seed_draws_identical_samples():
+    runs = []
+    for _ in range(2):
+        generator = task_generator('cpu', 7)
+        runs.append([draw_reset_samples(generator, 16, torch.arange(n)) for n in (16, 3, 0, 9)])
+    for reset_a, reset_b in zip(*runs):
+        for a, b in zip(reset_a, reset_b):
+            assert torch.equal(a, b)
+
+    other = draw_reset_samples(task_generator('cpu', 8), 16)
+    assert not torch.equal(runs[0][0][0], other[0])
+
+
+def test_reset_samples_do_not_depend_on_the_reset_envs():
+    # an env gets the samples of a full reset whichever other envs reset with it,
+    # and the stream advances by num_envs per reset like the full-size draws
+    full_resets = task_generator('cpu', 7)
+    full = [draw_reset_samples(full_resets, 16) for _ in range(3)]
+    generator = task_generator('cpu', 7)
+    for env_ids, samples in zip([torch.tensor([2, 5]), torch.tensor([], dtype=torch.long), torch.arange(16)], full):
+        for a, b in zip(draw_reset_samples(generator, 16, env_ids), samples):
+            assert torch.equal(a, b[env_ids])
+
+
+def test_global_draws_leave_reset_samples_unchanged():
+    # torch.rand / np.random calls elsewhere in the step must not shift the reset samples
+    expected = draw_reset_samples(task_generator('cpu', 7), 16)
+    generator = task_generator('cpu', 7)
+    torch.rand(100)
+    np.random.rand(100)
+    for a, b in zip(draw_reset_samples(generator, 16), expected):
+        assert torch.equal(a, b)
+
+
+def test_generator_follows_global_seed():
+    torch.manual_seed(3)
+    a = rand(task_generator('cpu'), 8)
+    torch.manual_seed(3)
+    b = rand(task_generator('cpu'), 8)
+    assert torch.equal(a, b)
+
+
+def test_sign_and_choice_ranges():
+    samples = draw_reset_samples(task_generator('cpu', 0), 4096)
+    assert set(samples[3].tolist()) == {-1, 1}
+    assert set(samples[5].tolist()) == {0, 1, 2, 3}
+    assert samples[3].dtype == torch.long and samples[5].dtype == torch.long
+
+
+def test_part_sampling_reproducible():
+    points = torch.Generator().manual_seed(0)
+    part_pcds = [torch.rand(n, 3, generator=points) for n in (50, 300, 120, 7)]
+    a = batched_farthest_point_sample(part_pcds, 20, task_generator('cpu', 5))
+    b = batched_farthest_point_sample(part_pcds, 20, task_generator('cpu', 5), max_chunk_points=200)
+    assert torch.equal(a, b)
+
+
+def reset_state(task):
+    return {key: getattr(task, key).clone() for key in RESET_STATE_KEYS if getattr(task, key, None) is not None}
+
+def run_resets(make_task, task_name, seed, num_resets=10, **env):
+    # full reset, then resets of the same random env subsets
+    task = make_task(task_name, seed=seed, **env)
+    subsets = torch.Generator().manual_seed(seed)
+    task.reset()
+    for _ in range(num_resets):
+        env_ids = torch.randperm(task.num_envs, generator=subsets)[:max(1, task.num_envs // 4)]
+        task.reset(env_ids.sort()[0].to(task.device))
+    return reset_state(task)
+
+@pytest.mark.parametrize('task_name', ['UniHSI_PartNet', 'UniHSI_ScanNet'])
+def test_same_seed_gives_identical_reset_states(make_task, task_name):
+    states = [run_resets(make_task, task_name, seed=11) for _ in range(2)]
+    assert '_humanoid_root_states' in states[0] and 'envs_obj_pcd_buffer' in states[0]
+    for key in states[0]:
+        assert torch.equal(states[0][key], states[1][key]), '{} differs'.format(key)
+
+
+@pytest.mark.parametrize('task_name', ['UniHSI_PartNet', 'UniHSI_ScanNet'])
+def test_task_seed_changes_reset_states(make_task, task_name):
+    a = run_resets(make_task, task_name, seed=11)
+    b = run_resets(make_task, task_name, seed=11, taskSeed=12)
+    assert not torch.equal(a['_humanoid_root_states'], b['_humanoid_root_states'])
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from utils.terrain import build_terrain_meshes, add_terrain_meshes, z_rotation
+
+
+class TriangleMeshParams(object):
+    """ Stand-in for gymapi.TriangleMeshParams """
+
+    def __init__(self):
+        self.nb_vertices = 0
+        self.nb_triangles = 0
+
+class TriangleMeshRecorder(object):
+    """ Stand-in for the gym add_triangle_mesh call that keeps the uploaded geometry """
+
+    def __init__(self):
+        self.meshes = []
+
+    def add_triangle_mesh(self, sim, vertices, triangles, tm_params):
+        vertices = np.array(vertices).reshape(-1, 3)
+        triangles = np.array(triangles).reshape(-1, 3)
+        assert vertices.shape[0] == tm_params.nb_vertices
+        assert triangles.shape[0] == tm_params.nb_triangles
+        assert triangles.max() < vertices.shape[0]
+        self.meshes.append((vertices, triangles))
+
+    def triangle_soup(self):
+        # corner positions of every triangle, sorted so the mesh layout does not matter
+        soup = np.concatenate([v[t].reshape(-1, 9) for v, t in self.meshes], axis=0)
+        return soup[np.lexsort(soup.T[::-1])]
+
+
+def add_tiles_loop(gym, vertices_list, triangles_list, scene_idx, offsets, rotate=None):
+    """ The per-tile upload build_terrain_meshes replaced, rotate holds the PartNet z rotation of every tile """
+    for i in range(scene_idx.shape[0]):
+        for j in range(scene_idx.shape[1]):
+            mesh_vertices = vertices_list[scene_idx[i, j]]
+            mesh_triangles = triangles_list[scene_idx[i, j]]
+            mesh_vertices_offset = mesh_vertices.copy()
+            if rotate is not None:
+                mesh_vertices_offset = np.dot(mesh_vertices_offset, z_rotation(rotate[i, j])).astype(np.float32)
+            mesh_vertices_offset[:, 0] += offsets[i, j, 0]
+            mesh_vertices_offset[:, 1] += offsets[i, j, 1]
+            mesh_vertices_offset[:, 2] += offsets[i, j, 2]
+
+            tm_params = TriangleMeshParams()
+            tm_params.nb_vertices = mesh_vertices_offset.shape[0]
+            tm_params.nb_triangles = mesh_triangles.shape[0]
+            gym.add_triangle_mesh(None, mesh_vertices_offset.flatten(order='C'), mesh_triangles.flatten(order='C'), tm_params)
+
+def random_scene(rows=3, cols=4, num_plans=3, rotated=True, seed=0):
+    rng = np.random.default_rng(seed)
+    vertices_list = [(rng.random((n, 3)) * 2).astype(np.float32) for n in (8, 30, 17)[:num_plans]]
+    triangles_list = [rng.integers(0, len(v), (2 * len(v), 3)).astype(np.uint32) for v in vertices_list]
+    scene_idx = rng.integers(0, num_plans, (rows, cols))
+    if rotated:
+        # PartNet: float64 spacing plus random tile offsets and z rotations
+        offsets = np.stack([10.0 * np.arange(rows)[:, None] + rng.random((rows, cols)),
+                            10.0 * np.arange(cols)[None] + rng.random((rows, cols)),
+                            rng.random((rows, cols)) * 0.1], axis=-1)
+        rotate = rng.random((rows, cols)) * 360
+    else:
+        # ScanNet: float32 spacing only, as the task passes it
+        offsets = np.stack(np.broadcast_arrays((10.0 * np.arange(rows)[:, None]).astype(np.float32),
+                                               (10.0 * np.arange(cols)[None]).astype(np.float32), np.float32(0)), axis=-1)
+        rotate = None
+    return vertices_list, triangles_list, scene_idx, offsets, rotate
+
+
+@pytest.mark.parametrize('rotated', [True, False])
+@pytest.mark.parametrize('num_groups', [0, 1, 5, 100])
+def test_merged_terrain_matches_per_tile_upload(rotated, num_groups):
+    vertices_list, triangles_list, scene_idx, offsets, rotate = random_scene(rotated=rotated)
+    expected = TriangleMeshRecorder()
+    add_tiles_loop(expected, vertices_list, triangles_list, scene_idx, offsets, rotate)
+
+    rotations = None
+    if rotate is not None:
+        rotations = np.array([[z_rotation(r) for r in row] for row in rotate])
+    actual = TriangleMeshRecorder()
+    meshes = build_terrain_meshes(vertices_list, triangles_list, scene_idx, offsets, rotations, num_groups)
+    num_meshes, num_vertices, num_triangles = add_terrain_meshes(actual, None, meshes, TriangleMeshParams)
+
+    num_tiles = scene_idx.size
+    assert num_meshes == (min(num_groups, num_tiles) if num_groups > 0 else num_tiles)
+    assert num_vertices == sum(len(v) for v, _ in expected.meshes)
+    assert num_triangles == sum(len(t) for _, t in expected.meshes)
+    assert all(v.dtype == np.float32 for v, _ in actual.meshes)
+    assert np.array_equal(actual.triangle_soup(), expected.triangle_soup())
+    if num_groups == 0:
+        # one mesh per tile in the same order
+        for (ev, et), (av, at) in zip(expected.meshes, actual.meshes):
+            assert np.array_equal(ev, av) and np.array_equal(et, at)
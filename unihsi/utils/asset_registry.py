@@ -0,0 +1,68 @@
+from collections import OrderedDict
+
+import numpy as np
+
+
+def _nbytes(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(_nbytes(k) + _nbytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(v) for v in value)
+    if isinstance(value, str):
+        return len(value)
+    return 8
+
+class AssetRegistry(object):
+    """ Per-process registry of raw, untransformed scene assets
+
+    Assets are keyed by e.g. ('partnet_mesh', pid) and loaded on first use.
+    Entries are evicted least recently used first once the registry holds more
+    than max_bytes, the most recent entry is always kept. Callers must treat the
+    returned values as read-only and copy before transforming.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.entry_bytes = dict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, loader):
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        self.misses += 1
+        value = loader()
+        self.entries[key] = value
+        self.entry_bytes[key] = _nbytes(value)
+        self.total_bytes += self.entry_bytes[key]
+        self._evict()
+        return value
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            key, _ = self.entries.popitem(last=False)
+            self.total_bytes -= self.entry_bytes.pop(key)
+            self.evictions += 1
+
+    def counts(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    def add_counts(self, counts):
+        # merge counters reported by worker processes
+        self.hits += counts['hits']
+        self.misses += counts['misses']
+        self.evictions += counts['evictions']
+
+    def report(self):
+        print("asset registry: {} hits, {} misses, {} evictions, {} entries, {:.1f} MB".format(
+            self.hits, self.misses, self.evictions, len(self.entries), self.total_bytes / 2**20))
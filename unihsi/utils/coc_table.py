@@ -0,0 +1,36 @@
+import torch
+
+# Packed CoC (chain of contacts) storage.
+#
+# Every (plan, step) pair that exists in the sceneplan owns one row of the step
+# tables, row 0 is an all-zero sentinel returned for steps past the end of a
+# plan. Contact part pointclouds are packed in a separate table indexed by
+# part_slot[row, joint], slot 0 is again an all-zero sentinel. Memory therefore
+# scales with the steps and contacts that exist instead of plans x 30 x 15.
+
+
+def build_step_offsets(step_numbers):
+    """ Compute the first row of every plan in the packed step tables
+
+    Args:
+        step_numbers: number of CoC steps of every plan
+
+    Return:
+        Return the row offset of every plan and the total number of rows
+    """
+    steps = torch.as_tensor(step_numbers, dtype=torch.long)
+    offsets = torch.cumsum(steps, 0) - steps + 1
+    return offsets, int(steps.sum()) + 1
+
+def step_rows(step_offsets, max_steps, plan_ids, step_ids):
+    """ Map (plan, step) pairs to rows of the packed step tables """
+    rows = step_offsets[plan_ids] + step_ids
+    valid = (step_ids >= 0) & (step_ids < max_steps[plan_ids])
+    return torch.where(valid, rows, torch.zeros_like(rows))
+
+def gather_part_pcds(part_pcds, part_slot, rows):
+    """ Gather the contact part pointclouds of every joint, [len(rows), joints, points, 3] """
+    return part_pcds[part_slot[rows]]
+
+def table_nbytes(*tensors):
+    return sum(t.element_size() * t.nelement() for t in tensors)
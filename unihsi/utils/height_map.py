@@ -0,0 +1,197 @@
+import numpy as np
+import torch
+
+# nearest-cell lookups of the local height observation, see sample_height_map
+HEIGHT_LOOKUPS = ['brute', 'grid', 'texture']
+
+def _height_map_grid(minx, miny, maxx, maxy, HEIGHT_MAP_DIM):
+    x = np.linspace(minx, maxx, HEIGHT_MAP_DIM)
+    y = np.linspace(miny, maxy, HEIGHT_MAP_DIM)
+    xx, yy = np.meshgrid(x, y)
+    pos2d = np.concatenate([xx[..., None], yy[..., None]], axis=-1)
+    return pos2d.reshape(-1, 2)
+
+def _scatter_heights(points, plan_ids, minx, miny, interval_x, interval_y, num_plans, HEIGHT_MAP_DIM, height_cutoff):
+    # per-point min / interval are gathered so every plan keeps its own float32 arithmetic
+    voxel_idx_x = (points[:, 0]-minx[plan_ids]) // interval_x[plan_ids]
+    voxel_idx_y = (points[:, 1]-miny[plan_ids]) // interval_y[plan_ids]
+    heights = points[:, 2]
+    if height_cutoff is not None:
+        heights = np.where(heights < height_cutoff, heights, 0.0).astype(points.dtype)
+
+    # points on the max boundary fall outside the grid, as in the per-cell loop
+    valid = (voxel_idx_x >= 0) & (voxel_idx_x < HEIGHT_MAP_DIM) & (voxel_idx_y >= 0) & (voxel_idx_y < HEIGHT_MAP_DIM)
+    cell = (plan_ids[valid] * HEIGHT_MAP_DIM + voxel_idx_y[valid].astype(np.int64)) * HEIGHT_MAP_DIM + voxel_idx_x[valid].astype(np.int64)
+
+    height_map2d = np.full(num_plans * HEIGHT_MAP_DIM * HEIGHT_MAP_DIM, -np.inf)
+    np.maximum.at(height_map2d, cell, heights[valid])
+    height_map2d[np.isinf(height_map2d)] = 0.0
+    return height_map2d.reshape(num_plans, HEIGHT_MAP_DIM * HEIGHT_MAP_DIM)
+
+def get_height_map(points: np.ndarray, HEIGHT_MAP_DIM: int=16, height_cutoff=None, clamp_negative=False):
+    """ Build the floor height map of a scene in a single scatter-max pass
+
+    Args:
+        points: scene point cloud
+        HEIGHT_MAP_DIM: height map dimension
+        height_cutoff: heights at or above it are treated as 0 (ScanNet ceilings)
+        clamp_negative: clamp negative cell heights to 0
+
+    Return:
+        Return the floor height map and axis-aligned scene bounding box
+    """
+    return get_height_maps([points], HEIGHT_MAP_DIM, height_cutoff, clamp_negative)[0]
+
+def get_height_maps(points_list, HEIGHT_MAP_DIM: int=16, height_cutoff=None, clamp_negative=False):
+    """ Build the height maps of several scenes in one call
+
+    Args:
+        points_list: list of scene point clouds
+        HEIGHT_MAP_DIM: height map dimension
+        height_cutoff: see get_height_map
+        clamp_negative: see get_height_map
+
+    Return:
+        Return the stacked height maps, [num_scenes, HEIGHT_MAP_DIM*HEIGHT_MAP_DIM, 3]
+    """
+    num_plans = len(points_list)
+    minx = np.stack([p[:, 0].min() for p in points_list])
+    miny = np.stack([p[:, 1].min() for p in points_list])
+    maxx = np.stack([p[:, 0].max() for p in points_list])
+    maxy = np.stack([p[:, 1].max() for p in points_list])
+    interval_x = (maxx-minx)/HEIGHT_MAP_DIM
+    interval_y = (maxy-miny)/HEIGHT_MAP_DIM
+
+    points = np.concatenate(points_list, axis=0)
+    plan_ids = np.repeat(np.arange(num_plans), [len(p) for p in points_list])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        height_map2d = _scatter_heights(points, plan_ids, minx, miny, interval_x, interval_y,
+                                        num_plans, HEIGHT_MAP_DIM, height_cutoff)
+
+    height_pcds = []
+    for i in range(num_plans):
+        pos2d = _height_map_grid(minx[i], miny[i], maxx[i], maxy[i], HEIGHT_MAP_DIM)
+        height_pcds.append(np.concatenate([pos2d, height_map2d[i].reshape(-1,1)], axis=-1))
+    height_pcds = np.stack(height_pcds, 0)
+
+    if clamp_negative:
+        height_pcds[..., 2] = np.maximum(height_pcds[..., 2], 0)
+
+    return height_pcds
+
+#####################################################################
+###=====================local height sampling=====================###
+#####################################################################
+
+def sample_height_map_brute(height_map_pcd, query_xy, valid_sq_dist: float=0.05):
+    """ Height of the nearest height map cell of every query point, by exhaustive search
+
+    Args:
+        height_map_pcd: per-env height maps, [num_envs, H*W, 3]
+        query_xy: query positions in the height map frame, [num_envs, Q, 2]
+        valid_sq_dist: queries whose squared distance to the nearest cell is not
+            below it get height 0
+
+    Return:
+        Return the heights, [num_envs, Q], in the dtype of height_map_pcd. The
+        distances to all cells are formed in that dtype and summed in fp32
+    """
+    dist = query_xy.to(height_map_pcd.dtype)[:, None] - height_map_pcd[..., :2][:, :, None]
+    sum_dist = torch.sum(dist * dist, dim=-1, dtype=torch.float32)
+    shape = sum_dist.shape
+    sum_dist = sum_dist.permute(1,0,2).reshape(shape[1], -1)
+    dist_min, min_idx = sum_dist.min(0)
+    valid_mask = dist_min < valid_sq_dist
+    height_map = height_map_pcd.reshape(-1, 3)[min_idx, 2]
+    height_map = torch.where(valid_mask, height_map, torch.zeros_like(height_map))
+    return height_map.reshape(shape[0], shape[2])
+
+def sample_height_map_grid(height_map_pcd, query_xy, valid_sq_dist: float=0.05):
+    """ Same as sample_height_map_brute with an O(1) lookup per query point
+
+    The height maps must be regular grids as built by get_height_maps, possibly
+    translated and rotated about z. The grid axes of every env are read from its
+    corner cells, the query is projected onto them and rounded to the nearest
+    cell. Results only differ from the exhaustive search for queries equidistant
+    to several cells. The projection is computed in fp32 for reduced precision maps.
+    """
+    dim = int(round(height_map_pcd.shape[1] ** 0.5))
+    steps = max(dim - 1, 1)
+    origin = height_map_pcd[:, 0, :2].float()
+    axis_x = (height_map_pcd[:, dim - 1, :2].float() - origin) / steps
+    axis_y = (height_map_pcd[:, dim * (dim - 1), :2].float() - origin) / steps
+
+    rel = query_xy - origin[:, None]
+    cell_idx = []
+    for axis in (axis_x, axis_y):
+        # a flat scene has a zero-length axis, every cell along it is equally near
+        sq_len = torch.sum(axis * axis, dim=-1, keepdim=True)
+        proj = torch.sum(rel * axis[:, None], dim=-1) / torch.where(sq_len > 0, sq_len, torch.ones_like(sq_len))
+        cell_idx.append(torch.round(proj).clamp(0, dim - 1).long())
+    idx = cell_idx[1] * dim + cell_idx[0]
+
+    cell_xy = torch.gather(height_map_pcd[..., :2], 1, idx[..., None].expand(-1, -1, 2))
+    dist = query_xy - cell_xy
+    sum_dist = torch.sum(dist * dist, dim=-1)
+    # the exhaustive search reads heights through the flat [num_envs*H*W] view with
+    # the per-env cell index, i.e. from the first env's map, keep that behaviour
+    height_map = height_map_pcd.reshape(-1, 3)[idx, 2]
+    return torch.where(sum_dist < valid_sq_dist, height_map, torch.zeros_like(height_map))
+
+def build_height_textures(height_map_pcd):
+    """ Lookup textures of regular height maps for sample_height_map_texture
+
+    Built once per env from its (static) height map. Every texel holds the x, y
+    and flat index of its cell, so a single grid_sample returns the nearest cell
+    of any number of queries.
+
+    Args:
+        height_map_pcd: per-env height maps as built by get_height_maps, possibly
+            translated and rotated about z, [num_envs, H*W, 3]
+
+    Return:
+        Return the textures, [num_envs, 3, H, W], and the frames mapping height map
+        positions to grid_sample coordinates, [num_envs, 3, 2]: the first cell and
+        the x and y axes scaled to the [-1, 1] range
+    """
+    num_envs, num_cells = height_map_pcd.shape[:2]
+    dim = int(round(num_cells ** 0.5))
+    cells = height_map_pcd[..., :2].float()
+    cell_idx = torch.arange(num_cells, device=cells.device, dtype=cells.dtype)
+    textures = torch.cat([cells, cell_idx[None, :, None].expand(num_envs, -1, -1)], -1)
+    textures = textures.permute(0, 2, 1).reshape(num_envs, 3, dim, dim).contiguous()
+
+    origin = cells[:, 0]
+    frames = [origin]
+    for corner in (dim - 1, dim * (dim - 1)):
+        axis = cells[:, corner] - origin
+        # a flat scene has a zero-length axis, every query maps to its first cell
+        sq_len = torch.sum(axis * axis, dim=-1, keepdim=True)
+        frames.append(axis * 2 / torch.where(sq_len > 0, sq_len, torch.ones_like(sq_len)))
+    return textures, torch.stack(frames, 1)
+
+def sample_height_map_texture(height_map_pcd, height_texture, height_frame, query_xy, valid_sq_dist: float=0.05):
+    """ Same as sample_height_map_grid with one batched grid_sample for all queries
+
+    The nearest cell is fetched from the textures of build_height_textures, its
+    cost does not depend on the height map size. Results only differ from the
+    exhaustive search for queries equidistant to several cells.
+    """
+    rel = query_xy - height_frame[:, None, 0]
+    grid = torch.stack([torch.sum(rel * height_frame[:, None, 1], dim=-1),
+                        torch.sum(rel * height_frame[:, None, 2], dim=-1)], -1) - 1
+    # queries off the map clamp to the border cells and fail the distance test
+    cells = torch.nn.functional.grid_sample(height_texture, grid[:, None], mode='nearest', padding_mode='border', align_corners=True)[:, :, 0]
+    dist = query_xy - cells[:, :2].permute(0, 2, 1)
+    sum_dist = torch.sum(dist * dist, dim=-1)
+    # heights are read through the flat view like the exhaustive search
+    height_map = height_map_pcd.reshape(-1, 3)[cells[:, 2].long(), 2]
+    return torch.where(sum_dist < valid_sq_dist, height_map, torch.zeros_like(height_map))
+
+def sample_height_map(height_map_pcd, height_texture, height_frame, query_xy, valid_sq_dist: float=0.05, lookup: str='brute'):
+    """ Nearest-cell heights with the lookup named by one of HEIGHT_LOOKUPS """
+    if lookup == 'texture':
+        return sample_height_map_texture(height_map_pcd, height_texture, height_frame, query_xy, valid_sq_dist)
+    if lookup == 'grid':
+        return sample_height_map_grid(height_map_pcd, query_xy, valid_sq_dist)
+    return sample_height_map_brute(height_map_pcd, query_xy, valid_sq_dist)
@@ -0,0 +1,97 @@
+import torch
+
+KERNEL_MODES = ['eager', 'script', 'compile']
+
+
+def _clone(value):
+    if isinstance(value, torch.Tensor):
+        return value.clone()
+    if isinstance(value, (list, tuple)):
+        return type(value)(_clone(v) for v in value)
+    return value
+
+def _flatten(value):
+    if isinstance(value, (list, tuple)):
+        return [t for v in value for t in _flatten(v)]
+    return [value]
+
+def compare_kernel_outputs(expected, actual, atol=1e-5, rtol=1e-5):
+    """ Compare the (nested tuples of) tensors returned by two kernel variants
+
+    Return:
+        Return the largest absolute difference, raise ValueError when the outputs
+        differ in structure, dtype, shape, non-finite pattern or beyond atol / rtol
+    """
+    expected = _flatten(expected)
+    actual = _flatten(actual)
+    if len(expected) != len(actual):
+        raise ValueError('kernel returned {} outputs, eager {}'.format(len(actual), len(expected)))
+
+    max_diff = 0.0
+    for i, (e, a) in enumerate(zip(expected, actual)):
+        if not isinstance(e, torch.Tensor):
+            if e != a:
+                raise ValueError('output {}: {} != eager {}'.format(i, a, e))
+            continue
+        if e.dtype != a.dtype or e.shape != a.shape:
+            raise ValueError('output {}: {} {} != eager {} {}'.format(i, a.dtype, tuple(a.shape), e.dtype, tuple(e.shape)))
+        if e.dtype == torch.bool or not e.is_floating_point():
+            if not torch.equal(e, a):
+                raise ValueError('output {}: {} of {} entries differ'.format(i, int((e != a).sum()), e.numel()))
+            continue
+        if not torch.allclose(a, e, atol=atol, rtol=rtol, equal_nan=True):
+            raise ValueError('output {}: max abs difference {}'.format(i, float((a - e).abs().nan_to_num(float('inf')).max())))
+        finite = torch.isfinite(e)
+        if finite.any():
+            max_diff = max(max_diff, float((a - e)[finite].abs().max()))
+    return max_diff
+
+def check_kernel(fn, compiled_fn, args, atol=1e-5, rtol=1e-5):
+    """ Run the eager and compiled kernel on copies of the same inputs and compare them
+
+    Return:
+        Return the largest absolute output difference, see compare_kernel_outputs
+    """
+    expected = fn(*_clone(args))
+    actual = compiled_fn(*_clone(args))
+    return compare_kernel_outputs(expected, actual, atol, rtol)
+
+class VerifiedKernel(object):
+    """ Compiled kernel that is checked against the eager kernel on its first call """
+
+    def __init__(self, fn, compiled_fn, mode):
+        self.fn = fn
+        self.compiled_fn = compiled_fn
+        self.mode = mode
+        self.verified = False
+
+    def __call__(self, *args):
+        if not self.verified:
+            max_diff = check_kernel(self.fn, self.compiled_fn, args)
+            print("kernel {} ({}): matches eager, max abs difference {:.3g}".format(self.fn.__name__, self.mode, max_diff))
+            self.verified = True
+        return self.compiled_fn(*args)
+
+def compile_kernel(fn, mode='eager', verify=False):
+    """ Select the eager, TorchScript or torch.compile variant of a kernel
+
+    Args:
+        fn: script compatible kernel function
+        mode: one of KERNEL_MODES
+        verify: compare the compiled kernel against the eager one on the first call
+
+    Return:
+        Return the callable to use in place of fn
+    """
+    if mode == 'eager':
+        return fn
+    if mode == 'script':
+        compiled_fn = torch.jit.script(fn)
+    elif mode == 'compile':
+        compiled_fn = torch.compile(fn, dynamic=True)
+    else:
+        raise ValueError('unknown kernel mode {}, expected one of {}'.format(mode, KERNEL_MODES))
+
+    if verify:
+        return VerifiedKernel(fn, compiled_fn, mode)
+    return compiled_fn
@@ -0,0 +1,42 @@
+from collections import OrderedDict
+
+
+class ObsLayout(object):
+    """ Fixed column slices of an observation buffer, one per named component
+
+    Components are laid out in the order they are added, matching the order
+    the observation kernels write them in. Kernels fill their slices of
+    obs_buf in place instead of concatenating fresh tensors, so components
+    that never change can be written once, see write_constants.
+    """
+
+    def __init__(self):
+        self.slices = OrderedDict()
+        self.constants = OrderedDict()
+        self.size = 0
+
+    def add(self, name, size, constant=None):
+        """ Append a component of size columns
+
+        Args:
+            name: component name
+            size: number of observation columns
+            constant: value of a component that never changes, written by
+                write_constants instead of the kernels
+        """
+        assert name not in self.slices, name
+        self.slices[name] = slice(self.size, self.size + size)
+        self.size += size
+        if constant is not None:
+            self.constants[name] = constant
+        return self.slices[name]
+
+    def view(self, buf, name):
+        return buf[..., self.slices[name]]
+
+    def write_constants(self, buf):
+        for name, value in self.constants.items():
+            self.view(buf, name)[:] = value
+
+    def describe(self):
+        return ', '.join('{} {}:{}'.format(name, s.start, s.stop) for name, s in self.slices.items())
@@ -0,0 +1,83 @@
+import torch
+from torch.overrides import TorchFunctionMode
+
+# ops reading tensor elements through an index tensor
+GATHER_OPS = ['__getitem__', 'index_select', 'gather', 'take', 'take_along_dim', 'masked_select']
+
+
+def _tensors(value, found):
+    if isinstance(value, torch.Tensor):
+        found.append(value)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            _tensors(v, found)
+    elif isinstance(value, dict):
+        for v in value.values():
+            _tensors(v, found)
+    return found
+
+def _device_allocations():
+    if not (torch.cuda.is_available() and torch.cuda.is_initialized()):
+        return 0
+    return torch.cuda.memory_stats().get('allocation.all.allocated', 0)
+
+class OpCounter(TorchFunctionMode):
+    """ Count the gathers and tensor allocations of the torch calls made under it
+
+    Used as a context manager around a step function. A result counts as an
+    allocation when it is neither a view nor shares memory with an input, and
+    as a gather when it comes from an indexing op without being a view (basic
+    slicing is free). Counts accumulate over calls, see report(). On CUDA the
+    block allocations seen by the caching allocator are counted as well.
+    """
+
+    def __init__(self, name='ops'):
+        super().__init__()
+        self.name = name
+        self.calls = 0
+        self.gathers = 0
+        self.allocations = 0
+        self.allocated_bytes = 0
+        self.device_allocations = 0
+
+    def __enter__(self):
+        self._device_allocations_start = _device_allocations()
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super().__exit__(exc_type, exc_value, traceback)
+        self.device_allocations += _device_allocations() - self._device_allocations_start
+
+    def __torch_function__(self, func, types, args=(), kwargs=None):
+        kwargs = kwargs or {}
+        result = func(*args, **kwargs)
+
+        outputs = _tensors(result, [])
+        if len(outputs) == 0 or 'out' in kwargs:
+            return result
+        input_ptrs = set(t.data_ptr() for t in _tensors(args, []) + _tensors(kwargs, []))
+        for t in outputs:
+            if t._base is not None or t.data_ptr() in input_ptrs:
+                continue
+            self.allocations += 1
+            self.allocated_bytes += t.element_size() * t.nelement()
+            if getattr(func, '__name__', '') in GATHER_OPS:
+                self.gathers += 1
+        return result
+
+    def step(self):
+        self.calls += 1
+
+    def reset(self):
+        self.calls = 0
+        self.gathers = 0
+        self.allocations = 0
+        self.allocated_bytes = 0
+        self.device_allocations = 0
+
+    def report(self):
+        calls = max(self.calls, 1)
+        print("{}: {:.1f} gathers, {:.1f} allocations, {:.2f} MB allocated per call over {} calls".format(
+            self.name, self.gathers / calls, self.allocations / calls, self.allocated_bytes / calls / 2**20, self.calls))
+        if torch.cuda.is_available() and torch.cuda.is_initialized():
+            print("{}: {:.1f} cuda allocator allocations per call".format(self.name, self.device_allocations / calls))
@@ -0,0 +1,108 @@
+import numpy as np
+import torch
+
+# outcomes counted for every (plan, step) row of the packed step tables
+STAT_KEYS = ['attempts', 'fulfilled', 'timeouts', 'big_force', 'falls', 'sim_steps']
+
+
+class PlanStepStats(object):
+    """ Outcome counters of every CoC step of every plan, kept on device
+
+    The reset path adds the outcome of every step attempt that ended with
+    record, a scatter-add into a [num_rows, len(STAT_KEYS)] table indexed by
+    the rows of utils.coc_table. flush copies the table to the host once,
+    clears it and sums the steps of every plan.
+    """
+
+    def __init__(self, step_offsets, max_steps, num_rows, plan_names, device):
+        """
+        Args:
+            step_offsets: first row of every plan, see build_step_offsets
+            max_steps: number of steps of every plan
+            num_rows: rows of the packed step tables
+            plan_names: name of every plan
+            device: device of the counters
+        """
+        self.step_offsets = torch.as_tensor(step_offsets, dtype=torch.long).cpu().numpy()
+        self.max_steps = torch.as_tensor(max_steps, dtype=torch.long).cpu().numpy()
+        self.plan_names = list(plan_names)
+        self.counts = torch.zeros([num_rows, len(STAT_KEYS)], device=device, dtype=torch.long)
+        return
+
+    def record(self, rows, ended, fulfilled, timeout, big_force, fall, sim_steps):
+        """ Add the step attempts of a reset, one entry per reset env
+
+        Args:
+            rows: step row of every env, [N]
+            ended: the env ran the step, false for the first reset, [N]
+            fulfilled, timeout, big_force, fall: outcome of the step, [N]
+            sim_steps: simulation steps spent on the step, [N]
+        """
+        counts = torch.stack([torch.ones_like(fulfilled), fulfilled, timeout, big_force, fall], -1).long()
+        counts = torch.cat([counts, sim_steps.long()[:, None]], -1)
+        counts = counts * ended.long()[:, None]
+        self.counts.index_add_(0, rows, counts)
+        return
+
+    def flush(self):
+        """ Copy the counters to the host and clear them
+
+        Return:
+            Return a dict with the per-row counters 'steps', [num_rows, len(STAT_KEYS)],
+            and the per-plan sums 'plans', [num_plans, len(STAT_KEYS)]. A plan
+            counts as fulfilled when its last step was, its attempts are the ones
+            of its first step. Plans without steps have no rows and count zero.
+        """
+        steps = self.counts.to('cpu', copy=True).numpy()
+        self.counts.zero_()
+
+        plan_of_row = np.repeat(np.arange(len(self.max_steps)), self.max_steps)
+        plans = np.zeros([len(self.max_steps), len(STAT_KEYS)], dtype=np.int64)
+        np.add.at(plans, plan_of_row, steps[self.step_offsets[0]:self.step_offsets[0] + len(plan_of_row)])
+        # the first and last row of a plan without steps belong to its neighbours
+        has_steps = self.max_steps > 0
+        first = self.step_offsets[has_steps]
+        last = first + self.max_steps[has_steps] - 1
+        plans[has_steps, STAT_KEYS.index('attempts')] = steps[first, STAT_KEYS.index('attempts')]
+        plans[has_steps, STAT_KEYS.index('fulfilled')] = steps[last, STAT_KEYS.index('fulfilled')]
+        return {'steps': steps, 'plans': plans}
+
+    def step_names(self):
+        """ plan/step name of every row the counters of flush are kept for """
+        names = ['padding'] * self.counts.shape[0]
+        for plan, (offset, num_steps) in enumerate(zip(self.step_offsets, self.max_steps)):
+            for step in range(num_steps):
+                names[offset + step] = "{}/{}".format(self.plan_names[plan], step)
+        return names
+
+def report_plan_stats(stats, summary, writer=None, frame=0, top=5):
+    """ Print the totals and the plans spending the most simulation steps without
+    being fulfilled, and write the totals and per-plan rates to a tensorboard writer
+
+    Args:
+        stats: PlanStepStats the summary was flushed from
+        summary: result of PlanStepStats.flush
+    """
+    plans = summary['plans']
+    total = summary['steps'].sum(0)
+    attempts = max(int(total[0]), 1)
+    print("plan stats: {} step attempts, {}".format(int(total[0]), ", ".join(
+        "{} {:.1%}".format(key, total[i] / attempts) for i, key in enumerate(STAT_KEYS[1:-1], 1))))
+
+    episodes = np.maximum(plans[:, 0], 1)
+    success = plans[:, 1] / episodes
+    wasted = plans[:, -1] * (1 - success)
+    for plan in np.argsort(-wasted)[:min(top, len(wasted))]:
+        if wasted[plan] == 0:
+            break
+        print("  {:<32s} {:6d} attempts, {:6.1%} fulfilled, {:9d} sim steps".format(
+            str(stats.plan_names[plan]), int(plans[plan, 0]), success[plan], int(plans[plan, -1])))
+
+    if writer is not None:
+        for i, key in enumerate(STAT_KEYS[1:-1], 1):
+            writer.add_scalar('plan_stats/{}_rate'.format(key), total[i] / attempts, frame)
+        writer.add_scalar('plan_stats/step_attempts', int(total[0]), frame)
+        tried = plans[:, 0] > 0
+        if tried.any():
+            writer.add_histogram('plan_stats/plan_success', success[tried], frame)
+    return
@@ -0,0 +1,88 @@
+import torch
+
+
+def _cell_offsets(grid_dim, device):
+    ijk = torch.arange(grid_dim, device=device, dtype=torch.float)
+    z, y, x = torch.meshgrid(ijk, ijk, ijk, indexing='ij')
+    # cell id (k * grid_dim + j) * grid_dim + i
+    return torch.stack([x, y, z], -1).reshape(-1, 3)
+
+class VoxelPointIndex(object):
+    """ Voxel grid over a batch of point sets for nearest-point queries
+
+    Every point set gets a grid_dim^3 grid over its bounding box grown by margin,
+    in the frame of the points. A cell lists the points that can be the nearest
+    point of a query inside it: the points whose distance to the cell is at most
+    the smallest distance any point has to the farthest corner of the cell. Lists
+    are sorted by point index, so ties resolve like the brute-force argmin, and
+    padded with their first entry.
+
+    Queries inside the grid are exact unless their cell lists more than
+    max_candidates points, in which case the ones nearest to the cell are kept,
+    see truncated. Queries outside the grid use the nearest border cell.
+    """
+
+    def __init__(self, points, grid_dim=12, max_candidates=48, margin=0.5, max_chunk_elements=1 << 24):
+        """
+        Args:
+            points: point sets, [num_sets, num_pts, 3]
+            grid_dim: cells per axis
+            max_candidates: listed points per cell
+            margin: growth of the bounding boxes
+            max_chunk_elements: bound of the cell to point distances computed at once
+        """
+        num_sets, num_pts = points.shape[:2]
+        self.grid_dim = grid_dim
+        self.num_candidates = min(max_candidates, num_pts)
+        num_cells = grid_dim ** 3
+
+        points = points.float()
+        self.origin = points.min(1)[0] - margin
+        self.cell_size = ((points.max(1)[0] + margin - self.origin) / grid_dim).clamp_min(1e-6)
+        # cell centers, [num_sets, num_cells, 3]
+        centers = self.origin[:, None] + (_cell_offsets(grid_dim, points.device) + 0.5) * self.cell_size[:, None]
+        half_size = 0.5 * self.cell_size[:, None, None]
+
+        index_dtype = torch.int16 if num_pts <= torch.iinfo(torch.int16).max else torch.int32
+        self.cell_candidates = torch.zeros([num_sets, num_cells, self.num_candidates], device=points.device, dtype=index_dtype)
+        num_listed = torch.zeros([num_sets, num_cells], device=points.device, dtype=torch.long)
+        chunk = max(1, max_chunk_elements // (num_cells * num_pts))
+        for start in range(0, num_sets, chunk):
+            end = min(start + chunk, num_sets)
+            diff = (centers[start:end, :, None] - points[start:end, None]).abs()
+            # distance of every point to the nearest and the farthest point of every cell
+            near_dist = torch.norm((diff - half_size[start:end]).clamp_min(0), dim=-1)
+            far_dist = torch.norm(diff + half_size[start:end], dim=-1)
+            bound = far_dist.min(-1, keepdim=True)[0]
+            # slack for the rounding of the distances
+            listed = near_dist <= bound * (1 + 1e-5) + 1e-6
+            num_listed[start:end] = listed.sum(-1)
+
+            key = torch.where(listed, near_dist, torch.full_like(near_dist, float('inf')))
+            nearest, idx = key.topk(self.num_candidates, dim=-1, largest=False)
+            idx = torch.where(torch.isfinite(nearest), idx, torch.full_like(idx, num_pts))
+            idx = idx.sort(-1)[0]
+            # the nearest point of the center is always listed
+            idx = torch.where(idx == num_pts, idx[..., :1], idx)
+            self.cell_candidates[start:end] = idx
+
+        self.truncated = float((num_listed > self.num_candidates).float().mean())
+        self.mean_listed = float(num_listed.float().mean())
+        return
+
+    def nbytes(self):
+        return sum(t.element_size() * t.nelement() for t in (self.origin, self.cell_size, self.cell_candidates))
+
+    def query(self, sets, query):
+        """ Candidate nearest points of query points given in the frame of their point set
+
+        Args:
+            sets: point set of every query, [...]
+            query: query positions, [..., 3]
+
+        Return:
+            Return the candidate point indices, [..., num_candidates]
+        """
+        cell = ((query - self.origin[sets]) / self.cell_size[sets]).floor().long().clamp(0, self.grid_dim - 1)
+        cell_id = (cell[..., 2] * self.grid_dim + cell[..., 1]) * self.grid_dim + cell[..., 0]
+        return self.cell_candidates[sets, cell_id].long()
@@ -0,0 +1,69 @@
+import torch
+
+
+def _fps_chunks(points_list, lengths, max_chunk_points):
+    # group point sets of one dtype and similar size so padding stays small
+    order = sorted(range(len(points_list)), key=lambda i: (str(points_list[i].dtype), -lengths[i]))
+    chunk = []
+    for i in order:
+        if chunk:
+            same_dtype = points_list[chunk[0]].dtype == points_list[i].dtype
+            # the first entry of a chunk is the longest one
+            if not same_dtype or lengths[chunk[0]] * (len(chunk) + 1) > max_chunk_points:
+                yield chunk
+                chunk = []
+        chunk.append(i)
+    if chunk:
+        yield chunk
+
+def batched_farthest_point_sample(points_list, npoint, generator=None, max_chunk_points=1 << 24):
+    """ Farthest point sampling of many ragged point sets at once
+
+    The point sets are padded per chunk and the npoint iterations run once for
+    the whole chunk. Padded points get a negative distance so they are never
+    picked. Given the same start points every set samples exactly what it
+    samples alone, independent of the chunking.
+
+    Args:
+        points_list: list of [N_i, 3] tensors on the same device, N_i > 0
+        npoint: number of samples
+        generator: optional torch.Generator used to draw the start points
+        max_chunk_points: upper bound of padded points processed together
+
+    Return:
+        centroids: sampled index into every point set, [len(points_list), npoint]
+    """
+    B = len(points_list)
+    device = points_list[0].device
+    lengths = [len(p) for p in points_list]
+    if min(lengths) == 0:
+        raise ValueError('farthest point sampling needs non-empty point sets')
+
+    # draw every start point up front so the result does not depend on chunking
+    rand_device = generator.device if generator is not None else device
+    rand = torch.rand(B, generator=generator, device=rand_device).to(device)
+    lengths_t = torch.tensor(lengths, dtype=torch.long, device=device)
+    start = torch.minimum((rand * lengths_t).long(), lengths_t - 1)
+
+    centroids = torch.zeros(B, npoint, dtype=torch.long, device=device)
+    for chunk in _fps_chunks(points_list, lengths, max_chunk_points):
+        chunk_ids = torch.tensor(chunk, dtype=torch.long, device=device)
+        xyz = torch.nn.utils.rnn.pad_sequence([points_list[i] for i in chunk], batch_first=True)
+        b, n = xyz.shape[:2]
+
+        distance = torch.ones(b, n, dtype=xyz.dtype, device=device) * 1e10
+        padding = torch.arange(n, device=device)[None] >= lengths_t[chunk_ids][:, None]
+        distance[padding] = -1
+        farthest = start[chunk_ids]
+        batch_indices = torch.arange(b, dtype=torch.long, device=device)
+        chunk_centroids = torch.zeros(b, npoint, dtype=torch.long, device=device)
+        for i in range(npoint):
+            chunk_centroids[:, i] = farthest
+            centroid = xyz[batch_indices, farthest, :].view(b, 1, 3)
+            dist = torch.sum((xyz - centroid) ** 2, -1)
+            mask = dist < distance
+            distance[mask] = dist[mask]
+            farthest = torch.max(distance, -1)[1]
+        centroids[chunk_ids] = chunk_centroids
+
+    return centroids
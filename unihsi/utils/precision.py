@@ -0,0 +1,47 @@
+import torch
+
+STORAGE_DTYPES = {'fp32': torch.float32, 'fp16': torch.float16, 'bf16': torch.bfloat16}
+
+
+def storage_dtype(name):
+    """ Torch dtype of a storagePrecision setting """
+    if name not in STORAGE_DTYPES:
+        raise ValueError('unknown storage precision {}, expected one of {}'.format(name, list(STORAGE_DTYPES.keys())))
+    return STORAGE_DTYPES[name]
+
+def max_deviation(reference, value):
+    """ Largest absolute difference of a float tensor, fraction of differing
+    entries of an integer or bool tensor
+    """
+    if reference.numel() == 0:
+        return 0.0
+    if not reference.is_floating_point():
+        return float((reference != value).float().mean())
+    return float((value.float() - reference.float()).abs().max())
+
+def report_precision(name, reference, reduced, layout=None, skip=()):
+    """ Print the deviation of every output from its fp32 reference
+
+    Args:
+        name: label of the report
+        reference: dict from output name to the fp32 result
+        reduced: dict from output name to the reduced precision result
+        layout: ObsLayout, reports the 'obs' output per component
+        skip: layout components left out of the report
+
+    Return:
+        Return the dict from output (or obs component) name to deviation
+    """
+    deviations = dict()
+    for key, ref in reference.items():
+        if key == 'obs' and layout is not None:
+            for component in layout.slices:
+                if component not in skip:
+                    deviations['obs/' + component] = max_deviation(layout.view(ref, component), layout.view(reduced[key], component))
+        else:
+            deviations[key] = max_deviation(ref, reduced[key])
+
+    print("{}: max deviation from fp32".format(name))
+    for key, deviation in deviations.items():
+        print("  {:<24s} {:.3g}".format(key, deviation))
+    return deviations
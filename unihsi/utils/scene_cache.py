@@ -0,0 +1,72 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+
+class SceneCache(object):
+    """ Content-addressed on-disk cache of transformed scene geometry
+
+    Every entry is a directory named after a hash of the sceneplan entry that
+    produced it and the mtimes of its source files. Arrays are stored as plain
+    .npy files so a warm start only has to memory-map them.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(entry, source_files):
+        """ Hash a json-serializable sceneplan entry together with its source files
+
+        Args:
+            entry: the fields that determine the transformed geometry
+            source_files: files the geometry is read from, their mtimes are hashed
+
+        Return:
+            Return a hex digest used as the entry directory name
+        """
+        mtimes = []
+        for fn in source_files:
+            mtimes.append([fn, os.path.getmtime(fn) if os.path.exists(fn) else None])
+        payload = json.dumps([entry, mtimes], sort_keys=True)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def load(self, key, names):
+        """ Memory-map the arrays of a cached entry, return None on a miss """
+        entry_dir = self._entry_dir(key)
+        if not os.path.isdir(entry_dir):
+            return None
+
+        arrays = dict()
+        for name in names:
+            fn = os.path.join(entry_dir, name + '.npy')
+            if not os.path.exists(fn):
+                return None
+            arrays[name] = np.load(fn, mmap_mode='r')
+        return arrays
+
+    def save(self, key, arrays):
+        """ Write an entry atomically so concurrent writers never expose partial data """
+        entry_dir = self._entry_dir(key)
+        if os.path.isdir(entry_dir):
+            return
+
+        parent = os.path.dirname(entry_dir)
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=parent)
+        for name, arr in arrays.items():
+            np.save(os.path.join(tmp_dir, name + '.npy'), np.ascontiguousarray(arr))
+        try:
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            # another process stored the same entry first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return
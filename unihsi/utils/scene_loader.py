@@ -0,0 +1,513 @@
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+try:
+    import open3d as o3d
+except ImportError:
+    # only the mesh and point cloud readers need open3d, cached geometry,
+    # labels and segmentations load without it
+    o3d = None
+
+from utils.asset_registry import AssetRegistry
+
+PARTNET_ROOT = 'data/partnet/'
+PARTNET_ALIGNMENT_FILE = PARTNET_ROOT + 'chair_table_storagefurniture_bed_shapenetv1_to_partnet_alignment.json'
+SCANNET_ROOT = 'data/scannet/'
+
+# objects whose point samples are not covered by the shapenet alignment file
+UNALIGNED_PARTNET_IDS = ['11570', '11873', '4376', '5861']
+
+PARTNET_OBJECT_ARRAYS = ['vertices', 'triangles', 'pcd', 'min_mesh']
+SCANNET_MESH_ARRAYS = ['vertices', 'triangles']
+SCANNET_SEGMENT_ARRAYS = ['seg_indices', 'seg_ids', 'seg_offsets', 'seg_vertices', 'group_offsets', 'group_segments']
+
+
+def partnet_mesh_file(pid):
+    return PARTNET_ROOT + pid + '/models/model_normalized.obj'
+
+def partnet_pcd_file(pid):
+    return PARTNET_ROOT + pid + '/point_sample/sample-points-all-pts-label-10000.ply'
+
+def scannet_mesh_file(scene_id):
+    return SCANNET_ROOT + 'scene' + scene_id + '_vh_clean_2.ply'
+
+def scannet_segs_file(scene_id):
+    return SCANNET_ROOT + 'scene' + scene_id + '_vh_clean_2.0.010000.segs.json'
+
+def scannet_aggregation_file(scene_id):
+    return SCANNET_ROOT + 'scene' + scene_id + '_vh_clean.aggregation.json'
+
+def load_label(fn):
+    with open(fn, 'r') as fin:
+        lines = [item.rstrip() for item in fin]
+        label = np.array([int(line) for line in lines], dtype=np.int32)
+        return label
+
+def get_leaf_node(dic, results, offset):
+    for i in range(len(results)):
+        result = results[i]
+        if 'children' in result.keys():
+            get_leaf_node(dic, result['children'], offset)
+        else:
+            dic[result['name']+str(result['id'])] = result['id'] + offset
+
+def load_partnet_alignment():
+    with open(PARTNET_ALIGNMENT_FILE, 'r') as fcc_file:
+        trans_mat = fcc_file.read()
+    return json.loads(trans_mat)
+
+def _get_raw(registry, key, loader):
+    if registry is None:
+        return loader()
+    return registry.get(key, loader)
+
+def _read_partnet_mesh(pid):
+    mesh = o3d.io.read_triangle_mesh(partnet_mesh_file(pid))
+    return np.asarray(mesh.vertices).copy(), np.asarray(mesh.triangles).copy()
+
+def _read_partnet_pcd(pid):
+    pcd = o3d.io.read_point_cloud(partnet_pcd_file(pid))
+    return np.asarray(pcd.points).copy()
+
+def _read_partnet_labels(pid):
+    label = load_label(PARTNET_ROOT+pid+"/point_sample/sample-points-all-label-10000.txt")
+    with open(PARTNET_ROOT+pid+"/result.json", 'r') as fcc_file:
+        result_file = fcc_file.read()
+    result = json.loads(result_file)
+    result_dict = dict()
+    get_leaf_node(result_dict, result, 0)
+    return label, result_dict
+
+def _transform_partnet_mesh(obj, registry=None):
+    # rebuild the open3d mesh from the raw arrays, the registry copy stays untouched
+    vertices, triangles = _get_raw(registry, ('partnet_mesh', obj['id']), lambda: _read_partnet_mesh(obj['id']))
+    mesh = o3d.geometry.TriangleMesh(o3d.utility.Vector3dVector(vertices), o3d.utility.Vector3iVector(triangles))
+    for r in obj['rotate']:
+        R = mesh.get_rotation_matrix_from_xyz(r)
+        mesh.rotate(R, center=(0, 0, 0))
+    mesh.scale(obj['scale'], center=mesh.get_center())
+    mesh_vertices = np.asarray(mesh.vertices).astype(np.float32())
+    mesh.translate((0,0,-mesh_vertices[:, 2].min()))
+    mesh.translate(obj['transfer']) #  not collision with init human
+    mesh_vertices = np.asarray(mesh.vertices).astype(np.float32())
+    mesh_triangles = np.asarray(mesh.triangles).astype(np.uint32)
+    return mesh_vertices, mesh_triangles
+
+def _transform_partnet_pcd(obj, trans_mat, min_mesh, registry=None):
+    pid = obj['id']
+    points = _get_raw(registry, ('partnet_pcd', pid), lambda: _read_partnet_pcd(pid))
+    pcd = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(points))
+
+    if pid in UNALIGNED_PARTNET_IDS:
+        pcd.scale(0.5, center=pcd.get_center())
+    else:
+        matrix = np.array(trans_mat[pid]['transmat']).reshape(4,4)
+        tmp = matrix[0].copy()
+        matrix[0] = matrix[2]
+        matrix[2] = tmp
+        matrix = np.linalg.inv(matrix)
+        pcd.transform(matrix)
+
+    for r in obj['rotate']:
+        R = pcd.get_rotation_matrix_from_xyz(r)
+        pcd.rotate(R, center=(0, 0, 0))
+    pcd.scale(obj['scale'], center=pcd.get_center())
+
+    if pid == '11570':
+        R = pcd.get_rotation_matrix_from_xyz((0, 0, -np.pi))
+        pcd.rotate(R, center=(0, 0, 0))
+
+    pcd = np.asarray(pcd.points).astype(np.float32())
+
+    max_y = pcd[:, 1].max()
+    pcd[:, 1] = max_y - pcd[:, 1] # flip
+
+    # align the point samples with the transformed mesh
+    min_x_pcd, min_y_pcd, min_z_pcd = pcd[:,0].min(), pcd[:,1].min(), pcd[:,2].min()
+    min_x_mesh, min_y_mesh, min_z_mesh = min_mesh
+    pcd[:,0] += min_x_mesh-min_x_pcd
+    pcd[:,1] += min_y_mesh-min_y_pcd
+    pcd[:,2] += min_z_mesh-min_z_pcd
+    return pcd
+
+def load_partnet_object(obj, trans_mat, cache=None, registry=None):
+    """ Load and transform the mesh and point samples of a PartNet object
+
+    Args:
+        obj: sceneplan object entry with id, rotate, scale and transfer
+        trans_mat: shapenet to partnet alignment, see load_partnet_alignment
+        cache: optional SceneCache holding previously transformed objects
+        registry: optional AssetRegistry sharing the raw files between objects
+
+    Return:
+        Return a dict with vertices, triangles, aligned pcd and min_mesh
+    """
+    pid = obj['id']
+    if cache is not None:
+        entry = {'id': pid, 'rotate': obj['rotate'], 'scale': obj['scale'], 'transfer': obj['transfer']}
+        key = cache.make_key(entry, [partnet_mesh_file(pid), partnet_pcd_file(pid), PARTNET_ALIGNMENT_FILE])
+        arrays = cache.load(key, PARTNET_OBJECT_ARRAYS)
+        if arrays is not None:
+            return arrays
+
+    mesh_vertices, mesh_triangles = _transform_partnet_mesh(obj, registry)
+    min_mesh = mesh_vertices.min(0)
+    pcd = _transform_partnet_pcd(obj, trans_mat, min_mesh, registry)
+    arrays = {'vertices': mesh_vertices, 'triangles': mesh_triangles, 'pcd': pcd, 'min_mesh': min_mesh}
+
+    if cache is not None:
+        cache.save(key, arrays)
+    return arrays
+
+def load_scannet_mesh(plan, cache=None):
+    """ Load and transform the reconstruction mesh of a ScanNet plan
+
+    Return:
+        Return a dict with vertices and triangles
+    """
+    scene_id = plan['scene_id']
+    if cache is not None:
+        entry = {'scene_id': scene_id, 'rotate': plan['rotate'], 'scale': plan['scale'], 'transfer': plan['transfer']}
+        key = cache.make_key(entry, [scannet_mesh_file(scene_id)])
+        arrays = cache.load(key, SCANNET_MESH_ARRAYS)
+        if arrays is not None:
+            return arrays
+
+    mesh = o3d.io.read_triangle_mesh(scannet_mesh_file(scene_id))
+    for r in plan['rotate']:
+        R = mesh.get_rotation_matrix_from_xyz(r)
+        mesh.rotate(R, center=(0, 0, 0))
+    mesh.scale(plan['scale'], center=mesh.get_center())
+    mesh_vertices = np.asarray(mesh.vertices).astype(np.float32())
+    mesh.translate((0,0,-mesh_vertices[:, 2].min()))
+    mesh.translate(plan['transfer']) #  not collision with init human
+    mesh_vertices = np.asarray(mesh.vertices).astype(np.float32())
+    mesh_triangles = np.asarray(mesh.triangles).astype(np.uint32)
+    arrays = {'vertices': mesh_vertices, 'triangles': mesh_triangles}
+
+    if cache is not None:
+        cache.save(key, arrays)
+    return arrays
+
+def decimate_mesh(vertices, triangles, target_triangles=None, max_error=None):
+    """ Reduce a triangle mesh with quadric error decimation
+
+    Args:
+        vertices: float32 mesh vertices
+        triangles: uint32 mesh triangles
+        target_triangles: stop once the mesh has at most this many triangles
+        max_error: stop before a collapse exceeds this quadric error
+
+    Return:
+        Return the decimated float32 vertices and uint32 triangles
+    """
+    mesh = o3d.geometry.TriangleMesh(o3d.utility.Vector3dVector(vertices.astype(np.float64)),
+                                     o3d.utility.Vector3iVector(triangles.astype(np.int32)))
+    target = target_triangles if target_triangles else 1
+    if max_error is not None:
+        mesh = mesh.simplify_quadric_decimation(target, maximum_error=max_error)
+    else:
+        mesh = mesh.simplify_quadric_decimation(target)
+    mesh.remove_unreferenced_vertices()
+    return np.asarray(mesh.vertices).astype(np.float32), np.asarray(mesh.triangles).astype(np.uint32)
+
+def load_scannet_collision_mesh(plan, mesh, lod, cache=None):
+    """ Decimate the transformed mesh of a ScanNet plan for collision only
+
+    Args:
+        plan: sceneplan entry the mesh was loaded from
+        mesh: dict with the full resolution vertices and triangles
+        lod: dict with target_triangles and/or max_error
+        cache: optional SceneCache, every level of detail is stored separately
+
+    Return:
+        Return a dict with the collision vertices and triangles
+    """
+    scene_id = plan['scene_id']
+    if cache is not None:
+        entry = {'scene_id': scene_id, 'rotate': plan['rotate'], 'scale': plan['scale'], 'transfer': plan['transfer'],
+                 'lod': [lod.get('target_triangles'), lod.get('max_error')]}
+        key = cache.make_key(entry, [scannet_mesh_file(scene_id)])
+        arrays = cache.load(key, SCANNET_MESH_ARRAYS)
+        if arrays is not None:
+            return arrays
+
+    vertices, triangles = decimate_mesh(np.asarray(mesh['vertices']), np.asarray(mesh['triangles']),
+                                        lod.get('target_triangles'), lod.get('max_error'))
+    arrays = {'vertices': vertices, 'triangles': triangles}
+
+    if cache is not None:
+        cache.save(key, arrays)
+    return arrays
+
+def load_partnet_labels(partnet_id, registry=None):
+    """ Load per-point part labels and the leaf part mapping of PartNet objects
+
+    Return:
+        Return the concatenated labels and a dict from part name to label
+    """
+    if not isinstance(partnet_id, list):
+        partnet_id = [partnet_id]
+
+    result_dict_full = dict()
+    offset = 0
+    labels = []
+    for pid in partnet_id:
+        raw_label, raw_result_dict = _get_raw(registry, ('partnet_labels', pid), lambda: _read_partnet_labels(pid))
+        label = raw_label + offset
+        result_dict = {name: idx + offset for name, idx in raw_result_dict.items()}
+        result_dict_full.update(result_dict)
+        offset += 100 # hard code
+        labels.append(label)
+    labels = np.concatenate(labels, axis=0)
+
+    return labels, result_dict_full
+
+def _parse_scannet_segments(scene_id):
+    with open(scannet_segs_file(scene_id), 'r') as fcc_file:
+        seg_indices = np.asarray(json.load(fcc_file)['segIndices'], dtype=np.int32)
+    with open(scannet_aggregation_file(scene_id), 'r') as fcc_file:
+        groups = json.load(fcc_file)['segGroups']
+
+    # inverted index, the vertices of seg_ids[i] are seg_vertices[seg_offsets[i]:seg_offsets[i+1]]
+    # in ascending order thanks to the stable sort
+    seg_ids, seg_counts = np.unique(seg_indices, return_counts=True)
+    seg_offsets = np.concatenate([[0], np.cumsum(seg_counts)]).astype(np.int64)
+    seg_vertices = np.argsort(seg_indices, kind='stable').astype(np.int32)
+
+    # segments of every aggregation group, stored the same way
+    group_sizes = [len(group['segments']) for group in groups]
+    group_offsets = np.concatenate([[0], np.cumsum(group_sizes)]).astype(np.int64)
+    group_segments = np.array([seg for group in groups for seg in group['segments']], dtype=np.int32)
+
+    return {'seg_indices': seg_indices, 'seg_ids': seg_ids.astype(np.int32), 'seg_offsets': seg_offsets,
+            'seg_vertices': seg_vertices, 'group_offsets': group_offsets, 'group_segments': group_segments}
+
+def load_scannet_segments(scene_id, cache=None, registry=None):
+    """ Load the parsed segmentation of a ScanNet scene
+
+    The segs and aggregation json files are parsed once per scene and process
+    through the registry, and persisted as .npy arrays in the cache so warm
+    starts skip json parsing entirely.
+
+    Return:
+        Return a dict with the int32 segment of every vertex, the inverted index
+        from segment id to vertices and the segments of every aggregation group
+    """
+    def loader():
+        if cache is not None:
+            key = cache.make_key({'scannet_segments': scene_id},
+                                 [scannet_segs_file(scene_id), scannet_aggregation_file(scene_id)])
+            arrays = cache.load(key, SCANNET_SEGMENT_ARRAYS)
+            if arrays is not None:
+                return arrays
+
+        arrays = _parse_scannet_segments(scene_id)
+        if cache is not None:
+            cache.save(key, arrays)
+        return arrays
+
+    return _get_raw(registry, ('scannet_segments', scene_id), loader)
+
+def scannet_segment_vertices(segments, seg):
+    """ Indices of the vertices in one segment id or a list of segment ids
+
+    Return:
+        Return the vertex indices in ascending order, so pcd[indices] equals
+        pcd[mask] for the per-segment comparison mask
+    """
+    seg = np.atleast_1d(np.asarray(seg, dtype=np.int64))
+    seg_ids = segments['seg_ids']
+    pos = np.searchsorted(seg_ids, seg)
+    found = pos < len(seg_ids)
+    found[found] = seg_ids[pos[found]] == seg[found]
+    pos = pos[found]
+
+    seg_offsets = segments['seg_offsets']
+    seg_vertices = segments['seg_vertices']
+    if len(pos) == 1:
+        return np.asarray(seg_vertices[seg_offsets[pos[0]]:seg_offsets[pos[0]+1]])
+    vertices = [seg_vertices[seg_offsets[p]:seg_offsets[p+1]] for p in pos]
+    if len(vertices) == 0:
+        return np.zeros(0, dtype=np.int32)
+    return np.unique(np.concatenate(vertices))
+
+def scannet_label_mapping(segments, obj_id, part_ids):
+    """ Map the part names of an aggregation group to their segment ids
+
+    Return:
+        Return a dict from part name to segment ids
+    """
+    group = eval(obj_id)
+    group_segments = segments['group_segments'][segments['group_offsets'][group]:segments['group_offsets'][group+1]]
+
+    label_mapping = dict()
+    for pi in part_ids:
+        segs = part_ids[pi]
+        segs_mapping = []
+        for seg in segs:
+            segs_mapping.append(int(group_segments[seg]))
+        label_mapping[pi] = segs_mapping
+
+    return label_mapping
+
+#####################################################################
+###=======================scene ingestion=========================###
+#####################################################################
+
+_worker_trans_mat = None
+_worker_registry = None
+
+def _init_partnet_worker(trans_mat, registry):
+    global _worker_trans_mat, _worker_registry
+    _worker_trans_mat = trans_mat
+    _worker_registry = registry
+
+def _init_scannet_worker(registry):
+    global _worker_registry
+    _worker_registry = registry
+
+def _ingest_partnet_object(job):
+    obj, cache = job
+    counts = _worker_registry.counts()
+    asset = dict(load_partnet_object(obj, _worker_trans_mat, cache, _worker_registry))
+    asset['labels'] = load_partnet_labels(obj['id'], _worker_registry)
+    asset['registry_counts'] = {k: v - counts[k] for k, v in _worker_registry.counts().items()}
+    return asset
+
+def _partnet_object_key(obj):
+    return json.dumps([obj['id'], obj['rotate'], obj['scale'], obj['transfer']])
+
+def _ingest_scannet_plan(job):
+    plan, cache, collision_lod = job
+    counts = _worker_registry.counts()
+    asset = dict(load_scannet_mesh(plan, cache))
+    if collision_lod:
+        collision = load_scannet_collision_mesh(plan, asset, collision_lod, cache)
+        asset['collision_vertices'] = collision['vertices']
+        asset['collision_triangles'] = collision['triangles']
+    segments = load_scannet_segments(plan['scene_id'], cache, _worker_registry)
+    labels = dict()
+    objs = plan['obj']
+    for obj_item in objs:
+        item_name = objs[obj_item]['name']+obj_item
+        labels[item_name] = scannet_label_mapping(segments, objs[obj_item]['id'], objs[obj_item]['part_id'])
+    asset['segments'] = segments
+    asset['labels'] = labels
+    asset['registry_counts'] = {k: v - counts[k] for k, v in _worker_registry.counts().items()}
+    return asset
+
+def _map_jobs(fn, jobs, num_workers, initializer=None, initargs=()):
+    if num_workers <= 0:
+        if initializer is not None:
+            initializer(*initargs)
+        return [fn(job) for job in jobs]
+
+    # spawn keeps the workers clear of the CUDA context and gym threads of the parent.
+    # Every worker re-imports the parent's __main__ module, so entry points that
+    # reach this (run.py) must keep their work behind the __main__ guard
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=num_workers, mp_context=ctx,
+                             initializer=initializer, initargs=initargs) as executor:
+        chunksize = max(1, len(jobs) // (num_workers * 4))
+        return list(executor.map(fn, jobs, chunksize=chunksize))
+
+def ingest_partnet_plans(plan_items, cache=None, num_workers=0, registry=None):
+    """ Load and transform every object of every PartNet plan
+
+    Objects are processed by a pool of num_workers processes, or in the calling
+    process when num_workers is 0. Both paths assemble identical per-plan arrays.
+    Objects placed identically in several plans are transformed once, and the
+    raw files of a PartNet id are read once per process through the registry.
+
+    Return:
+        Return a dict from plan id to the concatenated vertices, triangles and pcd
+        of the plan, its per-object min_mesh and per-object (labels, label_mapping)
+    """
+    if registry is None:
+        registry = AssetRegistry()
+
+    job_index = dict()
+    jobs = []
+    for plans in plan_items:
+        objs = plan_items[plans]['obj']
+        for obj_id in objs:
+            key = _partnet_object_key(objs[obj_id])
+            if key not in job_index:
+                job_index[key] = len(jobs)
+                jobs.append((objs[obj_id], cache))
+            else:
+                # an identical placement is served by the first transform
+                registry.hits += 1
+
+    # neighbouring jobs share a worker chunk, keep objects of one PartNet id together
+    order = sorted(range(len(jobs)), key=lambda i: jobs[i][0]['id'])
+    trans_mat = load_partnet_alignment()
+    sorted_results = _map_jobs(_ingest_partnet_object, [jobs[i] for i in order], num_workers,
+                               initializer=_init_partnet_worker, initargs=(trans_mat, registry))
+    results = [None] * len(jobs)
+    for i, asset in zip(order, sorted_results):
+        counts = asset.pop('registry_counts')
+        if num_workers > 0:
+            # the serial path already counted on this registry
+            registry.add_counts(counts)
+        results[i] = asset
+
+    scene_assets = dict()
+    for plans in plan_items:
+        objs = plan_items[plans]['obj']
+
+        l = 0
+        pn = 0
+        mesh_vertices = np.zeros([0, 3]).astype(np.float32)
+        mesh_triangles = np.zeros([0, 3]).astype(np.uint32)
+        pcd_multi = []
+        min_mesh = dict()
+        labels = dict()
+        for obj_id in objs:
+            asset = results[job_index[_partnet_object_key(objs[obj_id])]]
+
+            mesh_vertices = np.concatenate([mesh_vertices, asset['vertices']], axis=0)
+            mesh_triangles = np.concatenate([mesh_triangles, asset['triangles']], axis=0)
+            mesh_triangles[l:] += pn
+            l = mesh_triangles.shape[0]
+            pn = mesh_vertices.shape[0]
+
+            pcd_multi.append(asset['pcd'])
+            min_mesh[obj_id] = list(asset['min_mesh'])
+            labels[obj_id] = asset['labels']
+
+        scene_assets[plans] = {'vertices': mesh_vertices, 'triangles': mesh_triangles,
+                               'pcd': np.concatenate(pcd_multi, axis=0),
+                               'min_mesh': min_mesh, 'labels': labels}
+    return scene_assets
+
+def ingest_scannet_plans(plan_items, cache=None, num_workers=0, collision_lod=None, registry=None):
+    """ Load and transform the mesh and segment labels of every ScanNet plan
+
+    With a collision_lod (see load_scannet_collision_mesh) every plan also gets a
+    decimated collision_vertices / collision_triangles mesh. The segmentation of
+    a scene is parsed once per process and shared by all plans on that scene.
+
+    Return:
+        Return a dict from plan id to vertices, triangles, the scene segments
+        (see load_scannet_segments) and per-object label_mapping
+    """
+    if registry is None:
+        registry = AssetRegistry()
+
+    plan_ids = list(plan_items)
+    jobs = [(plan_items[plan_id], cache, collision_lod) for plan_id in plan_ids]
+    # neighbouring jobs share a worker chunk, keep plans of one scene together
+    order = sorted(range(len(jobs)), key=lambda i: jobs[i][0]['scene_id'])
+    sorted_results = _map_jobs(_ingest_scannet_plan, [jobs[i] for i in order], num_workers,
+                               initializer=_init_scannet_worker, initargs=(registry,))
+    scene_assets = dict()
+    for i, asset in zip(order, sorted_results):
+        counts = asset.pop('registry_counts')
+        if num_workers > 0:
+            registry.add_counts(counts)
+        scene_assets[plan_ids[i]] = asset
+    return {plan_id: scene_assets[plan_id] for plan_id in plan_ids}
@@ -0,0 +1,109 @@
+import json
+import os
+from collections import OrderedDict
+
+# A sharded sceneplan is a directory holding a manifest.json and JSONL shards.
+# Every shard line is one {"id": plan_id, "plan": plan} record and the manifest
+# lists, in library order, the shard and byte offset of every plan so single
+# plans can be read without parsing the whole library.
+
+MANIFEST_FILE = 'manifest.json'
+SCENEPLAN_FORMAT = 'unihsi-sceneplan'
+SCENEPLAN_VERSION = 1
+
+
+def convert_sceneplan(sceneplan_file, out_dir, plans_per_shard=1000):
+    """ Write a monolithic sceneplan json as a sharded sceneplan directory
+
+    Args:
+        sceneplan_file: sceneplan json mapping plan id to plan
+        out_dir: output directory, created if needed
+        plans_per_shard: number of plans stored in one JSONL shard
+    """
+    with open(sceneplan_file) as f:
+        sceneplan = json.load(f, object_pairs_hook=OrderedDict)
+
+    os.makedirs(out_dir, exist_ok=True)
+    entries = []
+    plan_ids = list(sceneplan.keys())
+    for shard_idx, start in enumerate(range(0, len(plan_ids), plans_per_shard)):
+        shard = 'shard_{:05d}.jsonl'.format(shard_idx)
+        with open(os.path.join(out_dir, shard), 'wb') as f:
+            for plan_id in plan_ids[start:start + plans_per_shard]:
+                line = (json.dumps({'id': plan_id, 'plan': sceneplan[plan_id]}) + '\n').encode('utf-8')
+                entries.append({'id': plan_id, 'shard': shard, 'offset': f.tell(), 'length': len(line)})
+                f.write(line)
+
+    manifest = {'format': SCENEPLAN_FORMAT, 'version': SCENEPLAN_VERSION, 'plans': entries}
+    with open(os.path.join(out_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f)
+
+class SceneplanIndex(object):
+    """ Plan ids of a sceneplan library with on-demand loading of the plans
+
+    Accepts a sharded sceneplan directory (see convert_sceneplan) or a plain
+    sceneplan json, which is parsed at once and served from memory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.plans = None
+        if os.path.isdir(path):
+            with open(os.path.join(path, MANIFEST_FILE)) as f:
+                manifest = json.load(f)
+            if manifest.get('format') != SCENEPLAN_FORMAT:
+                raise ValueError('{} is not a sharded sceneplan'.format(path))
+            self.entries = OrderedDict((entry['id'], entry) for entry in manifest['plans'])
+        else:
+            with open(path) as f:
+                self.plans = json.load(f, object_pairs_hook=OrderedDict)
+            self.entries = OrderedDict((plan_id, None) for plan_id in self.plans)
+        self.plan_ids = list(self.entries.keys())
+
+    def __len__(self):
+        return len(self.plan_ids)
+
+    def load(self, plan_ids):
+        """ Materialize the given plans, keeps the order of plan_ids
+
+        Return:
+            Return an ordered dict from plan id to plan
+        """
+        if self.plans is not None:
+            return OrderedDict((plan_id, self.plans[plan_id]) for plan_id in plan_ids)
+
+        plans = OrderedDict()
+        handles = dict()
+        try:
+            for plan_id in plan_ids:
+                entry = self.entries[plan_id]
+                if entry['shard'] not in handles:
+                    handles[entry['shard']] = open(os.path.join(self.path, entry['shard']), 'rb')
+                f = handles[entry['shard']]
+                f.seek(entry['offset'])
+                record = json.loads(f.read(entry['length']).decode('utf-8'), object_pairs_hook=OrderedDict)
+                assert record['id'] == plan_id
+                plans[plan_id] = record['plan']
+        finally:
+            for f in handles.values():
+                f.close()
+        return plans
+
+def materialize_scene_plans(index, scene_idx):
+    """ Load only the plans drawn into the scene grid
+
+    Args:
+        index: SceneplanIndex of the plan library
+        scene_idx: library index of the plan shown on every tile
+
+    Return:
+        Return the ordered dict of used plans in library order and scene_idx
+        remapped to positions in that dict
+    """
+    used = sorted(set(int(i) for i in scene_idx.reshape(-1)))
+    remap = {library_idx: plan_idx for plan_idx, library_idx in enumerate(used)}
+    compact_scene_idx = scene_idx.copy()
+    for library_idx, plan_idx in remap.items():
+        compact_scene_idx[scene_idx == library_idx] = plan_idx
+    plan_items = index.load([index.plan_ids[i] for i in used])
+    return plan_items, compact_scene_idx
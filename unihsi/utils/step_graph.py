@@ -0,0 +1,146 @@
+import time
+
+import torch
+
+
+def _tensor_attrs(owner):
+    return dict((k, v) for k, v in vars(owner).items() if isinstance(v, torch.Tensor))
+
+class StepGraph(object):
+    """ Replay a fixed-shape step function of owner from a captured CUDA graph
+
+    The first warmup calls run fn eagerly, the next one captures it and every
+    later call replays the capture. fn works on tensor attributes of owner:
+    - inputs names the attributes rebound between calls that fn reads, like
+      actions. They are copied into the captured tensors before every replay,
+      a new shape drops the capture and runs eagerly until recaptured
+    - every other attribute fn reads must be updated in place between calls.
+      Attributes rebound outside fn and not read by it, like the per-reset
+      bookkeeping of the reset path, are left alone
+    - attributes fn rebinds are its outputs, they are rebound to the captured
+      results after every replay. The graph keeps reading what they were bound
+      to at capture, so fn must not read one before rebinding it.
+
+    On cpu nothing is captured, the calls after warm-up run fn eagerly on the
+    attributes a graph would see: the inputs staged as above and every other
+    attribute bound to its capture-time tensor. Stale reads then show up as a
+    difference to eager on cpu. With enabled False every call runs fn eagerly,
+    for timing the eager step.
+    """
+
+    def __init__(self, owner, fn, inputs=(), warmup=3, enabled=True, timed=False):
+        """
+        Args:
+            owner: object holding the tensors fn reads and writes
+            fn: step function without arguments
+            inputs: names of the attributes rebound between calls that fn reads
+            warmup: eager calls before the capture
+            enabled: capture fn, otherwise always run it eagerly
+            timed: record the wall time of every call, see report()
+        """
+        self.owner = owner
+        self.fn = fn
+        self.input_names = list(inputs)
+        self.warmup = warmup
+        self.enabled = enabled
+        self.timed = timed
+        self.calls = 0
+        self.replays = 0
+        self.times = {'eager': [], 'replay': []}
+        self._graph = None
+        self._captured = None
+        self._outputs = None
+        self._warmup_start = 0
+
+    def _use_cuda(self):
+        return torch.cuda.is_available() and any(t.is_cuda for t in _tensor_attrs(self.owner).values())
+
+    def _stage_inputs(self):
+        # copy the tensors rebound to the inputs since the capture into the captured ones
+        for key in self.input_names:
+            captured = self._captured.get(key)
+            current = getattr(self.owner, key, None)
+            if current is captured or captured is None or key in self._outputs:
+                continue
+            if not isinstance(current, torch.Tensor) or current.shape != captured.shape \
+                or current.dtype != captured.dtype or current.device != captured.device:
+                return False
+            captured.copy_(current)
+            setattr(self.owner, key, captured)
+        return True
+
+    def _capture(self):
+        captured = _tensor_attrs(self.owner)
+        if self._use_cuda():
+            graph = torch.cuda.CUDAGraph()
+            try:
+                with torch.cuda.graph(graph):
+                    self.fn()
+            except RuntimeError as e:
+                for key, value in captured.items():
+                    setattr(self.owner, key, value)
+                print("step graph: capture failed, running eagerly: {}".format(e))
+                self.enabled = False
+                self.fn()
+                return
+            graph.replay()
+            self._graph = graph
+        else:
+            self.fn()
+        self._captured = captured
+        self._outputs = dict((k, v) for k, v in _tensor_attrs(self.owner).items() if captured.get(k) is not v)
+        return
+
+    def _replay(self):
+        self.replays += 1
+        if (self._graph is not None):
+            self._graph.replay()
+            for key, value in self._outputs.items():
+                setattr(self.owner, key, value)
+            return
+        # cpu stand-in, fn sees every attribute bound like the graph does, the ones
+        # rebound outside fn get their current tensors back afterwards
+        current = dict((k, getattr(self.owner, k, None)) for k in self._captured)
+        for key, value in self._captured.items():
+            setattr(self.owner, key, value)
+        self.fn()
+        for key, value in current.items():
+            if key not in self._outputs and value is not self._captured[key]:
+                setattr(self.owner, key, value)
+        return
+
+    def __call__(self):
+        if self.timed:
+            sync = torch.cuda.synchronize if torch.cuda.is_available() and torch.cuda.is_initialized() else (lambda: None)
+            sync()
+            start = time.perf_counter()
+        mode = 'eager'
+
+        if (not self.enabled):
+            self.fn()
+        elif (self._captured is not None and not self._stage_inputs()):
+            # shapes changed, capture again after warm-up
+            self._graph = None
+            self._captured = None
+            self._warmup_start = self.calls
+            self.fn()
+        elif (self._captured is not None):
+            self._replay()
+            mode = 'replay'
+        elif (self.calls - self._warmup_start < self.warmup):
+            self.fn()
+        else:
+            self._capture()
+        self.calls += 1
+
+        if self.timed:
+            sync()
+            self.times[mode].append((time.perf_counter() - start) * 1000)
+        return
+
+    def report(self):
+        for mode, times in self.times.items():
+            if len(times) > 0:
+                print("step graph {}: {:.3f} ms over {} calls".format(mode, sum(times) / len(times), len(times)))
+        self.times = {'eager': [], 'replay': []}
+        return
@@ -0,0 +1,135 @@
+import os
+import sys
+import warnings
+from collections import Counter
+
+import torch
+from torch.overrides import TorchFunctionMode
+
+# ops reading tensor values on the host
+HOST_READ_OPS = ['__bool__', '__int__', '__float__', '__index__', 'item', 'tolist', 'numpy']
+# ops whose result shape depends on tensor values
+DATA_SHAPE_OPS = ['nonzero', 'argwhere', 'masked_select', 'unique', 'unique_consecutive', 'repeat_interleave']
+# indexing ops that sync when indexed by a boolean mask
+INDEX_OPS = ['__getitem__', '__setitem__', 'index_put', 'index_put_']
+
+_TORCH_DIR = os.path.dirname(torch.__file__)
+
+
+def _is_mask(index):
+    if isinstance(index, torch.Tensor):
+        return index.dtype == torch.bool and index.dim() > 0
+    if isinstance(index, (list, tuple)):
+        return any(_is_mask(i) for i in index)
+    return False
+
+def _first_tensor(values):
+    for v in values:
+        if isinstance(v, torch.Tensor):
+            return v
+        if isinstance(v, (list, tuple)):
+            t = _first_tensor(v)
+            if t is not None:
+                return t
+    return None
+
+def _sync_kind(func, args, kwargs, result):
+    name = getattr(func, '__name__', '')
+    if name in HOST_READ_OPS:
+        return name
+    if name in DATA_SHAPE_OPS:
+        if name == 'repeat_interleave' and kwargs.get('output_size', None) is not None:
+            return None
+        return name
+    if name == 'where' and len(args) + len(kwargs) == 1:
+        return 'where'
+    if name in INDEX_OPS and len(args) > 1 and _is_mask(args[1]):
+        return name + '[mask]'
+    # device to host copies, .cpu() / .to('cpu') of a cuda tensor
+    src = _first_tensor(args)
+    dst = _first_tensor([result])
+    if src is not None and dst is not None and src.device.type != 'cpu' and dst.device.type == 'cpu':
+        return name
+    return None
+
+def _call_site():
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not (filename.startswith(_TORCH_DIR) or filename == __file__):
+            break
+        frame = frame.f_back
+    if frame is None:
+        return '?'
+    filename = frame.f_code.co_filename
+    short = os.path.join(os.path.basename(os.path.dirname(filename)), os.path.basename(filename))
+    return "{}:{} {}".format(short, frame.f_lineno, frame.f_code.co_name)
+
+class SyncCounter(TorchFunctionMode):
+    """ Count the host-device synchronizations of the torch calls made under it by call site
+
+    Used as a context manager around a step function, like OpCounter. A call
+    counts as a sync when it reads tensor values on the host (item, bool, ...),
+    when its result shape depends on tensor values (nonzero, boolean mask
+    indexing, ...) or when it copies a cuda tensor to the host. These sync on
+    cuda and are found the same way on cpu, where nothing waits. On cuda the
+    synchronizations reported by torch.cuda.set_sync_debug_mode are counted
+    as well, by the line the warning points at.
+    """
+
+    def __init__(self, name='syncs'):
+        super().__init__()
+        self.name = name
+        self.calls = 0
+        self.sites = Counter()
+        self.device_sites = Counter()
+        self._use_cuda = False
+
+    def __enter__(self):
+        self._use_cuda = torch.cuda.is_available() and torch.cuda.is_initialized()
+        if self._use_cuda:
+            self._sync_debug_mode = torch.cuda.get_sync_debug_mode()
+            torch.cuda.set_sync_debug_mode('warn')
+            self._warnings = warnings.catch_warnings(record=True)
+            self._records = self._warnings.__enter__()
+            warnings.simplefilter('always')
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super().__exit__(exc_type, exc_value, traceback)
+        if self._use_cuda:
+            self._warnings.__exit__(exc_type, exc_value, traceback)
+            torch.cuda.set_sync_debug_mode(self._sync_debug_mode)
+            for record in self._records:
+                if 'synchronizing' in str(record.message):
+                    short = os.path.join(os.path.basename(os.path.dirname(record.filename)), os.path.basename(record.filename))
+                    self.device_sites["{}:{}".format(short, record.lineno)] += 1
+
+    def __torch_function__(self, func, types, args=(), kwargs=None):
+        kwargs = kwargs or {}
+        result = func(*args, **kwargs)
+        kind = _sync_kind(func, args, kwargs, result)
+        if kind is not None:
+            self.sites[(_call_site(), kind)] += 1
+        return result
+
+    def step(self):
+        self.calls += 1
+
+    def reset(self):
+        self.calls = 0
+        self.sites.clear()
+        self.device_sites.clear()
+
+    def total(self):
+        return sum(self.sites.values())
+
+    def report(self):
+        calls = max(self.calls, 1)
+        print("{}: {:.2f} syncs per step over {} steps".format(self.name, self.total() / calls, self.calls))
+        for (site, kind), count in self.sites.most_common():
+            print("  {:8.2f}  {:<16s} {}".format(count / calls, kind, site))
+        if self._use_cuda:
+            print("{}: {:.2f} cuda synchronizations per step".format(self.name, sum(self.device_sites.values()) / calls))
+            for site, count in self.device_sites.most_common():
+                print("  {:8.2f}  {}".format(count / calls, site))
@@ -0,0 +1,23 @@
+import torch
+
+
+def task_generator(device, seed=None):
+    """ torch.Generator on device for the scene placement and reset sampling of a task
+
+    Without a seed it follows the global torch seed, which utils.config.set_seed
+    sets from the run seed.
+    """
+    generator = torch.Generator(device=device)
+    generator.manual_seed(torch.initial_seed() if seed is None else seed)
+    return generator
+
+def _size(size):
+    return (size,) if isinstance(size, int) else tuple(size)
+
+def rand(generator, size, dtype=torch.float):
+    """ torch.rand drawn from generator on its device """
+    return torch.rand(_size(size), generator=generator, device=generator.device, dtype=dtype)
+
+def randint(generator, high, size):
+    """ torch.randint in [0, high) drawn from generator on its device """
+    return torch.randint(0, high, _size(size), generator=generator, device=generator.device)
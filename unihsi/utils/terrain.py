@@ -0,0 +1,73 @@
+import numpy as np
+
+
+def z_rotation(degree):
+    """ Rotation about z applied to tile vertices as np.dot(vertices, z_rotation(degree)) """
+    return np.array([[np.cos(np.radians(degree)), -np.sin(np.radians(degree)), 0],
+                     [np.sin(np.radians(degree)), np.cos(np.radians(degree)), 0],
+                     [0, 0, 1]])
+
+def build_terrain_meshes(vertices_list, triangles_list, scene_idx, offsets, rotations=None, num_groups=0):
+    """ Build the triangle meshes of a grid of scene tiles
+
+    Tiles are split row-major into num_groups merged meshes, num_groups 0 keeps
+    one mesh per tile. Inside a group all tiles showing the same plan are offset
+    in one broadcast and their triangles are repeated through index offsets.
+
+    Args:
+        vertices_list: float32 vertices of every plan
+        triangles_list: uint32 triangles of every plan
+        scene_idx: plan shown on every tile, [rows, cols]
+        offsets: translation of every tile, [rows, cols, 3], float64 offsets are
+            added in float64 and rounded like an in-place add on float32 vertices
+        rotations: optional right-multiplied rotation of every tile, [rows, cols, 3, 3]
+        num_groups: number of merged meshes, 0 for one mesh per tile
+
+    Return:
+        Yield the vertices and triangles of every mesh
+    """
+    scene_idx = np.asarray(scene_idx).reshape(-1)
+    offsets = np.asarray(offsets).reshape(-1, 3)
+    if rotations is not None:
+        rotations = np.asarray(rotations).reshape(-1, 3, 3)
+
+    num_tiles = len(scene_idx)
+    num_groups = min(num_groups, num_tiles) if num_groups > 0 else num_tiles
+    for tiles in np.array_split(np.arange(num_tiles), num_groups):
+        vertices = []
+        triangles = []
+        base = 0
+        for plan in np.unique(scene_idx[tiles]):
+            plan_tiles = tiles[scene_idx[tiles] == plan]
+            plan_vertices = vertices_list[plan]
+            plan_triangles = triangles_list[plan]
+            if rotations is not None:
+                tile_vertices = np.matmul(plan_vertices, rotations[plan_tiles]).astype(np.float32)
+            else:
+                tile_vertices = plan_vertices[None]
+            tile_vertices = (tile_vertices + offsets[plan_tiles][:, None]).astype(np.float32)
+            vertices.append(tile_vertices.reshape(-1, 3))
+
+            index_offsets = base + np.arange(len(plan_tiles), dtype=np.uint32) * len(plan_vertices)
+            triangles.append((plan_triangles[None] + index_offsets[:, None, None].astype(np.uint32)).reshape(-1, 3))
+            base += len(plan_tiles) * len(plan_vertices)
+        yield np.concatenate(vertices, axis=0), np.concatenate(triangles, axis=0)
+
+def add_terrain_meshes(gym, sim, meshes, params_cls):
+    """ Upload meshes with gym.add_triangle_mesh
+
+    Return:
+        Return the number of meshes, vertices and triangles uploaded
+    """
+    num_meshes, num_vertices, num_triangles = 0, 0, 0
+    for vertices, triangles in meshes:
+        tm_params = params_cls()
+        tm_params.nb_vertices = vertices.shape[0]
+        tm_params.nb_triangles = triangles.shape[0]
+        gym.add_triangle_mesh(sim, vertices.flatten(order='C'),
+                              triangles.flatten(order='C'),
+                              tm_params)
+        num_meshes += 1
+        num_vertices += vertices.shape[0]
+        num_triangles += triangles.shape[0]
+    return num_meshes, num_vertices, num_triangles
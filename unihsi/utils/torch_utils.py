@@ -179,4 +179,14 @@ def calc_heading_quat_inv(q):
     axis[..., 2] = 1
 
     heading_q = quat_from_angle_axis(-heading, axis)
-    return heading_q
\ No newline at end of file
+    return heading_q
+
+@torch.jit.script
+def heading_to_quat(heading):
+    # type: (Tensor) -> Tensor
+    # rotation about the z axis by the heading angle, calc_heading_quat(q) is
+    # heading_to_quat(calc_heading(q)) and calc_heading_quat_inv(q) is
+    # heading_to_quat(-calc_heading(q))
+    axis = torch.stack([torch.zeros_like(heading), torch.zeros_like(heading), torch.ones_like(heading)], dim=-1)
+    heading_q = quat_from_angle_axis(heading, axis)
+    return heading_q